@@ -0,0 +1,194 @@
+import asyncio
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import DatabaseFunctions as dbfunc
+from DatabaseFunctions import SIGNUP_ADDED, SIGNUP_DUPLICATE, SIGNUP_FULL, SIGNUP_NO_EVENT
+import Migrations
+from Metrics import metrics
+from EventStore import EventStore, UNIX_TIMESTAMP, TITLE, DPS_LIMIT, SUPPORT_LIMIT, NO_AUTO_DELETE, CHANNEL_ID, SIGNUP_PLAYER_ID, SIGNUP_ROLE
+
+# Every query runs on this one worker thread. It owns the long-lived connection
+# in DatabaseFunctions, so slow disk I/O never blocks the event loop and
+# statements from concurrent button clicks are serialized without extra locking.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='DudelBotDB')
+
+# Write-through cache of event rows and rosters. Reads of a cached event never
+# touch SQLite, and every write below updates the store once it has committed.
+# Events the store doesn't accept, see EventStore.owns_guild, are read from SQLite.
+event_store = EventStore()
+
+async def run(func, *args, **kwargs):
+    '''Run a blocking DatabaseFunctions callable on the database thread.'''
+    loop = asyncio.get_running_loop()
+    # db_call_seconds includes time queued behind other queries
+    with metrics.timer('db_call_seconds', query=func.__name__):
+        return await loop.run_in_executor(_executor, functools.partial(_timed_query, func, args, kwargs))
+
+def _timed_query(func, args, kwargs):
+    with metrics.timer('db_query_seconds', query=func.__name__):
+        return func(*args, **kwargs)
+
+async def run_migrations():
+    return await run(Migrations.run_migrations)
+
+async def load_event_store():
+    '''Warm the event store with events that have not finished yet.'''
+    # Events are considered done 8 hours after they start
+    since = int(time.time()) - 28800
+    events, signups = await run(dbfunc.fetch_events_with_signups_since, since, event_store.max_events)
+    event_store.load(events, signups)
+    return len(event_store)
+
+async def _get_event_with_signups(event_id):
+    '''An event row and its signups, loaded into the store on a miss. (None, []) if the event does not exist.'''
+    event = event_store.get_event(event_id)
+    if event is not None:
+        return event, event_store.get_signups(event_id)
+
+    event, signups = await run(dbfunc.get_event_with_signups, event_id)
+    if event is not None:
+        event_store.put(event, signups)
+
+    return event, signups
+
+async def close():
+    await run(dbfunc.close_connection)
+
+async def get_event_info(event_id):
+    event, _ = await _get_event_with_signups(event_id)
+    return event
+
+async def refresh_event(event_id):
+    '''Read an event again from SQLite, for when another process may have changed it.
+
+    Returns the events row, or None if the event was deleted.
+    '''
+    event_store.remove_event(event_id)
+    return await get_event_info(event_id)
+
+async def get_guild_channel_id(guild_id):
+    return await run(dbfunc.get_guild_channel_id, guild_id)
+
+async def fetch_distinct_player_signup_events(player_id, guild_id):
+    return await run(dbfunc.fetch_distinct_player_signup_events, player_id, guild_id)
+
+async def fetch_events():
+    return await run(dbfunc.fetch_events)
+
+async def fetch_events_starting_before(unix_timestamp, shard_count=1, shard_id=0):
+    return await run(dbfunc.fetch_events_starting_before, unix_timestamp, shard_count, shard_id)
+
+async def fetch_done_prompts_before(deadline, shard_count=1, shard_id=0):
+    return await run(dbfunc.fetch_done_prompts_before, deadline, shard_count, shard_id)
+
+async def fetch_event_ids():
+    return await run(dbfunc.fetch_event_ids)
+
+async def fetch_event_role_signup_info(event_id, role):
+    _, signups = await _get_event_with_signups(event_id)
+    return [row for row in signups if row[SIGNUP_ROLE] == role]
+
+async def fetch_event_signup_distinct_player_ids(event_id):
+    _, signups = await _get_event_with_signups(event_id)
+    player_ids = dict.fromkeys(row[SIGNUP_PLAYER_ID] for row in signups)
+    return [(player_id,) for player_id in player_ids]
+
+async def fetch_event_signup_info(event_id):
+    _, signups = await _get_event_with_signups(event_id)
+    return signups
+
+async def fetch_guild_channel_ids():
+    return await run(dbfunc.fetch_guild_channel_ids)
+
+async def fetch_scheduled_event_ids():
+    return await run(dbfunc.fetch_scheduled_event_ids)
+
+async def insert_done_prompt(event_id, host_id, channel_id, message_id, deadline):
+    await run(dbfunc.insert_done_prompt, event_id, host_id, channel_id, message_id, deadline)
+    event_store.update_event(event_id, {NO_AUTO_DELETE: 'Pending'})
+
+async def set_db_event_timestamp(event_id, timestamp):
+    await run(dbfunc.set_db_event_timestamp, event_id, timestamp)
+    event_store.update_event(event_id, {UNIX_TIMESTAMP: timestamp})
+
+async def set_db_event_title(event_id, title):
+    await run(dbfunc.set_db_event_title, event_id, title)
+    event_store.update_event(event_id, {TITLE: title})
+
+async def set_guild_channel_id(guild_id, channel_id):
+    await run(dbfunc.set_guild_channel_id, guild_id, channel_id)
+
+async def set_no_auto_delete(event_id, value):
+    await run(dbfunc.set_no_auto_delete, event_id, value)
+    event_store.update_event(event_id, {NO_AUTO_DELETE: value})
+
+async def insert_event(event_id, user_name, user_id, unix_timestamp, title, guild_id, schdl_event_id, channel_id=None):
+    await run(dbfunc.insert_event, event_id, user_name, user_id, unix_timestamp, title, guild_id, schdl_event_id, channel_id)
+    event_store.put(
+        (int(event_id), user_name, user_id, unix_timestamp, title, None, None, guild_id, None, schdl_event_id, channel_id),
+        []
+    )
+
+async def set_events_channel_id(event_ids, channel_id):
+    await run(dbfunc.set_events_channel_id, event_ids, channel_id)
+    for event_id in event_ids:
+        event_store.update_event(event_id, {CHANNEL_ID: int(channel_id)})
+
+async def insert_event_limits(event_id, dps_limit, support_limit):
+    await run(dbfunc.insert_event_limits, event_id, dps_limit, support_limit)
+    event_store.update_event(event_id, {DPS_LIMIT: dps_limit, SUPPORT_LIMIT: support_limit})
+
+async def insert_event_signup(event_id, user_name, user_id, role, timestamp):
+    await run(dbfunc.insert_event_signup, event_id, user_name, user_id, role, timestamp)
+    # The database picked the signup_seq, so reload the event on its next read
+    event_store.remove_event(event_id)
+
+async def try_signup(event_id, user_name, user_id, role, timestamp):
+    status, event, signups = await run(dbfunc.try_signup, event_id, user_name, user_id, role, timestamp)
+    if status == SIGNUP_ADDED:
+        # The new row, with the signup_seq the database gave it, is the last in signup order
+        event_store.add_signup(signups[-1])
+
+    return status, event, signups
+
+async def delete_event(event_id):
+    result = await run(dbfunc.delete_event, event_id)
+    event_store.remove_event(event_id)
+    return result
+
+async def delete_events(event_ids):
+    result = await run(dbfunc.delete_events, event_ids)
+    for row in result:
+        event_store.remove_event(row[0])
+
+    return result
+
+async def delete_orphan_signups():
+    return await run(dbfunc.delete_orphan_signups)
+
+async def delete_event_by_id(event_id):
+    await run(dbfunc.delete_event_by_id, event_id)
+    event_store.remove_event(event_id)
+
+async def delete_latest_n_role_signups(event_id, role, n):
+    result = await run(dbfunc.delete_latest_n_role_signups, event_id, role, n)
+    for row in result:
+        event_store.remove_signups(event_id, row[1], role)
+
+    return result
+
+async def delete_done_prompt(event_id):
+    return await run(dbfunc.delete_done_prompt, event_id)
+
+async def delete_user_from_signups(event_id, user_id):
+    await run(dbfunc.delete_user_from_signups, event_id, user_id)
+    event_store.remove_signups(event_id, user_id)
+
+async def is_signed_up_role(event_id, player_id, role):
+    _, signups = await _get_event_with_signups(event_id)
+    for row in signups:
+        if row[SIGNUP_PLAYER_ID] == int(player_id) and row[SIGNUP_ROLE] == role:
+            return row
+
+    return None
@@ -0,0 +1,111 @@
+import copy
+import datetime
+import json
+import logging
+import os
+import queue
+import traceback
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Records are handed to a queue on the event loop and written to disk by a
+# background thread. Messages go to message_log, errors with their traceback
+# to exception_log, and both files rotate once they reach max_bytes.
+logger = logging.getLogger('dudelbot')
+_listener = None
+
+# Context attributes that log_message/log_error attach to records
+CONTEXT_FIELDS = ['guild_id', 'event_id', 'user_id', 'command']
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # The default prepare() folds the traceback into the message. Keep them
+        # apart so the JSON formatter can write the traceback as its own field.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+class TextFormatter(logging.Formatter):
+    '''The original log layout: a timestamp line, the message and a blank line.'''
+    def __init__(self):
+        super().__init__('%(asctime)s\n%(message)s\n', datefmt='%b/%d/%y - %I:%M:%S %p')
+
+    def format(self, record):
+        context = ' '.join(f'{field}={getattr(record, field)}' for field in CONTEXT_FIELDS if getattr(record, field, None) is not None)
+        text = super().format(record)
+        if context:
+            timestamp, rest = text.split('\n', 1)
+            text = f'{timestamp} [{context}]\n{rest}'
+        return text
+
+class JsonFormatter(logging.Formatter):
+    '''One JSON object per line.'''
+    def format(self, record):
+        entry = {
+            'time' : datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level' : record.levelname,
+            'message' : record.getMessage()
+        }
+        for field in CONTEXT_FIELDS:
+            if getattr(record, field, None) is not None:
+                entry[field] = getattr(record, field)
+        if record.exc_text:
+            entry['traceback'] = record.exc_text
+        return json.dumps(entry)
+
+def setup_logging(log_dir='./logs', json_lines=False, max_bytes=5 * 1024 * 1024, backup_count=5):
+    global _listener
+    if _listener is not None:
+        return
+
+    os.makedirs(log_dir, exist_ok=True)
+    extension = 'jsonl' if json_lines else 'log'
+    formatter = JsonFormatter() if json_lines else TextFormatter()
+
+    message_handler = RotatingFileHandler(
+        os.path.join(log_dir, f'message_log.{extension}'), maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    message_handler.setFormatter(formatter)
+    message_handler.addFilter(lambda record: record.levelno < logging.ERROR)
+
+    error_handler = RotatingFileHandler(
+        os.path.join(log_dir, f'exception_log.{extension}'), maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    error_handler.setFormatter(formatter)
+    error_handler.setLevel(logging.ERROR)
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(_QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    _listener = QueueListener(log_queue, message_handler, error_handler, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    '''Write out whatever is queued and stop the background thread.'''
+    global _listener
+    if _listener is not None:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def _context(interaction=None, event_id=None):
+    context = {'event_id' : event_id}
+    if interaction is not None:
+        context['guild_id'] = interaction.guild_id
+        context['user_id'] = interaction.user.id
+        context['command'] = interaction.command.name if interaction.command is not None else None
+    return context
+
+def log_message(message, interaction=None, event_id=None):
+    logger.info(str(message), extra=_context(interaction, event_id))
+
+def log_error(message='Unhandled exception', interaction=None, event_id=None, exc=None):
+    '''Log an error with a traceback: exc if given, otherwise the exception being handled.'''
+    logger.error(message, exc_info=exc if exc is not None else True, extra=_context(interaction, event_id))
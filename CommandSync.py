@@ -0,0 +1,45 @@
+import hashlib
+import json
+import os
+
+HASH_PATH = './data/command_hashes.json'
+
+def tree_hash(tree, guild=None):
+    '''Stable hash of the commands tree.sync(guild=guild) would upload.'''
+    payload = [command.to_dict(tree) for command in tree.get_commands(guild=guild)]
+    payload.sort(key=lambda command: (command['type'], command['name']))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def _load_hashes():
+    try:
+        with open(HASH_PATH, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def _store_hash(key, digest):
+    hashes = _load_hashes()
+    hashes[key] = digest
+    os.makedirs(os.path.dirname(HASH_PATH), exist_ok=True)
+    with open(HASH_PATH + '.tmp', 'w') as file:
+        json.dump(hashes, file, indent=2)
+    os.replace(HASH_PATH + '.tmp', HASH_PATH)
+
+def _key(tree, guild):
+    # Keyed by application too, in case a test bot shares the data directory
+    return f'{tree.client.application_id}:{guild.id if guild is not None else "global"}'
+
+async def sync_if_changed(tree, guild=None, force=False):
+    '''Sync the global or one guild's commands unless they match the last sync.
+
+    Returns True if a sync was sent. The hash is stored only after Discord
+    accepts the sync, so a failed sync is retried on the next start.
+    '''
+    digest = tree_hash(tree, guild)
+    key = _key(tree, guild)
+    if not force and _load_hashes().get(key) == digest:
+        return False
+
+    await tree.sync(guild=guild)
+    _store_hash(key, digest)
+    return True
@@ -1,201 +1,373 @@
 import sqlite3
+from contextlib import contextmanager
 
 DB_PATH = './data/db/DudelBotData.db'
 
+# events column holding the signup limit for each role
+ROLE_LIMIT_COLUMNS = {
+    'DPS' : 'dps_limit',
+    'Support' : 'support_limit'
+}
+
+# try_signup results
+SIGNUP_ADDED = 'added'
+SIGNUP_DUPLICATE = 'duplicate'
+SIGNUP_FULL = 'full'
+SIGNUP_NO_EVENT = 'no_event'
+
+# Long-lived connection shared by every helper in this module. The helpers are
+# blocking, so the bot only calls them through AsyncDatabaseFunctions, which runs
+# them on a single dedicated worker thread.
+_con = None
+
+def get_connection():
+    global _con
+    if _con is None:
+        # isolation_level=None puts the connection in autocommit mode so single
+        # statements commit immediately and multi-statement writes use transaction()
+        _con = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        _con.execute('PRAGMA journal_mode=WAL')
+        _con.execute('PRAGMA synchronous=NORMAL')
+        _con.execute('PRAGMA busy_timeout=5000')
+
+    return _con
+
+def close_connection():
+    global _con
+    if _con is not None:
+        _con.close()
+        _con = None
+
+@contextmanager
+def transaction():
+    '''Run the enclosed statements as one write transaction.'''
+    cur = get_connection().cursor()
+    cur.execute('BEGIN IMMEDIATE')
+    try:
+        yield cur
+    except BaseException:
+        cur.execute('ROLLBACK')
+        raise
+    else:
+        cur.execute('COMMIT')
+
 def get_event_info(event_id):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     result = cur.execute("SELECT * FROM events WHERE event_id=?", (int(event_id),)).fetchone()
-    con.close()
 
     return result
 
+def get_event_with_signups(event_id):
+    cur = get_connection().cursor()
+    event = cur.execute("SELECT * FROM events WHERE event_id=?", (int(event_id),)).fetchone()
+    signups = cur.execute("SELECT * FROM signups WHERE event_id=? ORDER BY signup_seq", (int(event_id),)).fetchall()
+
+    return event, signups
+
 def get_guild_channel_id(guild_id):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     result = cur.execute("SELECT channel_id FROM guild_channel_id WHERE guild_id=?", (int(guild_id),)).fetchone()
-    con.close()
 
     return result
 
 def fetch_distinct_player_signup_events(player_id, guild_id):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     result = cur.execute(
         """SELECT * FROM events 
-        NATURAL JOIN signups 
-        WHERE signups.player_id=? AND events.guild_id=?
-        GROUP BY event_id 
-        ORDER BY events.unix_timestamp ASC""",
-        (int(player_id), int(guild_id))
+        WHERE guild_id=? AND event_id IN (
+            SELECT event_id FROM signups WHERE player_id=?
+            )
+        ORDER BY unix_timestamp ASC""",
+        (int(guild_id), int(player_id))
     ).fetchall()
-    con.close()
 
     return result
 
 def fetch_events():
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     result = cur.execute("SELECT * FROM events").fetchall()
-    con.close()
+
+    return result
+
+def fetch_events_with_signups_since(unix_timestamp, limit):
+    cur = get_connection().cursor()
+    events = cur.execute(
+        "SELECT * FROM events WHERE unix_timestamp>=? ORDER BY unix_timestamp ASC LIMIT ?",
+        (int(unix_timestamp), int(limit))
+    ).fetchall()
+    signups = cur.execute(
+        """SELECT * FROM signups WHERE event_id IN (
+            SELECT event_id FROM events WHERE unix_timestamp>=? ORDER BY unix_timestamp ASC LIMIT ?
+            )
+        ORDER BY event_id, signup_seq""",
+        (int(unix_timestamp), int(limit))
+    ).fetchall()
+
+    return events, signups
+
+def fetch_events_starting_before(unix_timestamp, shard_count=1, shard_id=0):
+    '''Event ids and start times of events that start before unix_timestamp and can still be auto deleted.
+
+    Only events from guilds on shard_id out of shard_count are returned.
+    '''
+    cur = get_connection().cursor()
+    result = cur.execute(
+        """SELECT event_id, unix_timestamp FROM events 
+        WHERE unix_timestamp<=? 
+        AND (no_auto_delete IS NULL OR no_auto_delete NOT IN ('True', 'Pending'))
+        AND (IFNULL(guild_id, 0) >> 22) % ? = ?""",
+        (int(unix_timestamp), int(shard_count), int(shard_id))
+    ).fetchall()
+
+    return result
+
+def fetch_done_prompts_before(deadline, shard_count=1, shard_id=0):
+    cur = get_connection().cursor()
+    result = cur.execute(
+        """SELECT done_prompts.event_id, deadline FROM done_prompts 
+        JOIN events ON events.event_id = done_prompts.event_id 
+        WHERE deadline<=? AND (IFNULL(events.guild_id, 0) >> 22) % ? = ?""",
+        (int(deadline), int(shard_count), int(shard_id))
+    ).fetchall()
 
     return result
 
 def fetch_event_ids():
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     result = cur.execute("SELECT event_id FROM events").fetchall()
-    con.close()
 
     return result
 
 def fetch_event_role_signup_info(event_id, role):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    result = cur.execute("SELECT * FROM signups WHERE event_id=? AND role=?", (int(event_id), role)).fetchall()
-    con.close()
+    cur = get_connection().cursor()
+    result = cur.execute("SELECT * FROM signups WHERE event_id=? AND role=? ORDER BY signup_seq", (int(event_id), role)).fetchall()
     
     return result
 
 def fetch_event_signup_distinct_player_ids(event_id):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     result = cur.execute("SELECT DISTINCT player_id FROM signups WHERE event_id=?", (int(event_id),)).fetchall()
-    con.close()
 
     return result
 
 def fetch_event_signup_info(event_id):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    result = cur.execute("SELECT * FROM signups WHERE event_id=?", (int(event_id),)).fetchall()
-    con.close()
+    cur = get_connection().cursor()
+    result = cur.execute("SELECT * FROM signups WHERE event_id=? ORDER BY signup_seq", (int(event_id),)).fetchall()
     
     return result
 
 def fetch_guild_channel_ids():
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     result = cur.execute("SELECT * FROM guild_channel_id").fetchall()
-    con.close()
 
     return result
 
 def fetch_scheduled_event_ids():
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     result = cur.execute("SELECT scheduled_event_id FROM events").fetchall()
-    con.close()
 
     return result
 
+def insert_done_prompt(event_id, host_id, channel_id, message_id, deadline):
+    '''Record a sent end-event prompt and mark its event as Pending.'''
+    with transaction() as cur:
+        cur.execute(
+            "INSERT OR REPLACE INTO done_prompts VALUES (?, ?, ?, ?, ?)",
+            (int(event_id), host_id, channel_id, message_id, deadline)
+        )
+        cur.execute("UPDATE events SET no_auto_delete='Pending' WHERE event_id=?", (int(event_id),))
+
 def set_db_event_timestamp(event_id, timestamp):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     cur.execute("UPDATE events SET unix_timestamp=? WHERE event_id=?", (timestamp, int(event_id)))
-    con.commit()
-    con.close()
 
 def set_db_event_title(event_id, title):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     cur.execute("UPDATE events SET title=? WHERE event_id=?", (title, int(event_id)))
-    con.commit()
-    con.close()
     
+def set_guild_channel_id(guild_id, channel_id):
+    with transaction() as cur:
+        result = cur.execute("SELECT channel_id FROM guild_channel_id WHERE guild_id=?", (int(guild_id),)).fetchone()
+
+        # Channel ID for the current guild has been set before. Update it instead.
+        if result:
+            cur.execute("UPDATE guild_channel_id SET channel_id=? WHERE guild_id=?", (int(channel_id), int(guild_id)))
+
+        # Channel ID for the current guild has never been set. Add it to the database.
+        else:
+            cur.execute("INSERT INTO guild_channel_id VALUES (?, ?)", (int(guild_id), int(channel_id)))
+
 def set_no_auto_delete(event_id, value):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     cur.execute("UPDATE events SET no_auto_delete=? WHERE event_id=?", (value, int(event_id)))
-    con.commit()
-    con.close()
 
-def insert_event(event_id, user_name, user_id, unix_timestamp, title, guild_id, schdl_event_id):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+def insert_event(event_id, user_name, user_id, unix_timestamp, title, guild_id, schdl_event_id, channel_id=None):
+    cur = get_connection().cursor()
     cur.execute(
-        "INSERT INTO events VALUES (?, ?, ?, ?, ?, NULL, NULL, ?, NULL, ?)", 
-        (int(event_id), user_name, user_id, unix_timestamp, title, guild_id, schdl_event_id)
+        "INSERT INTO events VALUES (?, ?, ?, ?, ?, NULL, NULL, ?, NULL, ?, ?)", 
+        (int(event_id), user_name, user_id, unix_timestamp, title, guild_id, schdl_event_id, channel_id)
+    )
+
+def set_events_channel_id(event_ids, channel_id):
+    '''Record the channel of events whose channel was unknown.'''
+    event_ids = [int(event_id) for event_id in event_ids]
+    if not event_ids:
+        return
+
+    placeholders = ','.join('?' * len(event_ids))
+    cur = get_connection().cursor()
+    cur.execute(
+        f"UPDATE events SET channel_id=? WHERE channel_id IS NULL AND event_id IN ({placeholders})",
+        [int(channel_id)] + event_ids
     )
-    con.commit()
-    con.close()
 
 def insert_event_limits(event_id, dps_limit, support_limit):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     cur.execute(
         """UPDATE events 
         SET dps_limit=?, support_limit=?
         WHERE event_id=?""", 
         (dps_limit, support_limit, event_id)
     )
-    con.commit()
-    con.close()
 
 def insert_event_signup(event_id, user_name, user_id, role, timestamp):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    cur.execute(
-        'INSERT INTO signups VALUES(?, ?, ?, ?, ?)',
-        (int(event_id), user_name, user_id, role, timestamp)
+    with transaction() as cur:
+        cur.execute(
+            """INSERT OR IGNORE INTO signups (event_id, player_name, player_id, role, signup_timestamp, signup_seq)
+            VALUES (?, ?, ?, ?, ?, (SELECT IFNULL(MAX(signup_seq), 0) + 1 FROM signups WHERE event_id=?))""",
+            (int(event_id), user_name, user_id, role, timestamp, int(event_id))
+            )
+
+def try_signup(event_id, user_name, user_id, role, timestamp):
+    '''Sign a player up for a role unless they already are or the role is full.
+
+    The duplicate check, limit check and insert are a single statement inside
+    a BEGIN IMMEDIATE transaction, so concurrent signups cannot overbook a role
+    even from another process. The transaction also makes the next signup_seq
+    unique. Returns (status, event row, role signups rows in signup order).
+    '''
+    limit_column = ROLE_LIMIT_COLUMNS[role]
+    with transaction() as cur:
+        cur.execute(
+            f"""INSERT INTO signups (event_id, player_name, player_id, role, signup_timestamp, signup_seq)
+            SELECT event_id, ?, ?, ?, ?, (SELECT IFNULL(MAX(signup_seq), 0) + 1 FROM signups WHERE event_id=events.event_id)
+            FROM events
+            WHERE event_id=? AND (
+                {limit_column} IS NULL
+                OR {limit_column} > (SELECT COUNT(*) FROM signups WHERE event_id=? AND role=?)
+                )
+            ON CONFLICT (event_id, player_id, role) DO NOTHING""",
+            (user_name, user_id, role, timestamp, int(event_id), int(event_id), role)
         )
-    con.commit()
-    con.close()
+        added = cur.rowcount == 1
+        event = cur.execute("SELECT * FROM events WHERE event_id=?", (int(event_id),)).fetchone()
+        signups = cur.execute("SELECT * FROM signups WHERE event_id=? AND role=? ORDER BY signup_seq", (int(event_id), role)).fetchall()
+
+    if added:
+        status = SIGNUP_ADDED
+    elif event is None:
+        status = SIGNUP_NO_EVENT
+    elif any(row[2] == user_id for row in signups):
+        status = SIGNUP_DUPLICATE
+    else:
+        status = SIGNUP_FULL
+
+    return status, event, signups
+
+def delete_event(event_id):
+    '''Delete an event and all of its signups in one transaction.
+
+    Returns (event row, distinct signed up player ids), or (None, []) if the
+    event was already deleted.
+    '''
+    with transaction() as cur:
+        event = cur.execute("SELECT * FROM events WHERE event_id=?", (int(event_id),)).fetchone()
+        if event is None:
+            return None, []
+
+        player_ids = cur.execute(
+            "SELECT DISTINCT player_id FROM signups WHERE event_id=?",
+            (int(event_id),)
+        ).fetchall()
+        cur.execute("DELETE FROM signups WHERE event_id=?", (int(event_id),))
+        cur.execute("DELETE FROM done_prompts WHERE event_id=?", (int(event_id),))
+        cur.execute("DELETE FROM events WHERE event_id=?", (int(event_id),))
+
+    return event, [row[0] for row in player_ids]
+
+def delete_events(event_ids):
+    '''Delete a batch of events with their signups and done prompts in one transaction.
+
+    Returns the rows of the events that were deleted.
+    '''
+    event_ids = [int(event_id) for event_id in event_ids]
+    if not event_ids:
+        return []
+
+    placeholders = ','.join('?' * len(event_ids))
+    with transaction() as cur:
+        cur.execute(f"DELETE FROM signups WHERE event_id IN ({placeholders})", event_ids)
+        cur.execute(f"DELETE FROM done_prompts WHERE event_id IN ({placeholders})", event_ids)
+        result = cur.execute(f"DELETE FROM events WHERE event_id IN ({placeholders}) RETURNING *", event_ids).fetchall()
+
+    return result
+
+def delete_orphan_signups():
+    '''Delete signups whose event no longer exists. Returns the number of rows deleted.'''
+    cur = get_connection().cursor()
+    cur.execute("DELETE FROM signups WHERE event_id NOT IN (SELECT event_id FROM events)")
+
+    return cur.rowcount
 
 def delete_event_by_id(event_id):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     cur.execute("DELETE FROM events WHERE event_id=?",(int(event_id),))
-    con.commit()
-    con.close()
 
 def delete_latest_n_role_signups(event_id, role, n):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    '''Remove the n latest signups for a role in one statement.
+
+    Returns the removed (player_name, player_id, signup_timestamp) rows, latest
+    first. They are exactly the rows deleted, even when signups share a timestamp.
+    '''
+    cur = get_connection().cursor()
     result = cur.execute(
-        """SELECT player_name, player_id, signup_timestamp 
-        FROM signups 
-        WHERE event_id=? AND role=?
-        ORDER BY signup_timestamp DESC 
-        LIMIT ?""",
-        (event_id, role, n)
-    ).fetchall()
-    cur.execute(
         """DELETE FROM signups 
-        WHERE event_id=? AND role=? 
-        AND player_id IN (
-            SELECT player_id 
+        WHERE rowid IN (
+            SELECT rowid 
             FROM signups 
             WHERE event_id=? AND role=?
-            ORDER BY signup_timestamp DESC 
+            ORDER BY signup_seq DESC 
             LIMIT ?
-            )""",
-        (event_id, role, event_id, role, n)
-    )
-    con.commit()
-    con.close()
+            )
+        RETURNING player_name, player_id, signup_timestamp, signup_seq""",
+        (int(event_id), role, int(n))
+    ).fetchall()
+    # RETURNING has no defined order
+    result.sort(key=lambda row: row[3], reverse=True)
+
+    return [row[:3] for row in result]
+
+def delete_done_prompt(event_id):
+    '''Remove a prompt. Returns its row, or None if it was already resolved.'''
+    cur = get_connection().cursor()
+    result = cur.execute("DELETE FROM done_prompts WHERE event_id=? RETURNING *", (int(event_id),)).fetchone()
 
     return result
 
 def delete_user_from_signups(event_id, user_id):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     cur.execute(
         "DELETE FROM signups WHERE event_id=? AND player_id=?",
         (int(event_id), user_id)
         )
-    con.commit()
-    con.close()
 
 def is_signed_up_role(event_id, player_id, role):
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
+    cur = get_connection().cursor()
     result = cur.execute((
         "SELECT * FROM signups "
         "WHERE event_id=? AND player_id=? AND role=?"
         ),
         (int(event_id), int(player_id), role)
     ).fetchone()
-    con.close()
 
     return result
\ No newline at end of file
@@ -2,31 +2,134 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from os import listdir, getenv
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from datetime import datetime as dt
-import traceback
+import yarl
+import time
+import asyncio
 import Exceptions
+import BotLogging
+import Metrics
+import CommandSync
+import Sharding
+from InteractionTrace import InteractionRecorder
+from LeaderElection import FileLock, LeaderElection
 import cogs.Events
-import DatabaseFunctions as dbfunc
+import AsyncDatabaseFunctions as adbfunc
 
-class MyBot(commands.Bot):
-    def __init__(self, intents):
-        super().__init__(command_prefix='/', intents=intents, help_command=None)
+class MyBot(commands.AutoShardedBot):
+    def __init__(self, intents, dev_id, dev_guild, shard_count=1, shard_ids=None):
+        super().__init__(command_prefix='/', intents=intents, help_command=None, shard_count=shard_count, shard_ids=shard_ids)
+        self.dev_id = dev_id
+        self.dev_guild = dev_guild
         self.db_path = './data/db/DudelBotData.db'
         self.guild_channels = {}
+        # Launcher.py gives each worker process its own log directory
+        self.log_dir = getenv('LOG_DIR', './logs')
+        self.metrics_writer = Metrics.PrometheusWriter(path=f'{self.log_dir}/metrics.prom')
+        # Picks one process to run singleton jobs when several share the database
+        self.leader = LeaderElection('./data/db/leader.lock')
+        self.leader_task = None
+        # Set RECORD_INTERACTIONS to a file path to capture a replayable trace
+        trace_path = getenv('RECORD_INTERACTIONS')
+        self.recorder = InteractionRecorder(trace_path) if trace_path else None
+
+    @property
+    def owned_shard_ids(self):
+        '''The shards this process connects to.'''
+        return self.shard_ids if self.shard_ids is not None else list(range(self.shard_count))
+
+    def owns_guild(self, guild_id):
+        return Sharding.shard_id_for(guild_id, self.shard_count) in self.owned_shard_ids
 
     async def setup_hook(self):
-        await self.init_cogs()
-        self.events = self.get_cog('Events')
-        self.add_view(cogs.Events.EventView(self.events))
-        await self.tree.sync()
+        # With SHARD_COUNT=auto, ask Discord now so the cogs can partition their work by shard
+        if self.shard_count is None:
+            self.shard_count, _, _ = await self.http.get_bot_gateway()
+        BotLogging.setup_logging(log_dir=self.log_dir, json_lines=getenv('LOG_FORMAT') == 'json')
+        BotLogging.log_message(f'Running shards {self.owned_shard_ids} of {self.shard_count}')
+        # Time REST calls from the bot and from interaction responses
+        Metrics.instrument_requests(self.http)
+        Metrics.instrument_requests(discord.webhook.async_.async_context.get())
+        self.metrics_writer.start()
+        if self.recorder is not None:
+            self.recorder.start()
+        # Processes starting together take turns, and the first one migrates
+        migration_lock = FileLock('./data/db/migrations.lock')
+        with self.startup_phase('migrations'):
+            await asyncio.to_thread(migration_lock.acquire)
+            try:
+                applied = await adbfunc.run_migrations()
+            finally:
+                migration_lock.release()
+        if applied:
+            BotLogging.log_message(f'Applied database migrations: {applied}')
+        with self.startup_phase('event store'):
+            # Other processes change the events of their own guilds, so only cache ours
+            adbfunc.event_store.owns_guild = self.owns_guild
+            await adbfunc.load_event_store()
+        with self.startup_phase('cog load'):
+            await self.init_cogs()
+        with self.startup_phase('view registration'):
+            self.events = self.get_cog('Events')
+            # Includes the Full roster button so it works on every event that shows it
+            self.add_view(cogs.Events.EventView(self.events, full_roster=True))
+        # Syncing is rate limited, so only the leader syncs. A follower takes
+        # over the leader's jobs if it wins the lock later.
+        with self.startup_phase('sync'):
+            if self.leader.start():
+                await self.run_leader_jobs()
+            else:
+                self.leader_task = asyncio.create_task(self.wait_for_leadership())
+
+    async def wait_for_leadership(self):
+        await self.leader.elected.wait()
+        await self.run_leader_jobs()
+
+    async def run_leader_jobs(self):
+        # Only command sets that changed since the last sync are sent
+        for guild in [None, self.dev_guild]:
+            name = 'global' if guild is None else f'guild {guild.id}'
+            try:
+                if await CommandSync.sync_if_changed(self.tree, guild=guild):
+                    BotLogging.log_message(f'Synced {name} commands')
+            # e.g. Forbidden when the bot isn't in DEV_GUILD. Commands still work, so keep starting.
+            except discord.HTTPException as e:
+                BotLogging.log_error(f'Could not sync {name} commands', exc=e)
+
+    async def close(self):
+        await super().close()
+        await adbfunc.close()
+        await self.metrics_writer.close()
+        if self.leader_task is not None:
+            self.leader_task.cancel()
+            await asyncio.gather(self.leader_task, return_exceptions=True)
+        await self.leader.close()
+        BotLogging.stop_logging()
+        if self.recorder is not None:
+            self.recorder.stop()
+
+    @contextmanager
+    def startup_phase(self, name):
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        Metrics.metrics.observe('startup_seconds', seconds, phase=name)
+        BotLogging.log_message(f'Startup phase {name} took {seconds * 1000:.1f} ms')
 
     async def on_ready(self):
-        for row in dbfunc.fetch_guild_channel_ids():
-            self.guild_channels.update({row[0]: row[1]})
+        with self.startup_phase('guild channel load'):
+            # Every guild, not just this process's shards. Done prompt answers
+            # arrive in DMs on shard 0 for events in any guild.
+            for row in await adbfunc.fetch_guild_channel_ids():
+                self.guild_channels.update({row[0]: row[1]})
         print(f'Logged in as {self.user} (ID: {self.user.id})!')
         print('-----------------------------------------------------')
 
+    async def on_interaction(self, interaction):
+        if self.recorder is not None:
+            self.recorder.record(interaction)
+
     async def init_cogs(self):
         for filename in self.fetch_cog_filenames():
             await self.load_extension(f'cogs.{filename}')
@@ -34,22 +137,6 @@ class MyBot(commands.Bot):
     def fetch_cog_filenames(self):
         return [f[:-3] for f in listdir('./cogs') if f.endswith('.py')]
 
-    def log_error(self):
-        f = open('./logs/exception_log.log', 'a')
-        f.write(dt.now().strftime('%b/%d/%y - %I:%M:%S %p'))
-        f.write('\n')
-        f.write(traceback.format_exc())
-        f.write('\n\n')
-        f.close()
-
-    def log_message(self, message):
-        f = open('./logs/message_log.log', 'a')
-        f.write(dt.now().strftime('%b/%d/%y - %I:%M:%S %p'))
-        f.write('\n')
-        f.write(str(message))
-        f.write('\n\n')
-        f.close()
-
 # DudelBot needs the 'bot' scope and the following bot permissions:
 #   Read Messages/View Channels
 #   Manage Events
@@ -68,65 +155,64 @@ intents = discord.Intents(
     message_content=True,
     messages=True
 )
-load_dotenv()
-token = getenv('DISCORD_TOKEN')
-dev_id = int(getenv('DEV_ID'))
-dev_guild = discord.Object(int(getenv('DEV_GUILD')))
-bot = MyBot(intents=intents)
 
+# The commands below are added to the bot's tree in main()
 def is_dev(interaction: discord.Interaction):
-        if interaction.user.id != dev_id:
+        if interaction.user.id != interaction.client.dev_id:
             raise Exceptions.UserNotDev()
         else:
             return True
 
 # Sync
-@bot.tree.command()
+@app_commands.command()
 @app_commands.check(is_dev)
 async def sync(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    await bot.tree.sync()
+    await CommandSync.sync_if_changed(interaction.client.tree, force=True)
     await interaction.followup.send('Synced. Commands can take up to an hour to show up. Please be patient if you do not see your commands right away.')
 
 # Guild Sync
-@bot.tree.command(name='guildsync')
+@app_commands.command(name='guildsync')
 @app_commands.check(is_dev)
 async def guild_sync(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    bot.tree.copy_global_to(guild=interaction.guild)
-    await bot.tree.sync(guild=interaction.guild)
+    interaction.client.tree.copy_global_to(guild=interaction.guild)
+    # Not recorded in the command hashes. The copied global commands aren't in
+    # the tree on the next start, so a recorded hash would make startup sync
+    # the guild again and remove them.
+    await interaction.client.tree.sync(guild=interaction.guild)
     await interaction.followup.send('Synced.')
 
 # Load Cog
-@bot.tree.command(name='loadcog', guild=dev_guild)
+@app_commands.command(name='loadcog')
 @app_commands.check(is_dev)
 async def load_cog(interaction: discord.Interaction, cog_name: str):
     await interaction.response.defer(ephemeral=True)
-    await bot.load_extension(f'cogs.{cog_name}')
+    await interaction.client.load_extension(f'cogs.{cog_name}')
     await interaction.followup.send(f'Loaded cog: {cog_name}')
 
 # Unload cog
-@bot.tree.command(name='unloadcog', guild=dev_guild)
+@app_commands.command(name='unloadcog')
 @app_commands.check(is_dev)
 async def unload_cog(interaction: discord.Interaction, cog_name: str):
     await interaction.response.defer(ephemeral=True)
-    await bot.unload_extension(f'cogs.{cog_name}')
+    await interaction.client.unload_extension(f'cogs.{cog_name}')
     await interaction.followup.send(f'Unloaded cog: {cog_name}')
 
 # Reload cog
-@bot.tree.command(name='reloadcog', guild=dev_guild)
+@app_commands.command(name='reloadcog')
 @app_commands.check(is_dev)
 async def reload_cog(interaction: discord.Interaction, cog_name: str):
     await interaction.response.defer(ephemeral=True)
-    await bot.reload_extension(f'cogs.{cog_name}')
+    await interaction.client.reload_extension(f'cogs.{cog_name}')
     await interaction.followup.send(f'Reloaded cog: {cog_name}')
 
 # Display available extensions
-@bot.tree.command(guild=dev_guild)
+@app_commands.command()
 @app_commands.check(is_dev)
 async def extensions(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    cog_filenames = bot.fetch_cog_filenames()
+    cog_filenames = interaction.client.fetch_cog_filenames()
     file_string = '\n'.join(cog_filenames)
     if file_string == '':
         await interaction.followup.send('No available extensions')
@@ -135,49 +221,98 @@ async def extensions(interaction: discord.Interaction):
         await interaction.followup.send(f'The following extensions are available:\n>>> {file_string}')
 
 # Display loaded extensions
-@bot.tree.command(name='loadedextensions', guild=dev_guild)
+@app_commands.command(name='loadedextensions')
 @app_commands.check(is_dev)
 async def loaded_extensions(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    cog_names = '\n'.join(bot.extensions)
+    cog_names = '\n'.join(interaction.client.extensions)
     if cog_names == '':
         await interaction.followup.send('No extensions are loaded')
     else:
         # >>> followed by a space to create a multi-line block quote
         await interaction.followup.send(f'The following extensions are loaded:\n>>> {cog_names}')
 
+# Display latency histograms and cache stats
+@app_commands.command(name='stats')
+@app_commands.check(is_dev)
+async def stats(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    lines = [f'{"metric":<48} {"count":>6} {"p50 ms":>7} {"p99 ms":>7}']
+    for name, labels, count, p50, p99, mean in Metrics.metrics.summary():
+        label = f'{name}{{{labels}}}' if labels else name
+        lines.append(f'{label[:48]:<48} {count:>6} {p50 * 1000:>7.1f} {p99 * 1000:>7.1f}')
+
+    store = adbfunc.event_store
+    lines.append('')
+    lines.append(f'event store: {len(store)} events, {store.hits} hits, {store.misses} misses')
+    events = interaction.client.get_cog('Events')
+    if events is not None:
+        lines.append(f'renders: {events.render_scheduler.stats()}')
+        lines.append(f'notifications: {events.notifications.stats()}')
+        lines.append(f'images: {events.image_cache.stats()}')
+        lines.append(f'covers: {events.image_normalizer.stats()}')
+    tasks = interaction.client.get_cog('Tasks')
+    if tasks is not None:
+        lines.append(f'reconciliation: {tasks.reconciler.last_result}')
+
+    # Stay under the 2000 character message limit
+    await interaction.followup.send('```\n' + '\n'.join(lines)[:1980] + '\n```')
+
 # Print a bunch of new lines to clear the terminal
-@bot.tree.command(name='clear', guild=dev_guild)
+@app_commands.command(name='clear')
 @app_commands.check(is_dev)
 async def clear(interaction: discord.Interaction):
     print("\n\n\n\n\n\n\n\n\n\n")
     await interaction.response.send_message("Done", ephemeral=True)
 
-@bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: Exception):
+    cogs.Events.record_command(interaction, 'error')
     # await interaction.response.defer()
     if isinstance(error, Exceptions.UserNotDev):
         await interaction.response.send_message('You are not a dev.')
 
     elif isinstance(error, app_commands.MissingPermissions):
         missing_perms = '\n'.join(error.missing_permissions)
-        bot.log_message(f'User ID: {interaction.user.id} ran the {interaction.command.name} command but is missing these permissions:{error.missing_permissions}')
+        BotLogging.log_message(f'User ID: {interaction.user.id} ran the {interaction.command.name} command but is missing these permissions:{error.missing_permissions}', interaction=interaction)
         await interaction.response.send_message(f'You are missing the following permissions:\n>>> {missing_perms}', ephemeral=True)
 
     elif isinstance(error, app_commands.BotMissingPermissions):
         missing_perms = '\n'.join(error.missing_permissions)
-        bot.log_message(f'User ID: {interaction.user.id} ran the {interaction.command.name} command but DudelBot is missing these permissions:{error.missing_permissions}')
+        BotLogging.log_message(f'User ID: {interaction.user.id} ran the {interaction.command.name} command but DudelBot is missing these permissions:{error.missing_permissions}', interaction=interaction)
         await interaction.response.send_message(f'DudelBot is missing the following permissions:\n>>> {missing_perms}', ephemeral=True)
 
     elif isinstance(error, Exceptions.EventChannelNotSet):
-        bot.log_message(f'User ID: {interaction.user.id} ran the {interaction.command.name} command but the event channel is not set.')
+        BotLogging.log_message(f'User ID: {interaction.user.id} ran the {interaction.command.name} command but the event channel is not set.', interaction=interaction)
         await interaction.response.send_message('Event channel is not set. Please have someone with the [Manage Events] permission run the /set_events_channel command', ephemeral=True)
 
     else:
         await interaction.response.send_message('Something went wrong :(. Doodle would appreciate if you let him know about this.', ephemeral=True)
-        bot.log_error()
+        BotLogging.log_error(f'{interaction.command.name if interaction.command else "Unknown"} command failed', interaction=interaction, exc=error)
         # Reraising the error causes this method to run again
         # raise error
 
-bot.run(token)
+def main():
+    load_dotenv()
+    # Point the bot at a mock Discord API, e.g. benchmarks/ReplayTrace.py
+    if getenv('DISCORD_API_BASE'):
+        discord.http.Route.BASE = getenv('DISCORD_API_BASE')
+    if getenv('DISCORD_GATEWAY_URL'):
+        discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(getenv('DISCORD_GATEWAY_URL'))
+    token = getenv('DISCORD_TOKEN')
+    dev_guild = discord.Object(int(getenv('DEV_GUILD')))
+    # Sharding, e.g. SHARD_COUNT=4 and SHARD_IDS=0-1 to run half of four shards here
+    shard_count, shard_ids = Sharding.parse_shard_config(getenv('SHARD_COUNT'), getenv('SHARD_IDS'))
+    bot = MyBot(intents=intents, dev_id=int(getenv('DEV_ID')), dev_guild=dev_guild, shard_count=shard_count, shard_ids=shard_ids)
+
+    for command in [sync, guild_sync]:
+        bot.tree.add_command(command)
+    for command in [load_cog, unload_cog, reload_cog, extensions, loaded_extensions, stats, clear]:
+        bot.tree.add_command(command, guild=dev_guild)
+    bot.tree.error(on_app_command_error)
+    bot.run(token)
+
+# Worker processes, e.g. ImageNormalizer's pool, import this file as __mp_main__.
+# Only start a bot when it is run directly.
+if __name__ == '__main__':
+    main()
 
@@ -0,0 +1,160 @@
+import time
+from collections import OrderedDict
+
+# Column positions in an events row
+EVENT_ID = 0
+HOST_NAME = 1
+HOST_ID = 2
+UNIX_TIMESTAMP = 3
+TITLE = 4
+DPS_LIMIT = 5
+SUPPORT_LIMIT = 6
+GUILD_ID = 7
+NO_AUTO_DELETE = 8
+SCHEDULED_EVENT_ID = 9
+CHANNEL_ID = 10
+
+# Column positions in a signups row
+SIGNUP_PLAYER_ID = 2
+SIGNUP_ROLE = 3
+SIGNUP_SEQ = 5
+
+class EventStore:
+    '''In-memory copy of event rows and their signups.
+
+    AsyncDatabaseFunctions reads through this store and updates it after every
+    write, so rows have the same shape as the ones returned by DatabaseFunctions.
+    The store holds at most max_events events. When it is full, events that have
+    already started are evicted first, oldest access first.
+
+    If owns_guild is set, only events from guilds it accepts are stored. When
+    several processes share the database, an event's rows are mostly changed by
+    the process that runs its guild's shard, so copies elsewhere would go stale.
+    '''
+    def __init__(self, max_events=2000):
+        self.max_events = max_events
+        # event_id : events row, in least to most recently used order
+        self.events = OrderedDict()
+        # event_id : list of signups rows in signup order
+        self.signups = {}
+        # Optional callable taking a guild ID
+        self.owns_guild = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, event_id):
+        return int(event_id) in self.events
+
+    def __len__(self):
+        return len(self.events)
+
+    def clear(self):
+        self.events.clear()
+        self.signups.clear()
+
+    def load(self, event_rows, signup_rows):
+        '''Replace the store contents with rows read from the database.'''
+        self.clear()
+        for row in event_rows:
+            if not self.accepts(row):
+                continue
+            self.events[row[EVENT_ID]] = row
+            self.signups[row[EVENT_ID]] = []
+        for row in signup_rows:
+            if row[EVENT_ID] in self.signups:
+                self.signups[row[EVENT_ID]].append(row)
+        self.evict()
+
+    def accepts(self, event_row):
+        return self.owns_guild is None or self.owns_guild(event_row[GUILD_ID])
+
+    def put(self, event_row, signup_rows):
+        if not self.accepts(event_row):
+            return
+
+        event_id = event_row[EVENT_ID]
+        self.events[event_id] = event_row
+        self.events.move_to_end(event_id)
+        self.signups[event_id] = list(signup_rows)
+        self.evict()
+
+    def get_event(self, event_id):
+        '''Return the cached events row, or None if the event is not cached.'''
+        event_id = int(event_id)
+        row = self.events.get(event_id)
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.events.move_to_end(event_id)
+        return row
+
+    def get_signups(self, event_id):
+        '''Return the cached signups rows for an event that is in the store.'''
+        return list(self.signups[int(event_id)])
+
+    def is_signed_up_role(self, event_id, player_id, role):
+        for row in self.signups[int(event_id)]:
+            if row[SIGNUP_PLAYER_ID] == int(player_id) and row[SIGNUP_ROLE] == role:
+                return row
+
+        return None
+
+    def update_event(self, event_id, columns):
+        '''Update cached columns of an event, e.g. update_event(id, {TITLE: 'Valtan'}).'''
+        event_id = int(event_id)
+        row = self.events.get(event_id)
+        if row is None:
+            return
+
+        row = list(row)
+        for index, value in columns.items():
+            row[index] = value
+        self.events[event_id] = tuple(row)
+
+    def remove_event(self, event_id):
+        event_id = int(event_id)
+        self.events.pop(event_id, None)
+        self.signups.pop(event_id, None)
+
+    def add_signup(self, signup_row):
+        event_id = signup_row[EVENT_ID]
+        if event_id not in self.events:
+            return
+
+        if not self.is_signed_up_role(event_id, signup_row[SIGNUP_PLAYER_ID], signup_row[SIGNUP_ROLE]):
+            self.signups[event_id].append(signup_row)
+
+    def remove_signups(self, event_id, player_id, role=None):
+        event_id = int(event_id)
+        if event_id not in self.events:
+            return
+
+        self.signups[event_id] = [
+            row for row in self.signups[event_id]
+            if not (row[SIGNUP_PLAYER_ID] == int(player_id) and (role is None or row[SIGNUP_ROLE] == role))
+        ]
+
+    def evict(self):
+        if len(self.events) <= self.max_events:
+            return
+
+        # Prefer events that have already started. They only see occasional
+        # end_event/done checks, unlike upcoming events that get signups.
+        now = int(time.time())
+        started = [
+            event_id for event_id, row in self.events.items()
+            if row[UNIX_TIMESTAMP] is not None and row[UNIX_TIMESTAMP] < now
+        ]
+        excess = len(self.events) - self.max_events
+        victims = started[:excess]
+        if len(victims) < excess:
+            chosen = set(victims)
+            remaining = (event_id for event_id in self.events if event_id not in chosen)
+            victims.extend(next(remaining) for _ in range(excess - len(victims)))
+
+        for event_id in victims:
+            self.remove_event(event_id)
+            self.evictions += 1
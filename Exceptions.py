@@ -6,4 +6,16 @@ class UserNotDev(discord.app_commands.CheckFailure):
 
 class EventChannelNotSet(discord.app_commands.CheckFailure):
     def __init__(self, *args: object):
-        super().__init__(*args)
\ No newline at end of file
+        super().__init__(*args)
+class ImageFetchError(Exception):
+    '''An img_url could not be downloaded.'''
+    def __init__(self, *args: object):
+        super().__init__(*args)
+
+class ImageTooLarge(ImageFetchError):
+    def __init__(self, *args: object):
+        super().__init__(*args)
+
+class NotAnImage(ImageFetchError):
+    def __init__(self, *args: object):
+        super().__init__(*args)
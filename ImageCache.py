@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+import BotLogging
+
+class ImageCache:
+    '''In-memory cache of event images.
+
+    Local files (the default raid images) are read once, off the event loop,
+    and kept for the life of the cog. Downloaded images are stored by the
+    sha256 of their content in an LRU bounded by `max_bytes`, with a URL index
+    pointing at the content hash, so two URLs serving the same image share one
+    copy. A URL entry is considered fresh for `max_age` seconds. Stale entries
+    keep their ETag and Last-Modified headers so they can be revalidated.
+
+    If `disk_dir` is set, downloaded images are also written to
+    disk_dir/blobs/<sha256> and the URL index to disk_dir/urls/, so they
+    survive evictions and restarts.
+    '''
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_age=3600, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.disk_dir = disk_dir
+        # path : bytes. Never evicted.
+        self._files = {}
+        # sha256 hex digest : bytes, least recently used first
+        self._blobs = OrderedDict()
+        self._blob_bytes = 0
+        # url : [digest, fetched_at, etag, last_modified]
+        self._urls = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_dir is not None:
+            os.makedirs(os.path.join(disk_dir, 'blobs'), exist_ok=True)
+            os.makedirs(os.path.join(disk_dir, 'urls'), exist_ok=True)
+
+    def stats(self):
+        return {
+            'files' : len(self._files),
+            'blobs' : len(self._blobs),
+            'bytes' : self._blob_bytes,
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'evictions' : self.evictions
+        }
+
+    async def preload(self, paths):
+        '''Read local files into memory concurrently. Missing files are skipped.'''
+        paths = [path for path in set(paths) if path not in self._files]
+        results = await asyncio.gather(
+            *[asyncio.to_thread(self._read, path) for path in paths],
+            return_exceptions=True
+        )
+        for path, result in zip(paths, results):
+            if isinstance(result, OSError):
+                BotLogging.log_message(f'Could not preload image {path}: {result}')
+            else:
+                self._files[path] = result
+
+    async def read_file(self, path) -> bytes:
+        data = self._files.get(path)
+        if data is None:
+            data = await asyncio.to_thread(self._read, path)
+            self._files[path] = data
+
+        return data
+
+    async def get_url(self, url):
+        '''Return the cached bytes for a URL, or None if missing or stale.'''
+        cached = await self.lookup(url)
+        if cached is None or not cached[1]:
+            return None
+
+        return cached[0]
+
+    async def lookup(self, url):
+        '''Return (data, fresh, etag, last_modified) for a URL, or None if not cached.'''
+        entry = self._urls.get(url)
+        if entry is None and self.disk_dir is not None:
+            entry = await asyncio.to_thread(self._read_url_index, url)
+            if entry is not None:
+                self._urls[url] = entry
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        data = self._blobs.get(entry[0])
+        if data is not None:
+            self._blobs.move_to_end(entry[0])
+        elif self.disk_dir is not None:
+            try:
+                data = await asyncio.to_thread(self._read, self._blob_path(entry[0]))
+                self._store_blob(entry[0], data)
+            except OSError:
+                data = None
+
+        if data is None:
+            self._urls.pop(url, None)
+            self.misses += 1
+            return None
+
+        fresh = time.time() - entry[1] <= self.max_age
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return data, fresh, entry[2], entry[3]
+
+    async def put_url(self, url, data, etag=None, last_modified=None) -> str:
+        '''Cache downloaded bytes for a URL. Returns their content hash.'''
+        data = bytes(data)
+        digest = hashlib.sha256(data).hexdigest()
+        entry = [digest, time.time(), etag, last_modified]
+        self._urls[url] = entry
+        self._store_blob(digest, data)
+
+        if self.disk_dir is not None:
+            await asyncio.to_thread(self._write_disk, url, entry, data)
+
+        return digest
+
+    async def touch_url(self, url):
+        '''Mark a cached URL as fresh again, e.g. after a 304 Not Modified.'''
+        entry = self._urls.get(url)
+        if entry is None:
+            return
+
+        entry[1] = time.time()
+        if self.disk_dir is not None:
+            await asyncio.to_thread(self._write_url_index, url, entry)
+
+    def _store_blob(self, digest, data):
+        if len(data) > self.max_bytes:
+            return
+
+        if digest in self._blobs:
+            self._blobs.move_to_end(digest)
+            return
+
+        self._blobs[digest] = data
+        self._blob_bytes += len(data)
+        while self._blob_bytes > self.max_bytes:
+            old_digest, old_data = self._blobs.popitem(last=False)
+            self._blob_bytes -= len(old_data)
+            self.evictions += 1
+            # Without a disk copy the URLs pointing at it are dead
+            if self.disk_dir is None:
+                for url in [u for u, e in self._urls.items() if e[0] == old_digest]:
+                    del self._urls[url]
+
+    def _blob_path(self, digest):
+        return os.path.join(self.disk_dir, 'blobs', digest)
+
+    def _url_path(self, url):
+        return os.path.join(self.disk_dir, 'urls', hashlib.sha256(url.encode()).hexdigest())
+
+    def _read(self, path):
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def _read_url_index(self, url):
+        try:
+            with open(self._url_path(url), 'r') as file:
+                digest, fetched_at, etag, last_modified = file.read().split('\n')
+            return [digest, float(fetched_at), etag or None, last_modified or None]
+        except (OSError, ValueError):
+            return None
+
+    def _write_url_index(self, url, entry):
+        # The pid keeps processes sharing the cache directory from clobbering each other's temporary files
+        tmp_path = f'{self._url_path(url)}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as file:
+            file.write('\n'.join([entry[0], str(entry[1]), entry[2] or '', entry[3] or '']))
+        os.replace(tmp_path, self._url_path(url))
+
+    def _write_disk(self, url, entry, data):
+        blob_path = self._blob_path(entry[0])
+        if not os.path.exists(blob_path):
+            # Write to a temporary file first so readers never see a partial image
+            tmp_path = f'{blob_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, blob_path)
+
+        self._write_url_index(url, entry)
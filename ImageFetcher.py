@@ -0,0 +1,113 @@
+import asyncio
+import aiohttp
+import Exceptions
+
+# File signatures of the image types Discord can display
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+def sniff_image_type(data):
+    '''Return the image MIME type from the first bytes of a file, or None.'''
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+
+    return None
+
+class ImageFetcher:
+    '''Downloads img_urls through one pooled HTTP session.
+
+    The session is opened by start() and reused for every fetch, so repeated
+    downloads share connections and cached DNS lookups. Responses are streamed
+    and abandoned as soon as they pass `max_bytes`. The image type is taken
+    from the file's magic bytes rather than the content-type header. When
+    given an ImageCache, fresh entries are served without a request, and
+    stale ones are revalidated with If-None-Match / If-Modified-Since.
+
+    fetch() raises Exceptions.ImageFetchError, or its ImageTooLarge and
+    NotAnImage subclasses.
+    '''
+    def __init__(self, cache=None, max_bytes=8 * 1024 * 1024, timeout=10, chunk_size=64 * 1024):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.session = None
+        self.requests = 0
+        self.not_modified = 0
+
+    async def start(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=20, limit_per_host=4, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent' : 'DudelBot'}
+            )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def fetch(self, url) -> bytes:
+        cached = await self.cache.lookup(url) if self.cache is not None else None
+        if cached is not None and cached[1]:
+            return cached[0]
+
+        headers = {}
+        if cached is not None:
+            if cached[2]:
+                headers['If-None-Match'] = cached[2]
+            if cached[3]:
+                headers['If-Modified-Since'] = cached[3]
+
+        if self.session is None:
+            await self.start()
+
+        self.requests += 1
+        try:
+            async with self.session.get(url, headers=headers) as response:
+                if response.status == 304 and cached is not None:
+                    self.not_modified += 1
+                    await self.cache.touch_url(url)
+                    return cached[0]
+
+                if response.status != 200:
+                    raise Exceptions.ImageFetchError(f'{url} returned HTTP {response.status}')
+
+                if response.content_length is not None and response.content_length > self.max_bytes:
+                    raise Exceptions.ImageTooLarge(f'{url} is {response.content_length} bytes')
+
+                data = await self._read_capped(response)
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise Exceptions.ImageFetchError(f"Couldn't reach {url}") from e
+
+        if sniff_image_type(data) is None:
+            raise Exceptions.NotAnImage(f'{url} is not a png, jpeg, gif or webp image')
+
+        if self.cache is not None:
+            await self.cache.put_url(url, data, etag, last_modified)
+
+        return data
+
+    async def _read_capped(self, response):
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(self.chunk_size):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise Exceptions.ImageTooLarge(f'{response.url} is over {self.max_bytes} bytes')
+            chunks.append(chunk)
+
+        return b''.join(chunks)
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+import BotLogging
+
+# Discord's recommended scheduled event cover is 800x320. Covers are shrunk to
+# fit twice that so they stay sharp on high DPI screens.
+COVER_MAX_SIZE = (1600, 640)
+
+def normalize_cover(data, max_size=COVER_MAX_SIZE, quality=85):
+    '''Downscale and re-encode an image. Runs in a worker process.
+
+    Returns the smaller of the original and re-encoded bytes, and the seconds
+    spent encoding.
+    '''
+    start = time.perf_counter()
+    with Image.open(io.BytesIO(data)) as image:
+        # Re-encoding would drop every frame but the first
+        if getattr(image, 'is_animated', False):
+            return data, time.perf_counter() - start
+
+        image.thumbnail(max_size, Image.LANCZOS)
+        output = io.BytesIO()
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image.save(output, format='PNG', optimize=True)
+        else:
+            image.convert('RGB').save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+
+    encoded = output.getvalue()
+    return (encoded if len(encoded) < len(data) else data), time.perf_counter() - start
+
+class ImageNormalizer:
+    '''Shrinks scheduled event covers in a process pool before they are uploaded.
+
+    Results are cached by the sha256 of the source bytes, so the default
+    images and repeated img_urls are only encoded once. Images that can't be
+    decoded are passed through unchanged.
+    '''
+    def __init__(self, workers=1, max_entries=64):
+        self.workers = workers
+        self.max_entries = max_entries
+        self.executor = None
+        # sha256 of source : normalized bytes
+        self._cache = OrderedDict()
+        self.normalized = 0
+        self.cache_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.encode_seconds = 0.0
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_in - self.bytes_out
+
+    def stats(self):
+        return {
+            'normalized' : self.normalized,
+            'cache_hits' : self.cache_hits,
+            'bytes_saved' : self.bytes_saved,
+            'encode_seconds' : round(self.encode_seconds, 3)
+        }
+
+    def start(self):
+        if self.executor is None:
+            # Spawn on every platform. A forked worker would inherit the bot's
+            # threads and open database connection.
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    async def close(self):
+        if self.executor is not None:
+            await asyncio.to_thread(self.executor.shutdown, cancel_futures=True)
+            self.executor = None
+
+    async def normalize(self, data) -> bytes:
+        data = bytes(data)
+        digest = hashlib.sha256(data).hexdigest()
+        cached = self._cache.get(digest)
+        if cached is not None:
+            self._cache.move_to_end(digest)
+            self.cache_hits += 1
+            return cached
+
+        if self.executor is None:
+            self.start()
+
+        try:
+            result, seconds = await asyncio.get_running_loop().run_in_executor(self.executor, normalize_cover, data)
+        except Exception:
+            BotLogging.log_error('Could not normalize cover')
+            return data
+
+        self.normalized += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(result)
+        self.encode_seconds += seconds
+        BotLogging.log_message(f'Normalized cover: {len(data)} -> {len(result)} bytes in {seconds:.3f}s')
+
+        self._cache[digest] = result
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+        return result
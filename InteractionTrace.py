@@ -0,0 +1,74 @@
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueListener
+
+class InteractionRecorder:
+    '''Appends every interaction the bot receives to a JSON-lines trace.
+
+    Each line holds the offset in seconds from the start of the recording, the
+    interaction type, raw data (command name and options, or a button's
+    custom_id), the guild, channel and user, and for component interactions
+    the message the component was on. benchmarks/ReplayTrace.py replays a
+    trace against a mock of the Discord API. Traces contain user IDs and
+    names, so treat them like the logs.
+
+    Lines are written by a background thread, like BotLogging.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.started = time.monotonic()
+        self.count = 0
+        self._queue = queue.SimpleQueue()
+        self._listener = None
+
+    def start(self):
+        if self._listener is None:
+            handler = logging.FileHandler(self.path, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._listener = QueueListener(self._queue, handler)
+            self._listener.start()
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+    def record(self, interaction):
+        entry = {
+            't' : round(time.monotonic() - self.started, 4),
+            'id' : str(interaction.id),
+            'type' : interaction.type.value,
+            'guild_id' : str(interaction.guild_id) if interaction.guild_id else None,
+            'channel_id' : str(interaction.channel_id) if interaction.channel_id else None,
+            'channel_type' : interaction.channel.type.value if interaction.channel is not None else None,
+            'user' : {
+                'id' : str(interaction.user.id),
+                'username' : interaction.user.name,
+                'global_name' : interaction.user.global_name
+            },
+            'permissions' : str(interaction.permissions.value),
+            'locale' : interaction.locale.value,
+            'data' : interaction.data
+        }
+
+        message = interaction.message
+        if message is not None:
+            metadata = getattr(message, 'interaction_metadata', None)
+            entry['message'] = {
+                'id' : str(message.id),
+                # The interaction whose response created this message, if any
+                'interaction_id' : str(metadata.id) if metadata is not None else None,
+                'embeds' : [embed.to_dict() for embed in message.embeds],
+                'components' : [component.to_dict() for component in message.components]
+            }
+
+        self.count += 1
+        self._queue.put(logging.makeLogRecord({'msg' : json.dumps(entry)}))
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
@@ -0,0 +1,47 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+class KeyedLock:
+    '''A registry of asyncio locks, one per key.
+
+    Holders of different keys never wait on each other. A key's lock is created
+    on first use and dropped once nothing holds or waits on it, so the registry
+    only grows with the number of keys currently in use.
+
+    If on_wait is given, it is called with the seconds spent waiting for
+    the lock each time it is acquired.
+
+    Usage:
+        async with locks(event_id):
+            ...
+    '''
+    def __init__(self, on_wait=None):
+        # key : [lock, number of holders and waiters]
+        self._locks = {}
+        self.on_wait = on_wait
+
+    def __len__(self):
+        return len(self._locks)
+
+    def locked(self, key):
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    @asynccontextmanager
+    async def __call__(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+
+        entry[1] += 1
+        start = time.perf_counter()
+        try:
+            async with entry[0]:
+                if self.on_wait is not None:
+                    self.on_wait(time.perf_counter() - start)
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
@@ -0,0 +1,113 @@
+'''Run DudelBot as several processes on one host, each with a share of the shards.
+
+Usage:
+    python Launcher.py --processes 2 --shards 4
+
+Worker i runs DudelBot.py with SHARD_COUNT and SHARD_IDS set to its contiguous
+range of shards, and writes logs and metrics to ./logs/worker-i. All workers
+share the SQLite database. They elect a leader through a lock file for
+singleton jobs like migrations and command sync. Each worker's background
+checks only cover guilds on its own shards. A worker that exits with an
+error is restarted with a growing delay.
+'''
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from dotenv import load_dotenv
+
+def split_shards(shard_count, processes):
+    '''Contiguous, nearly equal shard ranges, one per process.'''
+    base, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for i in range(processes):
+        size = base + (1 if i < extra else 0)
+        ranges.append(range(start, start + size))
+        start += size
+    return ranges
+
+class Worker:
+    def __init__(self, index, shard_ids, shard_count, script):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.script = script
+        self.process = None
+        self.restarts = 0
+        self.restart_at = 0
+
+    def start(self):
+        env = dict(os.environ)
+        env.update({
+            'SHARD_COUNT' : str(self.shard_count),
+            'SHARD_IDS' : f'{self.shard_ids[0]}-{self.shard_ids[-1]}',
+            'LOG_DIR' : os.path.join('./logs', f'worker-{self.index}'),
+            'WORKER_ID' : str(self.index)
+        })
+        self.process = subprocess.Popen([sys.executable, self.script], env=env)
+        print(f'Worker {self.index} (pid {self.process.pid}) started with shards {list(self.shard_ids)} of {self.shard_count}')
+
+def main(args):
+    if args.processes < 1 or args.shards < args.processes:
+        sys.exit('Need at least one process and at least as many shards as processes')
+
+    workers = [
+        Worker(i, shard_ids, args.shards, args.script)
+        for i, shard_ids in enumerate(split_shards(args.shards, args.processes))
+    ]
+    for worker in workers:
+        worker.start()
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while not stopping:
+        time.sleep(1)
+        for worker in workers:
+            code = worker.process.poll() if worker.process is not None else None
+            if code is not None:
+                if code == 0:
+                    print(f'Worker {worker.index} exited')
+                    worker.process = None
+                    continue
+                # Back off up to a minute so a crash loop doesn't hammer the gateway
+                delay = min(60, 2 ** worker.restarts)
+                print(f'Worker {worker.index} exited with code {code}, restarting in {delay}s')
+                worker.process = None
+                worker.restarts += 1
+                worker.restart_at = time.time() + delay
+            elif worker.process is None and worker.restart_at and time.time() >= worker.restart_at:
+                worker.restart_at = 0
+                worker.start()
+
+        if all(worker.process is None and not worker.restart_at for worker in workers):
+            return
+
+    for worker in workers:
+        if worker.process is not None:
+            worker.process.send_signal(signal.SIGINT)
+    for worker in workers:
+        if worker.process is not None:
+            try:
+                worker.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run DudelBot as several shard-partitioned processes.')
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--shards', type=int, default=None, help='Total shard count, defaults to SHARD_COUNT or --processes')
+    parser.add_argument('--script', default='DudelBot.py')
+    args = parser.parse_args()
+    load_dotenv()
+    if args.shards is None:
+        shard_count = os.getenv('SHARD_COUNT')
+        args.shards = int(shard_count) if shard_count and shard_count.isdigit() else args.processes
+    main(args)
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+import BotLogging
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    '''An exclusive OS lock on a file, shared between processes on one host.
+
+    The OS releases the lock when the holding process exits, even if it crashes.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def try_acquire(self):
+        if self._file is not None:
+            return True
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        file = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            file.close()
+            return False
+
+        self._file = file
+        return True
+
+    def acquire(self, poll=0.1):
+        '''Block until the lock is held. Run it in a thread from async code.'''
+        while not self.try_acquire():
+            time.sleep(poll)
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class LeaderElection:
+    '''Picks one process out of several to run singleton jobs.
+
+    The leader is whichever process holds the lock file. The others retry every
+    `interval` seconds, so one of them takes over soon after the leader exits.
+    '''
+    def __init__(self, path, interval=5.0):
+        self.lock = FileLock(path)
+        self.interval = interval
+        self.elected = asyncio.Event()
+        self._task = None
+
+    @property
+    def is_leader(self):
+        return self.lock.held
+
+    def start(self):
+        '''Try once right away, then keep trying in the background.'''
+        if self.lock.try_acquire():
+            self.elected.set()
+        elif self._task is None:
+            self._task = asyncio.create_task(self._campaign())
+        return self.is_leader
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.lock.release()
+        self.elected.clear()
+
+    async def _campaign(self):
+        while not self.lock.try_acquire():
+            await asyncio.sleep(self.interval)
+        BotLogging.log_message(f'Process {os.getpid()} is now the leader')
+        self.elected.set()
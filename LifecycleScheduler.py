@@ -0,0 +1,166 @@
+import asyncio
+import functools
+import heapq
+import time
+import BotLogging
+from Sharding import shard_id_for
+
+class LifecycleScheduler:
+    '''Runs a callback for each event when its deadline passes.
+
+    Deadlines are unix timestamps kept in a min-heap, and the scheduler sleeps
+    until the earliest one. Only deadlines within `horizon` seconds are held in
+    memory. `seed(until)` is awaited when the scheduler starts and whenever the
+    horizon runs out, and must return (event_id, deadline) pairs for every
+    deadline up to `until`, including overdue ones. schedule() and cancel()
+    keep the heap current between refills. A failed seed is logged and
+    retried after `retry_delay` seconds, doubling up to `max_retry_delay`,
+    while deadlines already in the heap keep firing.
+    '''
+    def __init__(self, callback, seed, horizon=86400, max_sleep=3600, retry_delay=5, max_retry_delay=300):
+        # async callable taking an event_id
+        self.callback = callback
+        self.seed = seed
+        self.horizon = horizon
+        # Upper bound on one sleep so wall clock jumps are picked up
+        self.max_sleep = max_sleep
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._heap = []
+        # event_id : current deadline. Heap entries that don't match are stale.
+        self._deadlines = {}
+        self._horizon_end = 0
+        # Failed refills in a row, and when to try the next one
+        self._failures = 0
+        self._retry_at = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._callbacks = set()
+        self.fired = 0
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def schedule(self, event_id, deadline):
+        '''Set or move an event's deadline.'''
+        event_id = int(event_id)
+        if deadline > self._horizon_end:
+            # The next refill will pick it up from the database
+            self._deadlines.pop(event_id, None)
+            return
+
+        self._deadlines[event_id] = deadline
+        heapq.heappush(self._heap, (deadline, event_id))
+        self._wakeup.set()
+
+    def cancel(self, event_id):
+        self._deadlines.pop(int(event_id), None)
+
+    async def refill(self):
+        '''Load deadlines up to a new horizon. Returns False if the seed failed.'''
+        previous_end = self._horizon_end
+        self._horizon_end = int(time.time()) + self.horizon
+        try:
+            rows = await self.seed(self._horizon_end)
+        except Exception:
+            # e.g. database is locked by another process. Keep the old horizon
+            # so deadlines past it are still left for the next refill.
+            self._horizon_end = previous_end
+            delay = min(self.max_retry_delay, self.retry_delay * 2 ** self._failures)
+            self._failures += 1
+            self._retry_at = time.time() + delay
+            BotLogging.log_error(f'Scheduler refill failed, retrying in {delay}s')
+            return False
+
+        self._failures = 0
+        for event_id, deadline in rows:
+            # Deadlines set by schedule() while the seed query ran are newer
+            if int(event_id) not in self._deadlines:
+                self._deadlines[int(event_id)] = deadline
+                heapq.heappush(self._heap, (deadline, int(event_id)))
+
+        return True
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            if now >= self._horizon_end and now >= self._retry_at:
+                await self.refill()
+                continue
+
+            while self._heap and self._heap[0][0] <= now:
+                deadline, event_id = heapq.heappop(self._heap)
+                if self._deadlines.get(event_id) != deadline:
+                    continue
+
+                del self._deadlines[event_id]
+                self.fired += 1
+                task = asyncio.create_task(self._fire(event_id))
+                self._callbacks.add(task)
+                task.add_done_callback(self._callbacks.discard)
+
+            next_refill = max(self._horizon_end, self._retry_at)
+            next_deadline = self._heap[0][0] if self._heap else next_refill
+            timeout = min(next_deadline, next_refill) - time.time()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0, min(timeout, self.max_sleep)))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, event_id):
+        try:
+            await self.callback(event_id)
+        except Exception:
+            BotLogging.log_error('Scheduled event callback failed', event_id=event_id)
+
+class ShardedLifecycleScheduler:
+    '''One LifecycleScheduler per shard this process owns.
+
+    Each shard's scheduler is seeded with `seed(until, shard_count, shard_id)`,
+    so it only holds events from guilds on that shard. schedule() routes by
+    guild_id.
+    '''
+    def __init__(self, callback, seed, shard_count, shard_ids, **kwargs):
+        self.shard_count = shard_count
+        self.schedulers = {
+            shard_id : LifecycleScheduler(callback, functools.partial(self._seed, seed, shard_id), **kwargs)
+            for shard_id in shard_ids
+        }
+
+    async def _seed(self, seed, shard_id, until):
+        return await seed(until, self.shard_count, shard_id)
+
+    def __len__(self):
+        return sum(len(scheduler) for scheduler in self.schedulers.values())
+
+    @property
+    def fired(self):
+        return sum(scheduler.fired for scheduler in self.schedulers.values())
+
+    def start(self):
+        for scheduler in self.schedulers.values():
+            scheduler.start()
+
+    async def close(self):
+        await asyncio.gather(*[scheduler.close() for scheduler in self.schedulers.values()])
+
+    def schedule(self, event_id, deadline, guild_id):
+        scheduler = self.schedulers.get(shard_id_for(guild_id, self.shard_count))
+        # Another process owns the guild's shard
+        if scheduler is not None:
+            scheduler.schedule(event_id, deadline)
+
+    def cancel(self, event_id):
+        for scheduler in self.schedulers.values():
+            scheduler.cancel(event_id)
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+class MessageCache:
+    '''LRU cache of event messages keyed by (channel_id, message_id).
+
+    Entries are refreshed from gateway edits and from the messages returned by
+    our own edits, and dropped when the message is deleted.
+    '''
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._messages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __contains__(self, key):
+        return key in self._messages
+
+    def get(self, channel_id, message_id):
+        key = (int(channel_id), int(message_id))
+        message = self._messages.get(key)
+        if message is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._messages.move_to_end(key)
+        return message
+
+    def put(self, message):
+        key = (message.channel.id, message.id)
+        self._messages[key] = message
+        self._messages.move_to_end(key)
+        while len(self._messages) > self.max_size:
+            self._messages.popitem(last=False)
+
+        return message
+
+    def update(self, message):
+        '''Replace a cached message with a newer copy. Uncached messages are ignored.'''
+        if (message.channel.id, message.id) in self._messages:
+            self._messages[(message.channel.id, message.id)] = message
+
+    def remove(self, channel_id, message_id):
+        self._messages.pop((int(channel_id), int(message_id)), None)
+
+    def clear(self):
+        self._messages.clear()
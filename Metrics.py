@@ -0,0 +1,215 @@
+import asyncio
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+import discord
+import BotLogging
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+class Histogram:
+    def __init__(self):
+        # The last count is the +Inf bucket
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def copy(self):
+        histogram = Histogram()
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        return histogram
+
+    def quantile(self, q):
+        '''Estimate a quantile as the upper bound of the bucket it falls in.'''
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float('inf')
+
+        return float('inf')
+
+class Registry:
+    '''Latency histograms and counters, keyed by name and labels.
+
+    Usage:
+        metrics.observe('db_query_seconds', 0.002, query='get_event_info')
+        metrics.inc('discord_request_errors_total', endpoint='GET /users/@me', status='429')
+        with metrics.timer('button_seconds', button='dps'):
+            ...
+
+    The database thread records query timings while the event loop records
+    everything else, so updates and snapshots hold a lock.
+    '''
+    def __init__(self):
+        # (name, ((label, value), ...)) : Histogram
+        self.histograms = {}
+        # (name, ((label, value), ...)) : int
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self):
+        '''Copies of the counters and histograms, as lists of (key, value) pairs.'''
+        with self._lock:
+            counters = list(self.counters.items())
+            histograms = [(key, histogram.copy()) for key, histogram in self.histograms.items()]
+        return counters, histograms
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def summary(self, limit=15):
+        '''Busiest histograms as (name, labels, count, p50, p99, mean) rows.'''
+        rows = []
+        _, histograms = self.snapshot()
+        for (name, labels), histogram in histograms:
+            rows.append((
+                name,
+                ','.join(f'{k}={v}' for k, v in labels),
+                histogram.count,
+                histogram.quantile(0.5),
+                histogram.quantile(0.99),
+                histogram.sum / histogram.count
+            ))
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit]
+
+    def render_prometheus(self):
+        counters, histograms = self.snapshot()
+        lines = []
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f'# TYPE dudelbot_{name} counter')
+            for (counter_name, labels), value in counters:
+                if counter_name == name:
+                    lines.append(f'dudelbot_{name}{_format_labels(labels)} {value}')
+
+        for name in sorted({name for (name, _), _ in histograms}):
+            lines.append(f'# TYPE dudelbot_{name} histogram')
+            for (histogram_name, labels), histogram in histograms:
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS + ['+Inf'], histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'dudelbot_{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'dudelbot_{name}_sum{_format_labels(labels)} {histogram.sum}')
+                lines.append(f'dudelbot_{name}_count{_format_labels(labels)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+# Process-wide registry
+metrics = Registry()
+
+def timed(name, **labels):
+    '''Decorator recording the duration of an async function, e.g. a button callback.'''
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with metrics.timer(name, **labels):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument_requests(client):
+    '''Time every REST call made through an HTTPClient or webhook adapter.
+
+    Interaction responses and followups go through the webhook adapter, while
+    message edits and fetches, DMs and scheduled event calls use the bot's
+    HTTPClient. Both take a Route first, so one wrapper covers both.
+    '''
+    request = client.request
+    if getattr(request, 'instrumented', False):
+        return
+
+    async def timed_request(route, *args, **kwargs):
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            return await request(route, *args, **kwargs)
+        except discord.HTTPException as e:
+            status = str(e.status)
+            raise
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            # The path template keeps the label set small, e.g. /channels/{channel_id}/messages
+            endpoint = f'{route.method} {route.path}'
+            metrics.observe('discord_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+            if status != 'ok':
+                metrics.inc('discord_request_errors_total', endpoint=endpoint, status=status)
+
+    timed_request.instrumented = True
+    client.request = timed_request
+
+class PrometheusWriter:
+    '''Writes the registry to a Prometheus text file every `interval` seconds.'''
+    def __init__(self, path='./logs/metrics.prom', interval=60):
+        self.path = path
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await asyncio.to_thread(self._write, metrics.render_prometheus())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self._write, metrics.render_prometheus())
+            except OSError:
+                BotLogging.log_error(f'Could not write metrics to {self.path}')
+
+    def _write(self, text):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Replace the file in one step so a scraper never reads half of it
+        with open(self.path + '.tmp', 'w') as file:
+            file.write(text)
+        os.replace(self.path + '.tmp', self.path)
@@ -0,0 +1,186 @@
+import DatabaseFunctions as dbfunc
+
+# Schema migrations, applied in order at startup. The index of each function in
+# MIGRATIONS + 1 is the schema version it upgrades to, and the current version
+# is kept in SQLite's user_version pragma. Never edit a migration that has
+# shipped; append a new one instead.
+
+def create_base_tables(cur):
+    '''Create the original tables for fresh installs. No-op on existing databases.'''
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS guild_channel_id (
+            guild_id INTEGER,
+            channel_id INTEGER
+        )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS events (
+            event_id INTEGER,
+            host_name TEXT,
+            host_id INTEGER,
+            unix_timestamp INTEGER,
+            title TEXT,
+            dps_limit INTEGER,
+            support_limit INTEGER,
+            guild_id INTEGER,
+            no_auto_delete TEXT,
+            scheduled_event_id INTEGER
+        )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS signups (
+            event_id INTEGER,
+            player_name TEXT,
+            player_id INTEGER,
+            role TEXT,
+            signup_timestamp INTEGER
+        )"""
+    )
+
+def add_keys_and_indexes(cur):
+    '''Rebuild the tables with primary keys, a unique signup constraint and covering indexes.'''
+    # SQLite cannot add keys to an existing table, so copy each table into a
+    # keyed replacement. Column order is unchanged because rows are read by index.
+    cur.execute(
+        """CREATE TABLE guild_channel_id_new (
+            guild_id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL
+        )"""
+    )
+    # Keep the most recently written channel if a guild was inserted twice
+    cur.execute(
+        """INSERT OR REPLACE INTO guild_channel_id_new
+        SELECT guild_id, channel_id FROM guild_channel_id
+        WHERE guild_id IS NOT NULL AND channel_id IS NOT NULL
+        ORDER BY rowid ASC"""
+    )
+    cur.execute("DROP TABLE guild_channel_id")
+    cur.execute("ALTER TABLE guild_channel_id_new RENAME TO guild_channel_id")
+
+    cur.execute(
+        """CREATE TABLE events_new (
+            event_id INTEGER PRIMARY KEY,
+            host_name TEXT,
+            host_id INTEGER,
+            unix_timestamp INTEGER,
+            title TEXT,
+            dps_limit INTEGER,
+            support_limit INTEGER,
+            guild_id INTEGER,
+            no_auto_delete TEXT,
+            scheduled_event_id INTEGER
+        )"""
+    )
+    cur.execute(
+        """INSERT OR IGNORE INTO events_new
+        SELECT event_id, host_name, host_id, unix_timestamp, title, dps_limit,
+            support_limit, guild_id, no_auto_delete, scheduled_event_id
+        FROM events
+        WHERE event_id IS NOT NULL"""
+    )
+    cur.execute("DROP TABLE events")
+    cur.execute("ALTER TABLE events_new RENAME TO events")
+
+    cur.execute(
+        """CREATE TABLE signups_new (
+            event_id INTEGER NOT NULL,
+            player_name TEXT,
+            player_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            signup_timestamp INTEGER,
+            UNIQUE (event_id, player_id, role)
+        )"""
+    )
+    # Keep the earliest signup if a player was recorded twice for the same role
+    cur.execute(
+        """INSERT OR IGNORE INTO signups_new
+        SELECT event_id, player_name, player_id, role, signup_timestamp
+        FROM signups
+        WHERE event_id IS NOT NULL AND player_id IS NOT NULL AND role IS NOT NULL
+        ORDER BY rowid ASC"""
+    )
+    cur.execute("DROP TABLE signups")
+    cur.execute("ALTER TABLE signups_new RENAME TO signups")
+
+    # Roster reads and trims: WHERE event_id=? AND role=? ORDER BY signup_timestamp
+    cur.execute("CREATE INDEX signups_event_role_time ON signups (event_id, role, signup_timestamp)")
+    # Events a player is signed up for
+    cur.execute("CREATE INDEX signups_player_event ON signups (player_id, event_id)")
+    # Events in a guild, ordered by start time
+    cur.execute("CREATE INDEX events_guild_time ON events (guild_id, unix_timestamp)")
+
+def add_event_time_index(cur):
+    '''Index start times so the lifecycle scheduler only reads events that are due soon.'''
+    cur.execute("CREATE INDEX events_time ON events (unix_timestamp)")
+
+def add_done_prompts(cur):
+    '''Persist pending "end this event?" prompts so they survive restarts.'''
+    cur.execute(
+        """CREATE TABLE done_prompts (
+            event_id INTEGER PRIMARY KEY,
+            host_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            deadline INTEGER NOT NULL
+        )"""
+    )
+    cur.execute("CREATE INDEX done_prompts_deadline ON done_prompts (deadline)")
+    # Prompts sent before this migration only lived in memory and are gone.
+    # Clear their Pending flag so the host is asked again.
+    cur.execute("UPDATE events SET no_auto_delete=NULL WHERE no_auto_delete='Pending'")
+
+def add_signup_seq(cur):
+    '''Number each event's signups in signup order.
+
+    signup_timestamp only has second precision, so signups in the same second
+    had no defined order. Existing rows are numbered by timestamp, then by
+    insertion order.
+    '''
+    cur.execute("ALTER TABLE signups ADD COLUMN signup_seq INTEGER")
+    cur.execute(
+        """UPDATE signups SET signup_seq = numbered.seq
+        FROM (
+            SELECT rowid AS id, ROW_NUMBER() OVER (PARTITION BY event_id ORDER BY signup_timestamp, rowid) AS seq
+            FROM signups
+            ) AS numbered
+        WHERE signups.rowid = numbered.id"""
+    )
+    # Roster reads and trims: WHERE event_id=? AND role=? ORDER BY signup_seq
+    cur.execute("DROP INDEX IF EXISTS signups_event_role_time")
+    cur.execute("CREATE INDEX signups_event_role_seq ON signups (event_id, role, signup_seq)")
+
+def add_event_channel_id(cur):
+    '''Record the channel each event message was posted in.
+
+    create_event posts in whatever channel it was run in, and a guild can move
+    its events channel, so the guild's channel doesn't say where an event is.
+    The channel of existing events is unknown and left NULL.
+    '''
+    cur.execute("ALTER TABLE events ADD COLUMN channel_id INTEGER")
+
+MIGRATIONS = [
+    create_base_tables,
+    add_keys_and_indexes,
+    add_event_time_index,
+    add_done_prompts,
+    add_signup_seq,
+    add_event_channel_id,
+]
+
+def get_schema_version():
+    return dbfunc.get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations():
+    '''Upgrade the database in place. Returns the list of applied schema versions.'''
+    applied = []
+    with dbfunc.transaction() as cur:
+        # Read the version inside the write transaction so two processes
+        # starting at once cannot both apply the same migration.
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        for new_version, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(cur)
+            # PRAGMA does not accept bound parameters
+            cur.execute(f"PRAGMA user_version={int(new_version)}")
+            applied.append(new_version)
+
+    return applied
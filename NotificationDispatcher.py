@@ -0,0 +1,149 @@
+import asyncio
+import random
+import discord
+import BotLogging
+
+class DeliveryBatch:
+    '''The futures for one fan-out. wait() returns its delivery stats.'''
+    def __init__(self, futures):
+        self.futures = futures
+
+    async def wait(self):
+        return self._stats(await asyncio.gather(*self.futures))
+
+    def add_done_callback(self, callback):
+        '''Call callback(stats) once every notification in the batch has finished.'''
+        asyncio.gather(*self.futures).add_done_callback(lambda f: callback(self._stats(f.result())))
+
+    def _stats(self, results):
+        sent = sum(1 for result in results if result is not None)
+        return {'sent' : sent, 'failed' : len(results) - sent}
+
+class NotificationDispatcher:
+    '''Background queue for direct messages.
+
+    notify() queues one DM and returns a future resolving to the sent message,
+    or None if delivery failed. Callers never wait on Discord unless they await
+    the future. A fixed set of workers sends the DMs, paced by a token bucket so
+    a large fan-out doesn't trip Discord's DM spam limits. 429s pause every
+    worker for the advertised retry_after, server errors are retried with
+    exponential backoff, and a recipient with closed DMs only fails their own
+    notification.
+    '''
+    def __init__(self, bot, workers=4, rate=5.0, max_retries=3, base_delay=1.0):
+        self.bot = bot
+        self.worker_count = workers
+        # Sends per second, and the burst size of the token bucket
+        self.rate = rate
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.queue = asyncio.Queue()
+        self.workers = []
+        self._tokens = rate
+        self._last_refill = 0.0
+        self._paused_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def stats(self):
+        return {
+            'queued' : self.queue.qsize(),
+            'sent' : self.sent,
+            'failed' : self.failed,
+            'retried' : self.retried
+        }
+
+    def start(self):
+        if not self.workers:
+            self._last_refill = asyncio.get_running_loop().time()
+            self.workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def close(self, timeout=10.0):
+        '''Try to deliver what is queued, then stop the workers.'''
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def notify(self, user_id, content=None, **kwargs) -> asyncio.Future:
+        '''Queue a DM. kwargs are passed to User.send, e.g. embed= or view=.'''
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((int(user_id), content, kwargs, future))
+        return future
+
+    def notify_many(self, user_ids, content=None, **kwargs) -> DeliveryBatch:
+        return DeliveryBatch([self.notify(user_id, content, **kwargs) for user_id in user_ids])
+
+    async def _worker(self):
+        while True:
+            user_id, content, kwargs, future = await self.queue.get()
+            try:
+                message = await self._deliver(user_id, content, kwargs)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_result(None)
+                raise
+            except Exception:
+                BotLogging.log_error(f'Could not deliver DM to user ID {user_id}')
+                message = None
+            finally:
+                self.queue.task_done()
+
+            if message is None:
+                self.failed += 1
+            else:
+                self.sent += 1
+            if not future.done():
+                future.set_result(message)
+
+    async def _deliver(self, user_id, content, kwargs):
+        for attempt in range(self.max_retries + 1):
+            await self._acquire()
+            try:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                return await user.send(content, **kwargs)
+
+            except (discord.Forbidden, discord.NotFound):
+                # Closed DMs, a blocked bot or a deleted account. Retrying won't help.
+                return None
+
+            except discord.HTTPException as e:
+                if attempt == self.max_retries:
+                    return None
+
+                self.retried += 1
+                if e.status == 429:
+                    retry_after = getattr(e, 'retry_after', None) or self.base_delay
+                    self._pause(retry_after)
+                elif e.status >= 500:
+                    await asyncio.sleep(self.base_delay * 2 ** attempt + random.uniform(0, self.base_delay))
+                else:
+                    return None
+
+        return None
+
+    def _pause(self, seconds):
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + seconds)
+
+    async def _acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            self._tokens = min(self.rate, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -0,0 +1,174 @@
+import asyncio
+import time
+import discord
+import AsyncDatabaseFunctions as adbfunc
+import BotLogging
+from Metrics import metrics
+
+class Reconciler:
+    '''Removes events whose message was deleted by hand.
+
+    Each pass pages through the history of every channel with events,
+    starting just before its oldest event, and compares the messages it finds
+    with the events table. Event messages it finds go into the message cache.
+    Events it doesn't find are checked with a direct fetch, so a history page
+    that hides a message doesn't cost an event. Confirmed orphans are deleted
+    in batches, one transaction per batch, and their scheduled events cancelled.
+
+    Events from before channel_id was recorded are looked for in their
+    guild's events channel. The ones found there get that channel recorded.
+    The rest may have been posted elsewhere, so they are only counted as
+    unverified in last_result, never deleted.
+
+    Channels are paged in parallel, at most `concurrency` at a time, with one
+    pager per channel. Only guilds on this process's shards are checked.
+    '''
+    def __init__(self, bot, interval=21600, concurrency=4, batch_size=50, min_age=300):
+        self.bot = bot
+        self.interval = interval
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        # Leave events younger than this alone, their message may not be sent yet
+        self.min_age = min_age
+        self._task = None
+        self.last_result = None
+        # Events with no recorded channel that the last pass couldn't find
+        self.unverified = set()
+
+    @property
+    def events(self):
+        return self.bot.get_cog('Events')
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await self.reconcile()
+            except Exception:
+                BotLogging.log_error('Reconciliation failed')
+            await asyncio.sleep(self.interval)
+
+    async def reconcile(self):
+        start = time.perf_counter()
+        cutoff = discord.utils.time_snowflake(discord.utils.utcnow()) - (self.min_age * 1000 << 22)
+        # channel_id : set of event ids posted in that channel
+        expected = {}
+        # channel_id : set of event ids with no recorded channel, to look for there
+        guessed = {}
+        unverified = set()
+        for row in await adbfunc.fetch_events():
+            if not self.bot.owns_guild(row[7]) or row[0] > cutoff:
+                continue
+            if row[10] is not None:
+                expected.setdefault(row[10], set()).add(row[0])
+                continue
+
+            channel_id = self.bot.guild_channels.get(row[7])
+            # Snowflakes grow over time, so a message older than the channel was
+            # posted before it existed, somewhere else.
+            if channel_id is None or row[0] < channel_id:
+                unverified.add(row[0])
+            else:
+                guessed.setdefault(channel_id, set()).add(row[0])
+
+        channel_ids = list(expected.keys() | guessed.keys())
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async def check_channel(channel_id, event_ids):
+            async with semaphore:
+                return await self.find_orphans(channel_id, event_ids)
+
+        results = await asyncio.gather(
+            *[
+                check_channel(channel_id, expected.get(channel_id, set()) | guessed.get(channel_id, set()))
+                for channel_id in channel_ids
+            ],
+            return_exceptions=True
+        )
+
+        orphans = []
+        skipped = 0
+        for channel_id, result in zip(channel_ids, results):
+            if isinstance(result, Exception):
+                skipped += 1
+                BotLogging.log_error(f'Could not reconcile channel {channel_id}', exc=result)
+                continue
+
+            missing = set(result)
+            orphans.extend(missing & expected.get(channel_id, set()))
+            found = guessed.get(channel_id, set()) - missing
+            if found:
+                await adbfunc.set_events_channel_id(found, channel_id)
+            unverified |= guessed.get(channel_id, set()) & missing
+
+        removed = await self.remove_orphans(orphans)
+        orphan_signups = await adbfunc.delete_orphan_signups()
+
+        self.unverified = unverified
+        self.last_result = {
+            'channels' : len(channel_ids),
+            'events' : sum(len(event_ids) for event_ids in expected.values()) + sum(len(event_ids) for event_ids in guessed.values()),
+            'skipped_channels' : skipped,
+            'removed' : len(removed),
+            'unverified' : len(unverified),
+            'orphan_signups' : orphan_signups,
+            'seconds' : round(time.perf_counter() - start, 2)
+        }
+        metrics.observe('reconcile_seconds', time.perf_counter() - start)
+        metrics.inc('reconcile_removed_total', len(removed))
+        BotLogging.log_message(f'Reconciliation: {self.last_result}')
+        if removed:
+            BotLogging.log_message(f'Reconciliation removed events whose message was deleted: {[row[0] for row in removed]}')
+        return self.last_result
+
+    async def find_orphans(self, channel_id, event_ids):
+        '''Event ids from event_ids whose message no longer exists in the channel.'''
+        channel = self.bot.get_partial_messageable(channel_id)
+        missing = set(event_ids)
+        newest = max(event_ids)
+        try:
+            # Message ids grow over time, so nothing older than the oldest event needs reading
+            async for message in channel.history(limit=None, after=discord.Object(min(event_ids) - 1), oldest_first=True):
+                if message.id in missing:
+                    missing.discard(message.id)
+                    if self.events is not None:
+                        self.events.message_cache.put(message)
+                if not missing or message.id >= newest:
+                    break
+        except discord.NotFound:
+            # The events channel itself was deleted
+            return list(event_ids)
+
+        orphans = []
+        for event_id in missing:
+            try:
+                message = await channel.fetch_message(event_id)
+            except discord.NotFound:
+                orphans.append(event_id)
+            else:
+                if self.events is not None:
+                    self.events.message_cache.put(message)
+
+        return orphans
+
+    async def remove_orphans(self, event_ids):
+        # Deletes go through the Events cog so they hold the event locks
+        if self.events is None:
+            return []
+
+        removed = []
+        event_ids = list(event_ids)
+        for i in range(0, len(event_ids), self.batch_size):
+            removed.extend(await self.events.teardown_deleted_events(event_ids[i:i + self.batch_size]))
+
+        return removed
@@ -0,0 +1,111 @@
+import asyncio
+import BotLogging
+from KeyedLock import KeyedLock
+
+class RenderScheduler:
+    '''Coalesces event message re-renders.
+
+    mark_dirty() asks for an event message to be re-rendered and returns a future
+    that resolves once a render that includes the request has finished. The first
+    request after a quiet period renders right away. Requests that arrive within
+    `window` seconds of the last render are merged into a single render, which
+    always uses the newest message object and reads the latest roster.
+    '''
+    def __init__(self, render, window=1.0):
+        # async callable taking the event message to render and edit
+        self.render = render
+        self.window = window
+        # event_id : [latest message, future, timer handle]
+        self._pending = {}
+        # event_id : loop time of the last render start
+        self._last_render = {}
+        # Keeps renders of one event in order when an edit outlasts the window
+        self._render_locks = KeyedLock()
+        self._tasks = set()
+        self.requests = 0
+        self.renders = 0
+
+    @property
+    def edits_saved(self):
+        return self.requests - self.renders - len(self._pending)
+
+    def stats(self):
+        return {
+            'requests' : self.requests,
+            'renders' : self.renders,
+            'edits_saved' : self.edits_saved,
+            'pending' : len(self._pending)
+        }
+
+    def mark_dirty(self, event_message) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        event_id = event_message.id
+
+        entry = self._pending.get(event_id)
+        if entry is not None:
+            entry[0] = event_message
+            return entry[1]
+
+        future = loop.create_future()
+        delay = max(0.0, self._last_render.get(event_id, 0.0) + self.window - loop.time())
+        handle = loop.call_later(delay, self._start_render, event_id)
+        self._pending[event_id] = [event_message, future, handle]
+        return future
+
+    def forget(self, event_id):
+        '''Drop any pending render, e.g. after the event message was deleted.
+
+        Callers waiting on the render are released as if it had finished, since
+        there is nothing left to render.
+        '''
+        entry = self._pending.pop(int(event_id), None)
+        if entry is not None:
+            entry[2].cancel()
+            if not entry[1].done():
+                entry[1].set_result(None)
+        self._last_render.pop(int(event_id), None)
+
+    async def close(self):
+        '''Render everything that is still pending.'''
+        for event_id in list(self._pending):
+            self._pending[event_id][2].cancel()
+            self._start_render(event_id)
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _start_render(self, event_id):
+        task = asyncio.create_task(self._render(event_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _render(self, event_id):
+        async with self._render_locks(event_id):
+            entry = self._pending.pop(event_id, None)
+            if entry is None:
+                return
+
+            event_message, future = entry[0], entry[1]
+            self._last_render[event_id] = asyncio.get_running_loop().time()
+            self.renders += 1
+            self._prune()
+            try:
+                await self.render(event_message)
+
+            except Exception as e:
+                BotLogging.log_error('Event render failed', event_id=event_id)
+                if not future.done():
+                    future.set_exception(e)
+                    # Nobody has to await the future, so mark the exception as retrieved
+                    future.exception()
+
+            else:
+                if not future.done():
+                    future.set_result(None)
+
+    def _prune(self):
+        # Forget render times that can no longer delay a request
+        cutoff = asyncio.get_running_loop().time() - self.window
+        for event_id in [k for k, t in self._last_render.items() if t < cutoff]:
+            del self._last_render[event_id]
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+
+# Discord's limit on an embed field value
+FIELD_LIMIT = 1024
+
+class RoleRoster:
+    '''One role's signups as mention lines, packed into field sized pages.
+
+    Adding a player appends to the last page. Removing one repacks the pages
+    from the removed player's page onwards. Page text is joined once and kept
+    until the page changes.
+    '''
+    def __init__(self):
+        # Lists of player ids, each fitting in one field
+        self.chunks = []
+        # Characters used by each chunk, newlines included
+        self._lengths = []
+        # Joined text of each chunk, None until needed
+        self._texts = []
+        # player_id : index of the chunk holding them
+        self._location = {}
+
+    def __len__(self):
+        return len(self._location)
+
+    def __contains__(self, player_id):
+        return player_id in self._location
+
+    def player_ids(self):
+        return [player_id for chunk in self.chunks for player_id in chunk]
+
+    def add(self, player_id):
+        if player_id in self._location:
+            return False
+
+        line_length = len(f'<@{player_id}>')
+        if self.chunks and self._lengths[-1] + 1 + line_length <= FIELD_LIMIT:
+            self.chunks[-1].append(player_id)
+            self._lengths[-1] += 1 + line_length
+            self._texts[-1] = None
+        else:
+            self.chunks.append([player_id])
+            self._lengths.append(line_length)
+            self._texts.append(None)
+        self._location[player_id] = len(self.chunks) - 1
+        return True
+
+    def remove(self, player_id):
+        index = self._location.pop(player_id, None)
+        if index is None:
+            return False
+
+        later = [other for chunk in self.chunks[index:] for other in chunk if other != player_id]
+        for other in later:
+            del self._location[other]
+        del self.chunks[index:], self._lengths[index:], self._texts[index:]
+        for other in later:
+            self.add(other)
+        return True
+
+    def rebuild(self, player_ids):
+        self.chunks, self._lengths, self._texts, self._location = [], [], [], {}
+        for player_id in player_ids:
+            self.add(player_id)
+
+    def sync(self, player_ids):
+        '''Apply the differences from player_ids, given in signup order.'''
+        wanted = set(player_ids)
+        for player_id in [player_id for player_id in self._location if player_id not in wanted]:
+            self.remove(player_id)
+        for player_id in player_ids:
+            self.add(player_id)
+
+        # A player who left and signed up again moved to the end
+        if self.player_ids() != list(player_ids):
+            self.rebuild(player_ids)
+
+    def page(self, index):
+        if self._texts[index] is None:
+            self._texts[index] = '\n'.join(f'<@{player_id}>' for player_id in self.chunks[index])
+        return self._texts[index]
+
+    def pages(self):
+        return [self.page(index) for index in range(len(self.chunks))]
+
+class Roster:
+    '''Signups for one event, by role, in signup order.'''
+    def __init__(self, roles):
+        self.roles = {role : RoleRoster() for role in roles}
+
+    def sync(self, signup_rows):
+        '''Bring the roster up to date with signups rows ordered by signup_seq.'''
+        for role, role_roster in self.roles.items():
+            role_roster.sync([row[2] for row in signup_rows if row[3] == role])
+
+class RosterCache:
+    '''LRU cache of event rosters keyed by event ID.'''
+    def __init__(self, max_size=500):
+        self.max_size = max_size
+        self._rosters = OrderedDict()
+
+    def __len__(self):
+        return len(self._rosters)
+
+    def get(self, event_id, roles):
+        '''The event's roster, created empty if it isn't cached.'''
+        event_id = int(event_id)
+        roster = self._rosters.get(event_id)
+        if roster is None:
+            roster = self._rosters[event_id] = Roster(roles)
+        self._rosters.move_to_end(event_id)
+        while len(self._rosters) > self.max_size:
+            self._rosters.popitem(last=False)
+
+        return roster
+
+    def forget(self, event_id):
+        self._rosters.pop(int(event_id), None)
@@ -0,0 +1,34 @@
+def shard_id_for(guild_id, shard_count):
+    '''The shard Discord sends a guild's events to. DMs go to shard 0.'''
+    return (int(guild_id or 0) >> 22) % shard_count
+
+def parse_shard_config(shard_count=None, shard_ids=None):
+    '''Turn the SHARD_COUNT and SHARD_IDS settings into AutoShardedBot arguments.
+
+    SHARD_COUNT unset runs one shard, like before sharding. 'auto' uses the
+    count Discord recommends. SHARD_IDS is a comma separated list of shard ids
+    and ranges, e.g. "0,1" or "0-3", and defaults to every shard.
+    '''
+    if not shard_count:
+        count = 1
+    elif shard_count.strip().lower() == 'auto':
+        count = None
+    else:
+        count = int(shard_count)
+        if count < 1:
+            raise ValueError('SHARD_COUNT must be at least 1')
+
+    if not shard_ids:
+        return count, None
+    if count is None:
+        raise ValueError('SHARD_IDS needs a numeric SHARD_COUNT')
+
+    ids = []
+    for part in shard_ids.split(','):
+        first, _, last = part.strip().partition('-')
+        ids.extend(range(int(first), int(last or first) + 1))
+    ids = sorted(set(ids))
+    if ids[0] < 0 or ids[-1] >= count:
+        raise ValueError(f'SHARD_IDS must be between 0 and {count - 1}')
+
+    return count, ids
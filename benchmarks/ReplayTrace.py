@@ -0,0 +1,620 @@
+'''Replay a recorded interaction trace against a local mock of the Discord API.
+
+Record a trace by starting the bot with RECORD_INTERACTIONS=./logs/trace.jsonl.
+Then start the mock, and point the bot at it from a scratch copy of the repo
+(with a copy of the production database if the trace clicks on existing events):
+
+    python benchmarks/ReplayTrace.py ./logs/trace.jsonl --speed 10
+    DISCORD_API_BASE=http://127.0.0.1:8900/api/v10 \
+    DISCORD_GATEWAY_URL=ws://127.0.0.1:8900/gateway \
+    python DudelBot.py
+
+The mock serves the REST routes DudelBot uses and a gateway that sends READY
+and GUILD_CREATE, then dispatches the trace's interactions as INTERACTION_CREATE
+events at --speed times the recorded pace. When the trace is done it prints
+REST calls per interaction, acknowledgement latency, calls per route and how
+many 429s it returned. --rate-limit N returns 429s past N requests per second
+per route and channel/guild, to check how the bot backs off.
+'''
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+from collections import Counter
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from InteractionTrace import load_trace
+from Sharding import shard_id_for
+
+DISCORD_EPOCH = 1420070400000
+API_PREFIX = '/api/v10'
+# Fixed like a real application's, so per-application state such as command hashes carries over
+BOT_ID = '1000000000000000001'
+
+def now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+def json_response(data, status=200, headers=None):
+    # discord.py only parses bodies whose content type is exactly application/json,
+    # and web.json_response appends a charset
+    return web.Response(body=json.dumps(data).encode(), status=status, headers=headers, content_type='application/json')
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class MockDiscord:
+    def __init__(self, trace, speed=1.0, host='127.0.0.1', port=8900, rate_limit=0, warmup=3.0, drain=5.0):
+        self.trace = trace
+        self.speed = speed
+        self.host = host
+        self.port = port
+        self.rate_limit = rate_limit
+        self.warmup = warmup
+        self.drain = drain
+        self._counter = 0
+
+        self.bot_user = {
+            'id' : BOT_ID, 'username' : 'DudelBot', 'discriminator' : '0',
+            'avatar' : None, 'global_name' : None, 'bot' : True
+        }
+        self.application_id = self.bot_user['id']
+        # message_id : message payload
+        self.messages = {}
+        # recipient id : DM channel payload
+        self.dm_channels = {}
+        # interaction token : [recorded entry, dispatch time, original message id, deferred]
+        self.interactions = {}
+        # recorded interaction id : id of the first message its replay created
+        self.created_by = {}
+        self.ack_latency = []
+        self.rest_calls = Counter()
+        # Calls made while logging in and syncing commands
+        self.startup_calls = 0
+        self.rate_limited = 0
+        # Interactions whose shard wasn't connected
+        self.undelivered = 0
+        # (route, major parameter) : [window start, requests]
+        self._windows = {}
+        # shard_id : {'ws' : websocket, 'sequence' : last sequence number}
+        self.sessions = {}
+        self.shard_count = 1
+        # Set once every shard has identified
+        self.identified = asyncio.Event()
+
+        self.app = web.Application(middlewares=[self.count_and_limit])
+        self.app.add_routes([
+            web.get('/gateway', self.gateway),
+            web.get(API_PREFIX + '/gateway', self.get_gateway),
+            web.get(API_PREFIX + '/gateway/bot', self.get_gateway),
+            web.get(API_PREFIX + '/users/@me', self.get_me),
+            web.post(API_PREFIX + '/users/@me/channels', self.create_dm),
+            web.get(API_PREFIX + '/users/{user_id}', self.get_user),
+            web.get(API_PREFIX + '/oauth2/applications/@me', self.get_application),
+            web.put(API_PREFIX + '/applications/{application_id}/commands', self.sync_commands),
+            web.put(API_PREFIX + '/applications/{application_id}/guilds/{guild_id}/commands', self.sync_commands),
+            web.get(API_PREFIX + '/applications/{application_id}/commands', self.empty_list),
+            web.get(API_PREFIX + '/applications/{application_id}/guilds/{guild_id}/commands', self.empty_list),
+            web.post(API_PREFIX + '/interactions/{interaction_id}/{token}/callback', self.interaction_callback),
+            web.post(API_PREFIX + '/webhooks/{application_id}/{token}', self.create_followup),
+            web.get(API_PREFIX + '/webhooks/{application_id}/{token}/messages/{message_id}', self.get_webhook_message),
+            web.patch(API_PREFIX + '/webhooks/{application_id}/{token}/messages/{message_id}', self.edit_webhook_message),
+            web.delete(API_PREFIX + '/webhooks/{application_id}/{token}/messages/{message_id}', self.delete_webhook_message),
+            web.get(API_PREFIX + '/channels/{channel_id}', self.get_channel),
+            web.get(API_PREFIX + '/channels/{channel_id}/messages', self.empty_list),
+            web.post(API_PREFIX + '/channels/{channel_id}/messages', self.create_message),
+            web.post(API_PREFIX + '/channels/{channel_id}/messages/bulk-delete', self.no_content),
+            web.get(API_PREFIX + '/channels/{channel_id}/messages/{message_id}', self.get_message),
+            web.patch(API_PREFIX + '/channels/{channel_id}/messages/{message_id}', self.edit_message),
+            web.delete(API_PREFIX + '/channels/{channel_id}/messages/{message_id}', self.delete_message),
+            web.get(API_PREFIX + '/guilds/{guild_id}/scheduled-events', self.empty_list),
+            web.post(API_PREFIX + '/guilds/{guild_id}/scheduled-events', self.create_scheduled_event),
+            web.get(API_PREFIX + '/guilds/{guild_id}/scheduled-events/{event_id}', self.get_scheduled_event),
+            web.patch(API_PREFIX + '/guilds/{guild_id}/scheduled-events/{event_id}', self.edit_scheduled_event),
+            web.delete(API_PREFIX + '/guilds/{guild_id}/scheduled-events/{event_id}', self.no_content),
+            web.get(API_PREFIX + '/guilds/{guild_id}/scheduled-events/{event_id}/users', self.empty_list),
+            web.route('*', '/{tail:.*}', self.unknown_route),
+        ])
+        self.scheduled_events = {}
+
+    def snowflake(self):
+        self._counter += 1
+        return ((int(time.time() * 1000) - DISCORD_EPOCH) << 22) | (self._counter % 4096)
+
+    # Middleware
+
+    @web.middleware
+    async def count_and_limit(self, request, handler):
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else request.path
+        key = f'{request.method} {route}'
+        if route != '/gateway':
+            self.rest_calls[key] += 1
+
+        if not self.rate_limit or route == '/gateway':
+            return await handler(request)
+
+        major = request.match_info.get('channel_id') or request.match_info.get('guild_id') or request.match_info.get('token')
+        now = asyncio.get_running_loop().time()
+        window = self._windows.get((key, major))
+        if window is None or now - window[0] >= 1.0:
+            window = self._windows[(key, major)] = [now, 0]
+        window[1] += 1
+        reset_after = max(0.001, 1.0 - (now - window[0]))
+        headers = {
+            'X-RateLimit-Limit' : str(self.rate_limit),
+            'X-RateLimit-Remaining' : str(max(0, self.rate_limit - window[1])),
+            'X-RateLimit-Reset-After' : f'{reset_after:.3f}',
+            'X-RateLimit-Bucket' : f'{hash(key) & 0xffffffff:x}'
+        }
+        if window[1] > self.rate_limit:
+            self.rate_limited += 1
+            # discord.py treats a 429 without Via as a Cloudflare ban
+            headers.update({'Via' : '1.1 google', 'Retry-After' : f'{reset_after:.3f}', 'X-RateLimit-Scope' : 'user'})
+            return json_response(
+                {'message' : 'You are being rate limited.', 'retry_after' : reset_after, 'global' : False},
+                status=429,
+                headers=headers
+            )
+
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    # Gateway
+
+    async def send(self, ws, payload):
+        await ws.send_str(json.dumps(payload))
+
+    async def dispatch(self, shard_id, event, data):
+        session = self.sessions.get(shard_id)
+        if session is None:
+            return False
+        session['sequence'] += 1
+        await self.send(session['ws'], {'op' : 0, 't' : event, 's' : session['sequence'], 'd' : data})
+        return True
+
+    async def gateway(self, request):
+        '''One connection per shard, from one or more bot processes.'''
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        shard_id = None
+        await self.send(ws, {'op' : 10, 'd' : {'heartbeat_interval' : 41250}})
+
+        async for message in ws:
+            payload = json.loads(message.data)
+            op = payload.get('op')
+            if op == 1:
+                await self.send(ws, {'op' : 11})
+            elif op == 2:
+                shard_id, self.shard_count = payload['d'].get('shard') or [0, 1]
+                self.sessions[shard_id] = {'ws' : ws, 'sequence' : 0}
+                await self.ready(shard_id)
+            elif op == 6:
+                # Resuming isn't supported. Make the client identify again.
+                await self.send(ws, {'op' : 9, 'd' : False})
+            elif op == 8:
+                await self.dispatch(shard_id, 'GUILD_MEMBERS_CHUNK', {
+                    'guild_id' : payload['d']['guild_id'], 'members' : [self.bot_member()],
+                    'chunk_index' : 0, 'chunk_count' : 1, 'nonce' : payload['d'].get('nonce')
+                })
+
+        if shard_id is not None and self.sessions.get(shard_id, {}).get('ws') is ws:
+            del self.sessions[shard_id]
+        return ws
+
+    async def ready(self, shard_id):
+        guilds = {
+            guild_id : channel_ids for guild_id, channel_ids in self.trace_guilds().items()
+            if shard_id_for(guild_id, self.shard_count) == shard_id
+        }
+        await self.dispatch(shard_id, 'READY', {
+            'v' : 10,
+            'user' : self.bot_user,
+            'guilds' : [{'id' : guild_id, 'unavailable' : True} for guild_id in guilds],
+            'session_id' : f'replay-{shard_id}',
+            'resume_gateway_url' : f'ws://{self.host}:{self.port}/gateway',
+            'application' : {'id' : self.application_id, 'flags' : 0},
+            'shard' : [shard_id, self.shard_count]
+        })
+        for guild_id, channel_ids in guilds.items():
+            await self.dispatch(shard_id, 'GUILD_CREATE', self.guild_payload(guild_id, channel_ids))
+        if len(self.sessions) >= self.shard_count:
+            self.identified.set()
+
+    def trace_guilds(self):
+        guilds = {}
+        for entry in self.trace:
+            if entry.get('guild_id'):
+                channels = guilds.setdefault(entry['guild_id'], set())
+                if entry.get('channel_id'):
+                    channels.add(entry['channel_id'])
+        return guilds
+
+    def bot_member(self):
+        return {'user' : self.bot_user, 'roles' : [], 'joined_at' : now_iso(), 'deaf' : False, 'mute' : False, 'flags' : 0}
+
+    def channel_payload(self, channel_id, guild_id=None, channel_type=0):
+        channel = {
+            'id' : str(channel_id), 'type' : channel_type, 'name' : f'channel-{channel_id}', 'position' : 0,
+            'permission_overwrites' : [], 'nsfw' : False, 'parent_id' : None, 'last_message_id' : None
+        }
+        if guild_id is not None:
+            channel['guild_id'] = str(guild_id)
+        return channel
+
+    def guild_payload(self, guild_id, channel_ids):
+        return {
+            'id' : guild_id, 'name' : f'Guild {guild_id}', 'icon' : None, 'owner_id' : self.bot_user['id'],
+            'afk_timeout' : 300, 'verification_level' : 0, 'default_message_notifications' : 0,
+            'explicit_content_filter' : 0, 'mfa_level' : 0, 'system_channel_flags' : 0, 'premium_tier' : 0,
+            'nsfw_level' : 0, 'preferred_locale' : 'en-US', 'features' : [], 'emojis' : [], 'stickers' : [],
+            'roles' : [{
+                'id' : guild_id, 'name' : '@everyone', 'color' : 0, 'hoist' : False, 'position' : 0,
+                'permissions' : '2147483647', 'managed' : False, 'mentionable' : False
+            }],
+            'channels' : [self.channel_payload(channel_id) for channel_id in channel_ids],
+            'members' : [self.bot_member()], 'member_count' : 1, 'large' : False, 'unavailable' : False,
+            'joined_at' : now_iso(), 'threads' : [], 'presences' : [], 'voice_states' : [],
+            'stage_instances' : [], 'guild_scheduled_events' : []
+        }
+
+    # Replay
+
+    def interaction_payload(self, entry):
+        interaction_id = str(self.snowflake())
+        token = f'replay-{interaction_id}'
+        user = {
+            'id' : entry['user']['id'], 'username' : entry['user']['username'], 'discriminator' : '0',
+            'avatar' : None, 'global_name' : entry['user'].get('global_name')
+        }
+        payload = {
+            'id' : interaction_id, 'application_id' : self.application_id, 'type' : entry['type'],
+            'data' : entry['data'], 'token' : token, 'version' : 1, 'channel_id' : entry['channel_id'],
+            'channel' : self.channel_payload(entry['channel_id'], entry.get('guild_id'), entry.get('channel_type') or 0),
+            'locale' : entry.get('locale', 'en-US'), 'app_permissions' : '2147483647',
+            'attachment_size_limit' : 26214400, 'entitlements' : [], 'authorizing_integration_owners' : {},
+            'context' : 0 if entry.get('guild_id') else 1
+        }
+        if entry.get('guild_id'):
+            payload['guild_id'] = entry['guild_id']
+            payload['guild_locale'] = 'en-US'
+            payload['member'] = {
+                'user' : user, 'roles' : [], 'joined_at' : now_iso(), 'deaf' : False, 'mute' : False,
+                'flags' : 0, 'permissions' : entry.get('permissions', '0')
+            }
+        else:
+            payload['user'] = user
+
+        if entry.get('message') is not None:
+            payload['message'] = self.resolve_message(entry)
+
+        return token, payload
+
+    def resolve_message(self, entry):
+        '''Find the mock's copy of the message a recorded component was on.'''
+        recorded = entry['message']
+        message_id = self.created_by.get(recorded.get('interaction_id'))
+        if message_id is None:
+            message_id = recorded['id']
+        message = self.messages.get(message_id)
+        if message is None:
+            # Created before the recording started. Rebuild it from the trace.
+            message = self.message_payload(entry['channel_id'], {
+                'embeds' : recorded.get('embeds', []), 'components' : recorded.get('components', [])
+            }, message_id=recorded['id'], guild_id=entry.get('guild_id'))
+        return message
+
+    async def replay(self):
+        await self.identified.wait()
+        # Give on_ready time to finish
+        await asyncio.sleep(self.warmup)
+        self.startup_calls = sum(self.rest_calls.values())
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        first = self.trace[0]['t'] if self.trace else 0
+        for entry in self.trace:
+            delay = start + (entry['t'] - first) / self.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            token, payload = self.interaction_payload(entry)
+            # DMs arrive on shard 0
+            shard_id = shard_id_for(entry['guild_id'], self.shard_count) if entry.get('guild_id') else 0
+            self.interactions[token] = [entry, loop.time(), None, False]
+            if not await self.dispatch(shard_id, 'INTERACTION_CREATE', payload):
+                self.undelivered += 1
+
+        replay_seconds = loop.time() - start
+        await asyncio.sleep(self.drain)
+        return replay_seconds
+
+    def report(self, replay_seconds):
+        replayed = len(self.interactions)
+        total_calls = sum(self.rest_calls.values()) - self.startup_calls
+        unacknowledged = sum(1 for state in self.interactions.values() if state[1] is not None)
+        return {
+            'interactions' : replayed,
+            'speed' : self.speed,
+            'replay_seconds' : round(replay_seconds, 3),
+            'startup_calls' : self.startup_calls,
+            'rest_calls' : total_calls,
+            'rest_calls_per_interaction' : round(total_calls / replayed, 2) if replayed else 0,
+            'ack_p50_ms' : round(percentile(self.ack_latency, 0.5) * 1000, 1),
+            'ack_p99_ms' : round(percentile(self.ack_latency, 0.99) * 1000, 1),
+            'unacknowledged' : unacknowledged,
+            'rate_limited' : self.rate_limited,
+            'undelivered' : self.undelivered,
+            'shards' : self.shard_count,
+            'routes' : dict(self.rest_calls.most_common())
+        }
+
+    # Messages
+
+    def message_payload(self, channel_id, body, message_id=None, guild_id=None, store=True):
+        message = {
+            'id' : str(message_id or self.snowflake()), 'channel_id' : str(channel_id), 'author' : self.bot_user,
+            'content' : body.get('content') or '', 'timestamp' : now_iso(), 'edited_timestamp' : None,
+            'tts' : False, 'mention_everyone' : False, 'mentions' : [], 'mention_roles' : [],
+            'attachments' : [], 'embeds' : body.get('embeds') or [], 'components' : body.get('components') or [],
+            'pinned' : False, 'type' : 0, 'flags' : body.get('flags') or 0
+        }
+        if guild_id is not None:
+            message['guild_id'] = str(guild_id)
+        if store:
+            self.messages[message['id']] = message
+        return message
+
+    def update_message(self, message, body):
+        for key in ('content', 'embeds', 'components', 'flags'):
+            if key in body:
+                message[key] = body[key] if body[key] is not None else ([] if key != 'content' else '')
+        message['edited_timestamp'] = now_iso()
+        return message
+
+    async def read_body(self, request):
+        if not request.body_exists:
+            return {}
+        if request.content_type.startswith('multipart/'):
+            form = await request.post()
+            return json.loads(form.get('payload_json', '{}'))
+        return await request.json()
+
+    def not_found(self, code=10008, message='Unknown Message'):
+        return json_response({'message' : message, 'code' : code}, status=404)
+
+    # REST handlers
+
+    async def no_content(self, request):
+        return web.Response(status=204)
+
+    async def empty_list(self, request):
+        return json_response([])
+
+    async def unknown_route(self, request):
+        return json_response({'message' : f'Mock has no route for {request.method} {request.path}', 'code' : 0}, status=404)
+
+    async def get_gateway(self, request):
+        return json_response({
+            'url' : f'ws://{self.host}:{self.port}/gateway', 'shards' : 1,
+            'session_start_limit' : {'total' : 1000, 'remaining' : 1000, 'reset_after' : 0, 'max_concurrency' : 1}
+        })
+
+    async def get_me(self, request):
+        return json_response(self.bot_user)
+
+    async def get_user(self, request):
+        user_id = request.match_info['user_id']
+        for entry in self.trace:
+            if entry['user']['id'] == user_id:
+                return json_response({
+                    'id' : user_id, 'username' : entry['user']['username'], 'discriminator' : '0',
+                    'avatar' : None, 'global_name' : entry['user'].get('global_name')
+                })
+        return json_response({'id' : user_id, 'username' : f'user{user_id}', 'discriminator' : '0', 'avatar' : None})
+
+    async def get_application(self, request):
+        return json_response({
+            'id' : self.application_id, 'name' : 'DudelBot', 'description' : '', 'icon' : None,
+            'bot_public' : True, 'bot_require_code_grant' : False, 'owner' : self.bot_user,
+            'verify_key' : '', 'flags' : 0
+        })
+
+    async def sync_commands(self, request):
+        commands = await self.read_body(request)
+        for command in commands:
+            command.setdefault('id', str(self.snowflake()))
+            command.setdefault('application_id', self.application_id)
+            command.setdefault('version', '1')
+            command.setdefault('type', 1)
+            command.setdefault('description', '')
+        return json_response(commands)
+
+    async def create_dm(self, request):
+        body = await self.read_body(request)
+        recipient = str(body.get('recipient_id'))
+        channel = self.dm_channels.get(recipient)
+        if channel is None:
+            channel = self.dm_channels[recipient] = {
+                'id' : str(self.snowflake()), 'type' : 1, 'last_message_id' : None,
+                'recipients' : [{'id' : recipient, 'username' : f'user{recipient}', 'discriminator' : '0', 'avatar' : None}]
+            }
+        return json_response(channel)
+
+    async def get_channel(self, request):
+        return json_response(self.channel_payload(request.match_info['channel_id']))
+
+    async def interaction_callback(self, request):
+        token = request.match_info['token']
+        body = await self.read_body(request)
+        state = self.interactions.get(token)
+        response_type = body.get('type')
+        resource = {'type' : response_type}
+        message_id = None
+
+        if state is not None and state[1] is not None:
+            self.ack_latency.append(asyncio.get_running_loop().time() - state[1])
+            state[1] = None
+
+        data = body.get('data') or {}
+        if response_type == 4 and state is not None:
+            message = self.message_payload(state[0]['channel_id'], data, guild_id=state[0].get('guild_id'))
+            state[2] = message['id']
+            self.created_by.setdefault(state[0]['id'], message['id'])
+            resource['message'] = message
+            message_id = message['id']
+        elif response_type == 5 and state is not None:
+            state[3] = True
+        elif response_type == 7 and state is not None and state[0].get('message'):
+            message = self.resolve_message(state[0])
+            resource['message'] = self.update_message(message, data)
+            message_id = message['id']
+
+        return json_response({
+            'interaction' : {
+                'id' : request.match_info['interaction_id'], 'type' : state[0]['type'] if state else 2,
+                'response_message_id' : message_id, 'response_message_loading' : response_type == 5,
+                'response_message_ephemeral' : bool(data.get('flags', 0) & 64)
+            },
+            'resource' : resource
+        })
+
+    async def create_followup(self, request):
+        token = request.match_info['token']
+        body = await self.read_body(request)
+        state = self.interactions.get(token)
+        entry = state[0] if state is not None else {'channel_id' : '0'}
+        message = self.message_payload(entry['channel_id'], body, guild_id=entry.get('guild_id'))
+        if state is not None:
+            # After a defer, the first followup replaces the "thinking" message
+            if state[3] and state[2] is None:
+                state[2] = message['id']
+            if 'id' in entry:
+                self.created_by.setdefault(entry['id'], message['id'])
+        if request.query.get('wait') in ('true', '1', 'True'):
+            return json_response(message)
+        return web.Response(status=204)
+
+    def webhook_message(self, request):
+        message_id = request.match_info['message_id']
+        if message_id == '@original':
+            state = self.interactions.get(request.match_info['token'])
+            if state is None:
+                return None
+            if state[2] is None:
+                # Editing the original after a defer creates it
+                message = self.message_payload(state[0]['channel_id'], {}, guild_id=state[0].get('guild_id'))
+                state[2] = message['id']
+                self.created_by.setdefault(state[0]['id'], message['id'])
+            message_id = state[2]
+        return self.messages.get(message_id)
+
+    async def get_webhook_message(self, request):
+        message = self.webhook_message(request)
+        return json_response(message) if message is not None else self.not_found()
+
+    async def edit_webhook_message(self, request):
+        message = self.webhook_message(request)
+        if message is None:
+            return self.not_found()
+        return json_response(self.update_message(message, await self.read_body(request)))
+
+    async def delete_webhook_message(self, request):
+        message = self.webhook_message(request)
+        if message is None:
+            return self.not_found()
+        self.messages.pop(message['id'], None)
+        return web.Response(status=204)
+
+    async def create_message(self, request):
+        return json_response(self.message_payload(request.match_info['channel_id'], await self.read_body(request)))
+
+    async def get_message(self, request):
+        message = self.messages.get(request.match_info['message_id'])
+        return json_response(message) if message is not None else self.not_found()
+
+    async def edit_message(self, request):
+        message = self.messages.get(request.match_info['message_id'])
+        if message is None:
+            return self.not_found()
+        return json_response(self.update_message(message, await self.read_body(request)))
+
+    async def delete_message(self, request):
+        if self.messages.pop(request.match_info['message_id'], None) is None:
+            return self.not_found()
+        return web.Response(status=204)
+
+    def scheduled_event_payload(self, guild_id, body, event_id=None):
+        return {
+            'id' : str(event_id or self.snowflake()), 'guild_id' : str(guild_id), 'channel_id' : None,
+            'creator_id' : self.bot_user['id'], 'name' : body.get('name', ''), 'description' : body.get('description'),
+            'scheduled_start_time' : body.get('scheduled_start_time', now_iso()),
+            'scheduled_end_time' : body.get('scheduled_end_time'), 'privacy_level' : 2,
+            'status' : body.get('status', 1), 'entity_type' : body.get('entity_type', 3), 'entity_id' : None,
+            'entity_metadata' : body.get('entity_metadata') or {'location' : ''}, 'user_count' : 0, 'image' : None
+        }
+
+    async def create_scheduled_event(self, request):
+        event = self.scheduled_event_payload(request.match_info['guild_id'], await self.read_body(request))
+        self.scheduled_events[event['id']] = event
+        return json_response(event)
+
+    async def get_scheduled_event(self, request):
+        event = self.scheduled_events.get(request.match_info['event_id'])
+        if event is None:
+            return self.not_found(10070, 'Unknown Guild Scheduled Event')
+        return json_response(event)
+
+    async def edit_scheduled_event(self, request):
+        event = self.scheduled_events.get(request.match_info['event_id'])
+        if event is None:
+            event = self.scheduled_event_payload(request.match_info['guild_id'], {}, request.match_info['event_id'])
+        body = await self.read_body(request)
+        event.update({k : v for k, v in body.items() if k in event and k != 'image'})
+        self.scheduled_events[event['id']] = event
+        return json_response(event)
+
+async def main(args):
+    trace = load_trace(args.trace)
+    mock = MockDiscord(
+        trace, speed=args.speed, host=args.host, port=args.port,
+        rate_limit=args.rate_limit, warmup=args.warmup, drain=args.drain
+    )
+    runner = web.AppRunner(mock.app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f'Mock Discord listening. Start the bot with:')
+    print(f'  DISCORD_API_BASE=http://{args.host}:{args.port}{API_PREFIX} DISCORD_GATEWAY_URL=ws://{args.host}:{args.port}/gateway python DudelBot.py')
+    print(f'Waiting to replay {len(trace)} interactions at {args.speed}x...')
+
+    try:
+        replay_seconds = await mock.replay()
+        report = mock.report(replay_seconds)
+        print(json.dumps(report, indent=2))
+        if args.report:
+            with open(args.report, 'w') as file:
+                json.dump(report, file, indent=2)
+    finally:
+        # Open gateway connections would otherwise hold up cleanup for a minute
+        for session in list(mock.sessions.values()):
+            await session['ws'].close()
+        await runner.cleanup()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay an interaction trace against a mock Discord API.')
+    parser.add_argument('trace', help='JSON-lines trace written by InteractionRecorder')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed, e.g. 10 for 10x')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--rate-limit', type=int, default=0, help='Requests per second per route before returning 429, 0 for none')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds to wait after READY before replaying')
+    parser.add_argument('--drain', type=float, default=5.0, help='Seconds to wait for the bot after the last interaction')
+    parser.add_argument('--report', help='Also write the report to this JSON file')
+    asyncio.run(main(parser.parse_args()))
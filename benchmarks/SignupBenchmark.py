@@ -0,0 +1,191 @@
+'''Signup path micro-benchmark.
+
+Runs EventView.add_signup, EventView.withdraw_btn and Events.update_event_signups
+against stub interactions and messages and a temporary SQLite database, with
+no Discord connection. N simulated users click buttons on M events at once.
+Message edits sleep for --edit-latency seconds to stand in for the REST call.
+
+Usage, from the repository root:
+    python benchmarks/SignupBenchmark.py --users 200 --events 5 --clicks 10
+'''
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+import DatabaseFunctions as dbfunc
+import AsyncDatabaseFunctions as adbfunc
+from cogs.Events import Events, EventView
+
+GUILD_ID = 1
+CHANNEL_ID = 2
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+class FakeMessage:
+    def __init__(self, message_id, embed, edit_latency, counters):
+        self.id = message_id
+        self.channel = FakeChannel(CHANNEL_ID)
+        self.embeds = [embed]
+        self.components = []
+        self.edit_latency = edit_latency
+        self.counters = counters
+
+    async def edit(self, embed=None, **kwargs):
+        self.counters['edits'] += 1
+        await asyncio.sleep(self.edit_latency)
+        if embed is not None:
+            self.embeds = [embed]
+        return self
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.display_name = f'User {user_id}'
+
+    async def send(self, *args, **kwargs):
+        pass
+
+class FakeResponse:
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        pass
+
+class FakeInteraction:
+    def __init__(self, user, message):
+        self.user = user
+        self.message = message
+        self.guild_id = GUILD_ID
+        self.channel_id = CHANNEL_ID
+        self.command = None
+        self.extras = {}
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+class FakeBot:
+    def __init__(self):
+        self.guild_channels = {GUILD_ID : CHANNEL_ID}
+
+    def dispatch(self, *args):
+        pass
+
+def make_embed(events, event_id):
+    embed = discord.Embed(title=f'Event {event_id}', description='Benchmark event')
+    embed.add_field(name=f'{events.dps_role} {events.dps_emoji} - (0)', value='​')
+    embed.add_field(name=f'{events.support_role} {events.support_emoji} - (0)', value='​')
+    embed.set_footer(text=f'Event ID: {event_id}')
+    return embed
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def format_ms(samples):
+    return f'p50 {percentile(samples, 0.5) * 1000:8.2f} ms   p99 {percentile(samples, 0.99) * 1000:8.2f} ms   max {max(samples, default=0) * 1000:8.2f} ms'
+
+async def run_benchmark(args):
+    random.seed(args.seed)
+    await adbfunc.run_migrations()
+
+    events = Events(FakeBot())
+    events.render_scheduler.window = args.render_window
+    lock_waits = []
+    events.event_locks.on_wait = lock_waits.append
+    view = EventView(events)
+
+    counters = {'edits' : 0}
+    now = int(time.time())
+    messages = []
+    for i in range(args.events):
+        event_id = 1000 + i
+        await adbfunc.insert_event(event_id, 'Host', 1, now + 3600, f'Event {event_id}', GUILD_ID, None)
+        if args.limit:
+            await adbfunc.insert_event_limits(event_id, args.limit, args.limit)
+        message = FakeMessage(event_id, make_embed(events, event_id), args.edit_latency, counters)
+        events.message_cache.put(message)
+        messages.append(message)
+
+    if args.cold_store:
+        adbfunc.event_store.max_events = 1
+        adbfunc.event_store.evict()
+
+    latencies = {'dps' : [], 'support' : [], 'withdraw' : []}
+
+    async def user_session(user_id):
+        user = FakeUser(user_id)
+        for _ in range(args.clicks):
+            message = random.choice(messages)
+            interaction = FakeInteraction(user, message)
+            action = random.choices(['dps', 'support', 'withdraw'], weights=[4, 4, 2])[0]
+            start = time.perf_counter()
+            if action == 'withdraw':
+                await view.withdraw_btn.callback(interaction)
+            else:
+                await interaction.response.defer()
+                role = events.dps_role if action == 'dps' else events.support_role
+                await view.add_signup(interaction, role)
+            latencies[action].append(time.perf_counter() - start)
+            if args.think_time:
+                await asyncio.sleep(random.uniform(0, args.think_time))
+
+    # The buttons print a line per click. Keep them out of the report.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        await asyncio.gather(*[user_session(10_000 + i) for i in range(args.users)])
+        click_seconds = time.perf_counter() - start
+
+        # Wait for every pending render so the edits count is final
+        flush_start = time.perf_counter()
+        await asyncio.gather(*[events.update_event_signups(message) for message in messages])
+        flush_seconds = time.perf_counter() - flush_start
+        await events.render_scheduler.close()
+
+    clicks = sum(len(samples) for samples in latencies.values())
+    print(f'{args.users} users x {args.clicks} clicks on {args.events} events, edit latency {args.edit_latency * 1000:.0f} ms')
+    print(f'throughput   {clicks / click_seconds:10.1f} clicks/s ({clicks} clicks in {click_seconds:.2f}s)')
+    for action, samples in latencies.items():
+        print(f'{action:<12} {format_ms(samples)}   n={len(samples)}')
+    print(f'{"all clicks":<12} {format_ms([s for samples in latencies.values() for s in samples])}')
+    print(f'{"lock wait":<12} {format_ms(lock_waits)}   n={len(lock_waits)}')
+    print(f'renders      {events.render_scheduler.stats()}')
+    print(f'edits        {counters["edits"]} message edits, final flush {flush_seconds * 1000:.1f} ms')
+
+async def main(args):
+    try:
+        await run_benchmark(args)
+    finally:
+        await adbfunc.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the signup path without Discord.')
+    parser.add_argument('--users', type=int, default=100, help='Concurrent simulated users')
+    parser.add_argument('--events', type=int, default=5, help='Number of events to click on')
+    parser.add_argument('--clicks', type=int, default=10, help='Button clicks per user')
+    parser.add_argument('--limit', type=int, default=0, help='Signup limit per role, 0 for none')
+    parser.add_argument('--edit-latency', type=float, default=0.05, help='Seconds each message edit takes')
+    parser.add_argument('--render-window', type=float, default=1.0, help='RenderScheduler coalescing window')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between clicks')
+    parser.add_argument('--cold-store', action='store_true', help='Shrink the event store to one event so most reads hit SQLite')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dbfunc.DB_PATH = os.path.join(tmp, 'benchmark.db')
+        asyncio.run(main(args))
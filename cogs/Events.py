@@ -4,14 +4,29 @@ from discord.ext import commands
 from discord.app_commands import Choice
 from typing import Literal, Optional
 from dotenv import load_dotenv
-import traceback
 import time
 import datetime
-import sqlite3
-import aiohttp
 import asyncio
+import contextlib
+import io
+import os
 import Exceptions
-import DatabaseFunctions as dbfunc
+import BotLogging
+from KeyedLock import KeyedLock
+from RenderScheduler import RenderScheduler
+from MessageCache import MessageCache
+from Roster import RosterCache
+from NotificationDispatcher import NotificationDispatcher
+from ImageCache import ImageCache
+from ImageFetcher import ImageFetcher
+from ImageNormalizer import ImageNormalizer
+from Metrics import metrics, timed
+import AsyncDatabaseFunctions as adbfunc
+
+# Discord's limit on the characters in an embed, across all its text
+EMBED_LIMIT = 6000
+# Fields per role before the rest of the roster moves behind the Full roster button
+MAX_ROLE_FIELDS = 3
 
 class Events(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
@@ -46,7 +61,25 @@ class Events(commands.Cog):
             'PST' : '-0800',
             'UTC/GMT' : '+0000',
         }
-        self.lock = asyncio.Lock()
+        # One lock per event ID so signups for different events run in parallel
+        self.event_locks = KeyedLock(on_wait=lambda seconds: metrics.observe('event_lock_wait_seconds', seconds))
+        # Merges bursts of signup changes into one message edit per event
+        self.render_scheduler = RenderScheduler(self.render_event_signups)
+        # Event messages, so edit commands don't have to fetch them first
+        self.message_cache = MessageCache()
+        # Rendered signup fields per event, updated as signups change
+        self.rosters = RosterCache()
+        # Maximum concurrent fetch_message calls per command
+        self.fetch_concurrency = 5
+        # Sends DMs in the background so commands don't wait on them
+        self.notifications = NotificationDispatcher(bot)
+        # Default images and recently downloaded img_urls
+        self.default_image_path = './images/DudelBot.png'
+        self.image_cache = ImageCache(disk_dir=os.getenv('IMAGE_CACHE_DIR'))
+        # One HTTP session for every img_url download
+        self.image_fetcher = ImageFetcher(self.image_cache)
+        # Shrinks scheduled event covers in a worker process
+        self.image_normalizer = ImageNormalizer()
 
         # Add checks
         self.end_event.add_check(self.is_event_channel_set)
@@ -59,9 +92,62 @@ class Events(commands.Cog):
         self.my_signups.add_check(self.is_event_channel_set)
         self.player_signups.add_check(self.is_event_channel_set)
     
+    async def cog_load(self):
+        self.notifications.start()
+        await self.image_fetcher.start()
+        self.image_normalizer.start()
+        await self.image_cache.preload(
+            [paths[1] for paths in self.default_image_urls.values()]
+            + [self.default_image_path, './images/Thonk.png']
+        )
+
+    async def cog_unload(self):
+        await self.render_scheduler.close()
+        await self.notifications.close()
+        await self.image_fetcher.close()
+        await self.image_normalizer.close()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Start the clock for the command_seconds histogram
+        interaction.extras['started'] = time.perf_counter()
+        return True
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        record_command(interaction, 'ok')
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        self.message_cache.update(payload.message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.message_cache.remove(payload.channel_id, payload.message_id)
+        await self.check_event_removed(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        for message_id in payload.message_ids:
+            self.message_cache.remove(payload.channel_id, message_id)
+            await self.check_event_removed(message_id)
+
+    # Another process may have torn down one of our events, e.g. when its host
+    # ends it from a done prompt, whose answers arrive on shard 0. The message
+    # delete still comes to this process, so check the database for the event.
+    # Our own teardowns have already removed it from the store.
+    async def check_event_removed(self, message_id):
+        if message_id in adbfunc.event_store and await adbfunc.refresh_event(message_id) is None:
+            self.forget_event(message_id)
+
+    # Drop an event's pending render, roster and scheduled deadlines once its rows are gone
+    def forget_event(self, event_id):
+        self.render_scheduler.forget(event_id)
+        self.rosters.forget(event_id)
+        self.bot.dispatch('dudel_event_removed', int(event_id))
+
     @commands.Cog.listener()
     async def on_scheduled_event_user_add(self, event, user):
-        scheduled_event_ids = dbfunc.fetch_scheduled_event_ids()
+        scheduled_event_ids = await adbfunc.fetch_scheduled_event_ids()
         if (event.id,) in scheduled_event_ids:
             event_link = event.description.split('\n')[-1]
             embed = discord.Embed(
@@ -72,7 +158,7 @@ class Events(commands.Cog):
                     f"Please [Click Here]({event_link}) to confirm your registration for {event.name}."
                 )
             )
-            await user.send(embed=embed)
+            self.notifications.notify(user.id, embed=embed)
 
     # Custom help command
     @app_commands.command()
@@ -86,7 +172,7 @@ class Events(commands.Cog):
             description='Available parameters and their descriptions are shown when using a command.\n\u200b',
             color=discord.Color.green()
         )
-        file = discord.File('./images/Thonk.png', filename='Thonk.png')
+        file = discord.File(io.BytesIO(await self.image_cache.read_file('./images/Thonk.png')), filename='Thonk.png')
         embed.set_thumbnail(url='attachment://Thonk.png')
 
         # create_event command
@@ -202,20 +288,7 @@ class Events(commands.Cog):
     @app_commands.checks.has_permissions(manage_events=True)
     async def set_events_channel(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        con = sqlite3.connect(self.bot.db_path)
-        cur = con.cursor()
-        result = cur.execute("SELECT channel_id FROM guild_channel_id WHERE guild_id=?", (interaction.guild_id,)).fetchone()
-
-        # Channel ID for the current guild has been set before. Update it instead.
-        if result:
-            cur.execute("UPDATE guild_channel_id SET channel_id=? WHERE guild_id=?", (interaction.channel_id, interaction.guild_id))
-
-        # Channel ID for the current guild has never been set. Add it to the database.
-        else:
-            cur.execute("INSERT INTO guild_channel_id VALUES (?, ?)", (interaction.guild_id, interaction.channel_id))
-
-        con.commit()
-        con.close()
+        await adbfunc.set_guild_channel_id(interaction.guild_id, interaction.channel_id)
         self.bot.guild_channels.update({interaction.guild_id: interaction.channel_id})
         await interaction.followup.send('Events channel set')
 
@@ -278,7 +351,7 @@ class Events(commands.Cog):
             e_datetime = datetime.datetime.strptime(' '.join([day, hour, minute, am_pm, utc_offset]), '%m/%d/%y %I %M %p %z')
         except ValueError:
             await interaction.followup.send('Date input was invalid. Expected format MM/DD/YY')
-            self.bot.log_error()
+            BotLogging.log_error('Invalid create_event date', interaction=interaction)
             return
 
         # Create the embed
@@ -310,19 +383,17 @@ class Events(commands.Cog):
 
         elif img_url:
             try:
-                image_formats = ['image/png', 'image/jpeg', 'image/jpg', 'image/webp']
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(img_url, timeout=10) as response:
-                        if response.headers['content-type'] in image_formats:
-                            embed.set_image(url=img_url)
-                            content = await response.content.read()
-                            image_bytes = bytearray(content)
-                            img_decided = True
-
-                        else:
-                            await interaction.user.send("The img_link you passed was not a direct link to an image. If you would like to retry, delete the event and create another using a direct image link (typically ending in .png or .jpg)")
-                            
-            except asyncio.exceptions.TimeoutError:
+                image_bytes = await self.image_fetcher.fetch(img_url)
+                embed.set_image(url=img_url)
+                img_decided = True
+
+            except Exceptions.NotAnImage:
+                await interaction.user.send("The img_link you passed was not a direct link to an image. If you would like to retry, delete the event and create another using a direct image link (typically ending in .png or .jpg)")
+
+            except Exceptions.ImageTooLarge:
+                await interaction.user.send("The image at img_url is too large - using default image instead.")
+
+            except Exceptions.ImageFetchError:
                 await interaction.user.send("Couldn't reach img_url - using default image instead.")
 
         # If no image provided, search for a default image based on the event title.
@@ -330,16 +401,17 @@ class Events(commands.Cog):
             for key in self.default_image_urls:
                 if key in title.lower():
                     embed.set_image(url=self.default_image_urls[key][0])
-                    with open(self.default_image_urls[key][1], 'rb') as file:
-                        image_bytes = bytearray(file.read())
+                    image_bytes = await self.image_cache.read_file(self.default_image_urls[key][1])
                     img_decided = True
                     break
             
         # If no image was set based on the event title, use the constant default image.
         if not img_decided:
             embed.set_image(url='https://cdn.discordapp.com/attachments/1025962764788830238/1025962950198042704/DudelBot.png')
-            with open('./images/DudelBot.png', 'rb') as file:
-                image_bytes = bytearray(file.read())
+            image_bytes = await self.image_cache.read_file(self.default_image_path)
+
+        # Shrink the cover while the event message is sent
+        cover_task = asyncio.create_task(self.image_normalizer.normalize(image_bytes))
 
         # Send the event in chat.
         sent_message = await interaction.followup.send(
@@ -371,34 +443,38 @@ class Events(commands.Cog):
                 start_time=e_datetime,
                 end_time=e_datetime + datetime.timedelta(hours=1),
                 location=f"<#{self.bot.guild_channels[interaction.guild_id]}>",
-                image=image_bytes
+                image=await cover_task
             )
         
             # Store the event details in the database
             # with scheduled_event id
-            dbfunc.insert_event(
+            await adbfunc.insert_event(
                 sent_message.id,
                 interaction.user.display_name,
                 interaction.user.id,
                 int(e_datetime.timestamp()),
                 title,
                 interaction.guild_id,
-                scheduled_event.id
+                scheduled_event.id,
+                sent_message.channel.id
             )
         
         else:
             # Store the event details in the database
             # with no scheduled_event id
-            dbfunc.insert_event(
+            await adbfunc.insert_event(
                 sent_message.id,
                 interaction.user.display_name,
                 interaction.user.id,
                 int(e_datetime.timestamp()),
                 title,
                 interaction.guild_id,
-                None
+                None,
+                sent_message.channel.id
             )
 
+        self.bot.dispatch('dudel_event_scheduled', sent_message.id, int(e_datetime.timestamp()), interaction.guild_id)
+
     @app_commands.command()
     @app_commands.default_permissions(manage_events=True)
     @app_commands.checks.has_permissions(manage_events=True)
@@ -408,7 +484,7 @@ class Events(commands.Cog):
     async def end_event(self, interaction: discord.Interaction, event_id: str):
         '''End an event that has concluded.'''
         await interaction.response.defer(ephemeral=True)
-        event_info = dbfunc.get_event_info(event_id)
+        event_info = await adbfunc.get_event_info(event_id)
 
         if not event_info:
             await interaction.followup.send('Event does not exist')
@@ -416,20 +492,10 @@ class Events(commands.Cog):
 
         if interaction.user.id != event_info[2]:
             await interaction.followup.send('You cannot end events where you are not the host')
-            self.log_message(f'User {interaction.user.id} tried to end event {event_id} but is not the event host!')
+            BotLogging.log_message(f'User {interaction.user.id} tried to end event {event_id} but is not the event host!', interaction=interaction, event_id=event_id)
             return
 
-        player_ids = dbfunc.fetch_event_signup_distinct_player_ids(event_id)
-        for id in player_ids:
-            dbfunc.delete_user_from_signups(event_id, id[0])
-
-        dbfunc.delete_event_by_id(event_id)
-        event_message = await self.get_event_message(self.bot.guild_channels[interaction.guild_id], event_id)
-        await event_message.delete()
-        scheduled_event = interaction.guild.get_scheduled_event(event_info[9])
-        if scheduled_event:
-            await scheduled_event.delete()
-
+        await self.teardown_event(event_id)
         await interaction.followup.send('Event ended.')
     
     @app_commands.command()
@@ -441,7 +507,7 @@ class Events(commands.Cog):
     async def cancel_event(self, interaction: discord.Interaction, event_id: str):
         '''Cancel an event that you are hosting. This will also notify all users who are currently signed up.'''
         await interaction.response.defer(ephemeral=True)
-        event_info = dbfunc.get_event_info(event_id)
+        event_info = await adbfunc.get_event_info(event_id)
 
         if not event_info:
             await interaction.followup.send('Event does not exist')
@@ -449,36 +515,32 @@ class Events(commands.Cog):
 
         if interaction.user.id != event_info[2]:
             await interaction.followup.send('You cannot cancel events where you are not the host')
-            self.log_message(f'User {interaction.user.id} tried to cancel event {event_id} but is not the event host!')
+            BotLogging.log_message(f'User {interaction.user.id} tried to cancel event {event_id} but is not the event host!', interaction=interaction, event_id=event_id)
             return
 
-        player_ids = dbfunc.fetch_event_signup_distinct_player_ids(event_id)
-        for id in player_ids:
-            user = await self.bot.fetch_user(id[0])
-            await user.send(f'{event_info[1]} has cancelled the event {event_info[4]} on <t:{event_info[3]}>')
-            dbfunc.delete_user_from_signups(event_id, id[0])
-
-        dbfunc.delete_event_by_id(event_id)
-        event_message = await self.get_event_message(self.bot.guild_channels[interaction.guild_id], event_id)
-        await event_message.delete()
-        scheduled_event = interaction.guild.get_scheduled_event(event_info[9])
-        if scheduled_event:
-            await scheduled_event.cancel()
+        event_info, player_ids = await self.teardown_event(event_id, cancel=True)
+        if event_info is None:
+            return await interaction.followup.send('Event does not exist')
 
+        batch = self.notifications.notify_many(
+            player_ids,
+            f'{event_info[1]} has cancelled the event {event_info[4]} on <t:{event_info[3]}>'
+        )
+        batch.add_done_callback(lambda stats: BotLogging.log_message(f'Cancellation notices for event {event_id}: {stats}', interaction=interaction, event_id=event_id))
         await interaction.followup.send('Event cancelled.')
 
     @app_commands.command()
     @app_commands.default_permissions(manage_events=True)
     async def edit_title(self, interaction: discord.Interaction, event_id: str, title: str):
         await interaction.response.defer(ephemeral=True)
-        if self.is_host(interaction.user.id, event_id):
+        if await self.is_host(interaction.user.id, event_id):
             if len(title) <= 256:
-                event_message = await self.get_event_message(self.bot.guild_channels[interaction.guild_id], event_id)
-                embed = event_message.embeds[0]
+                event_message = await self.find_event_message(event_id)
+                embed = event_message.embeds[0].copy()
                 embed.title = title
-                dbfunc.set_db_event_title(event_id, title)
-                await event_message.edit(embed=embed)
-                event_info = dbfunc.get_event_info(event_id)
+                await adbfunc.set_db_event_title(event_id, title)
+                self.message_cache.put(await event_message.edit(embed=embed))
+                event_info = await adbfunc.get_event_info(event_id)
                 scheduled_event = interaction.guild.get_scheduled_event(event_info[9])
                 if scheduled_event:
                     await scheduled_event.edit(
@@ -495,26 +557,26 @@ class Events(commands.Cog):
 
         else:
             await interaction.followup.send('You cannot edit events where you are not the host.')
-            self.log_message(f'User {interaction.user.id} tried to edit title of event {event_id} but is not the host!')
+            BotLogging.log_message(f'User {interaction.user.id} tried to edit title of event {event_id} but is not the host!', interaction=interaction, event_id=event_id)
 
     @app_commands.command()
     @app_commands.default_permissions(manage_events=True)
     async def edit_description(self, interaction: discord.Interaction, event_id: str, description: str):
         await interaction.response.defer(ephemeral=True)
-        if self.is_host(interaction.user.id, event_id):
+        if await self.is_host(interaction.user.id, event_id):
             if len(description) <= 4096:
-                event_message = await self.get_event_message(self.bot.guild_channels[interaction.guild_id], event_id)
-                embed = event_message.embeds[0]
+                event_message = await self.find_event_message(event_id)
+                embed = event_message.embeds[0].copy()
                 cur_desc = embed.description.split('\u200b')[0]
                 embed.description = '\u200b'.join([cur_desc, '\n', description, '\n\u200b'])
-                await event_message.edit(embed=embed)
+                self.message_cache.put(await event_message.edit(embed=embed))
                 await interaction.followup.send('Done')
             else:
                 await interaction.followup.send('Description can only be up to 4096 characters long.')
 
         else:
             await interaction.followup.send('You cannot edit events where you are not the host.')
-            self.log_message(f'User {interaction.user.id} tried to edit description of event {event_id} but is not the host!')
+            BotLogging.log_message(f'User {interaction.user.id} tried to edit description of event {event_id} but is not the host!', interaction=interaction, event_id=event_id)
 
     @app_commands.command()
     @app_commands.default_permissions(manage_events=True)
@@ -536,42 +598,43 @@ class Events(commands.Cog):
             await interaction.followup.send('Please specify either an image upload or an image url.')
             return
 
-        event_message = await self.get_event_message(self.bot.guild_channels[interaction.guild_id], event_id)
+        event_message = await self.find_event_message(event_id)
+        embed = event_message.embeds[0].copy()
 
         if image:
-            event_message.embeds[0].set_image(url=image.url)
+            embed.set_image(url=image.url)
             image_bytes = await image.read()
 
         elif img_url:
             try:
-                image_formats = ['image/png', 'image/jpeg', 'image/jpg', 'image/webp']
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(img_url, timeout=10) as response:
-                        if response.headers['content-type'] in image_formats:
-                            event_message.embeds[0].set_image(url=img_url)
-                            content = await response.content.read()
-                            image_bytes = bytearray(content)
-
-                        else:
-                            await interaction.user.send((
-                                "The img_link you passed was not a direct link to an image. "
-                                "If you would like to retry, delete the event and create another "
-                                "using a direct image link (typically ending in .png or .jpg)"
-                            ))
-                            
-            except asyncio.exceptions.TimeoutError:
+                image_bytes = await self.image_fetcher.fetch(img_url)
+                embed.set_image(url=img_url)
+
+            except Exceptions.NotAnImage:
+                await interaction.user.send((
+                    "The img_link you passed was not a direct link to an image. "
+                    "If you would like to retry, delete the event and create another "
+                    "using a direct image link (typically ending in .png or .jpg)"
+                ))
+                return
+
+            except Exceptions.ImageTooLarge:
+                await interaction.user.send("The image at img_url is too large.")
+                return
+
+            except Exceptions.ImageFetchError:
                 await interaction.user.send("Couldn't reach img_url.")
                 return
 
-        await event_message.edit(embed=event_message.embeds[0])
-        event_info = dbfunc.get_event_info(event_id)
+        self.message_cache.put(await event_message.edit(embed=embed))
+        event_info = await adbfunc.get_event_info(event_id)
         scheduled_event = interaction.guild.get_scheduled_event(event_info[9])
         await scheduled_event.edit(
             name=scheduled_event.name,
             description=scheduled_event.description,
             start_time=scheduled_event.start_time,
             end_time=scheduled_event.end_time,
-            image=image_bytes,
+            image=await self.image_normalizer.normalize(image_bytes),
             location=scheduled_event.location
         )
 
@@ -602,7 +665,7 @@ class Events(commands.Cog):
         timezone: Optional[Choice[str]],
         ):
         await interaction.response.defer(ephemeral=True)
-        if self.is_host(interaction.user.id, event_id):
+        if await self.is_host(interaction.user.id, event_id):
             # Parse the date and time entered by the user
             if timezone:
                 utc_offset = self.utc_offets[timezone.value]
@@ -616,16 +679,17 @@ class Events(commands.Cog):
                 await interaction.followup.send('Date input was invalid.')
                 return
 
-            event_message = await self.get_event_message(self.bot.guild_channels[interaction.guild_id], event_id)
-            embed = event_message.embeds[0]
+            event_message = await self.find_event_message(event_id)
+            embed = event_message.embeds[0].copy()
             cur_desc = '\u200b'.join(embed.description.split('\u200b')[1:])
             new_time = f'''Host: {interaction.user.display_name}\n
                         🕙 {discord.utils.format_dt(e_datetime, style='f')}\n\u200b'''
             embed.description = ''.join([new_time, cur_desc])
-            dbfunc.set_db_event_timestamp(event_id, int(e_datetime.timestamp()))
-            await event_message.edit(embed=embed)
+            await adbfunc.set_db_event_timestamp(event_id, int(e_datetime.timestamp()))
+            self.bot.dispatch('dudel_event_scheduled', int(event_id), int(e_datetime.timestamp()), interaction.guild_id)
+            event_message = self.message_cache.put(await event_message.edit(embed=embed))
 
-            event_info = dbfunc.get_event_info(event_id)
+            event_info = await adbfunc.get_event_info(event_id)
             scheduled_event = interaction.guild.get_scheduled_event(event_info[9])
             tdelta = e_datetime - discord.utils.utcnow()
             if scheduled_event and tdelta.days >= 0:
@@ -646,7 +710,7 @@ class Events(commands.Cog):
 
         else:
             await interaction.followup.send('You cannot edit events where you are not the host.')
-            self.log_message(f'User {interaction.user.id} tried to edit time of event {event_id} but is not the host!')
+            BotLogging.log_message(f'User {interaction.user.id} tried to edit time of event {event_id} but is not the host!', interaction=interaction, event_id=event_id)
 
     @app_commands.command()
     @app_commands.default_permissions(manage_events=True)
@@ -662,7 +726,8 @@ class Events(commands.Cog):
         event_id = int(event_id)
 
         # Return on bad inputs
-        if (event_id,) not in dbfunc.fetch_event_ids():
+        event_info = await adbfunc.get_event_info(event_id)
+        if not event_info:
             return await interaction.followup.send("That event does not exist.")
         if dps_limit < -1:
             return await interaction.followup.send("Bad dps_limit input")
@@ -670,42 +735,43 @@ class Events(commands.Cog):
             return await interaction.followup.send("Bad support_limit input")
 
         # Only allow the event's host to limit their event's signups
-        event_info = dbfunc.get_event_info(event_id)
         if interaction.user.id != event_info[2]:
             await interaction.followup.send('You cannot limit signups when you are not the host!')
-            self.log_message(f'User {interaction.user.id} tried to limit signups for event {event_id} but is not the host!')
+            BotLogging.log_message(f'User {interaction.user.id} tried to limit signups for event {event_id} but is not the host!', interaction=interaction, event_id=event_id)
             return
         
         role_limits = {self.dps_role : [dps_limit, self.dps_emoji], self.support_role : [support_limit, self.support_emoji]}
         removed_members = []
-        for role in role_limits:
-            signup_count = len(dbfunc.fetch_event_role_signup_info(event_id, role))
+        event_message = await self.get_event_message(self.event_channel_id(event_info), event_id)
+        async with self.event_locks(event_id):
+            for role in role_limits:
+                signup_count = len(await adbfunc.fetch_event_role_signup_info(event_id, role))
 
-            # User does not want a DPS/Support limit
-            if role_limits[role][0] == -1:
-                role_limits[role][0] = None
+                # User does not want a DPS/Support limit
+                if role_limits[role][0] == -1:
+                    role_limits[role][0] = None
 
-            # User specified a DPS/Support limit
-            else:
-                # Check to see if current role signups are higher than the limit.
-                # Remove excess signups.
-                if signup_count > role_limits[role][0]:
-                    removed_members.append((dbfunc.delete_latest_n_role_signups(event_id, role, signup_count-role_limits[role][0]), role))
+                # User specified a DPS/Support limit
+                else:
+                    # Check to see if current role signups are higher than the limit.
+                    # Remove excess signups.
+                    if signup_count > role_limits[role][0]:
+                        removed_members.append((await adbfunc.delete_latest_n_role_signups(event_id, role, signup_count-role_limits[role][0]), role))
+
+            # Insert the limits into the event database
+            await adbfunc.insert_event_limits(event_id, role_limits[self.dps_role][0], role_limits[self.support_role][0])
+
+        # Update the event message to display the new signup limits
+        await self.update_event_signups(event_message)
 
         # removed_members is a list of up to 2 tuples. Each tuple
         # is in the form of ([], str). The list in the first index is a list of tuples.
         # Alert users that they have been removed from the event.
         for tuple in removed_members:
-            for item in tuple[0]:
-                user = self.bot.get_user(item[1])
-                await user.send(f'You have been removed from `{event_info[4]}` on <t:{event_info[3]}> because the host has added signup limits for your role.')
-
-        # Insert the limits into the event database
-        dbfunc.insert_event_limits(event_id, role_limits[self.dps_role][0], role_limits[self.support_role][0])
-        
-        # Update the event message to display the new signup limits
-        event_message = await self.get_event_message(self.bot.guild_channels[interaction.guild_id], event_id)
-        await self.update_event_signups(event_message)
+            self.notifications.notify_many(
+                [item[1] for item in tuple[0]],
+                f'You have been removed from `{event_info[4]}` on <t:{event_info[3]}> because the host has added signup limits for your role.'
+            )
 
         # Alert the user.
         await interaction.followup.send(f'Your event now has a DPS limit of [{role_limits[self.dps_role][0]}] and a support limit of [{role_limits[self.support_role][0]}]. Any additional signups have been removed.')
@@ -714,20 +780,20 @@ class Events(commands.Cog):
     @app_commands.default_permissions(manage_events=True)
     async def remove_signup(self, interaction: discord.Interaction, event_id: str, member: discord.Member):
         await interaction.response.defer(ephemeral=True)
-        if self.is_host(interaction.user.id, event_id):
-            event_message = await self.get_event_message(self.bot.guild_channels[interaction.guild_id], event_id)
+        if await self.is_host(interaction.user.id, event_id):
+            event_message = await self.find_event_message(event_id)
 
             # Remove all of the user's signups on the event.
-            dbfunc.delete_user_from_signups(event_id, member.id)
+            await adbfunc.delete_user_from_signups(event_id, member.id)
             await self.update_event_signups(event_message)
             await interaction.followup.send(f'Removed {member.display_name}')
             
-            await member.send(f'The host has manually removed you from the following event.', embed=event_message.embeds[0].copy())
+            self.notifications.notify(member.id, f'The host has manually removed you from the following event.', embed=event_message.embeds[0].copy())
 
         # Only allow an event's host to remove signups
         else:
             await interaction.followup.send('You cannot remove signups for events where you are not the host.')
-            self.log_message(f'User {interaction.user.id} tried to remove member {member.id} from event {event_id} but is not the host!')
+            BotLogging.log_message(f'User {interaction.user.id} tried to remove member {member.id} from event {event_id} but is not the host!', interaction=interaction, event_id=event_id)
 
     @app_commands.command()
     @app_commands.checks.bot_has_permissions(send_messages=True)
@@ -735,8 +801,8 @@ class Events(commands.Cog):
         await interaction.response.defer()
         event_id = int(event_id)
 
-        player_ids = dbfunc.fetch_event_signup_distinct_player_ids(event_id)
-        event_info = dbfunc.get_event_info(event_id)
+        player_ids = await adbfunc.fetch_event_signup_distinct_player_ids(event_id)
+        event_info = await adbfunc.get_event_info(event_id)
         mentions = ' '.join([f'<@{id[0]}>' for id in player_ids])
         message = ' '.join([
             f'{interaction.user.display_name} is reminding',
@@ -751,16 +817,10 @@ class Events(commands.Cog):
         '''Sends you a list of the events you are signed up for.'''
         await interaction.response.defer(ephemeral=True)
 
-        event_ids = dbfunc.fetch_distinct_player_signup_events(interaction.user.id, interaction.guild_id)
-        p_msgable = self.bot.get_partial_messageable(self.bot.guild_channels[interaction.guild_id])
-        embeds = []
-
-        for event in event_ids:
-            event_message = await p_msgable.fetch_message(event[0])
-            embeds.append(event_message.embeds[0].copy())
+        events = await adbfunc.fetch_distinct_player_signup_events(interaction.user.id, interaction.guild_id)
+        sent = await self.send_event_embeds(interaction.user, events)
 
-        if len(embeds) != 0:
-            await interaction.user.send(embeds=embeds)
+        if sent != 0:
             await interaction.followup.send('I sent you a DM with all your event signups!')
         else:
             await interaction.followup.send('You are not signed up to any events.')
@@ -775,22 +835,151 @@ class Events(commands.Cog):
         await interaction.response.defer()
 
         member = member or interaction.user
-        event_ids = dbfunc.fetch_distinct_player_signup_events(member.id, interaction.guild_id)
-        p_msgable = self.bot.get_partial_messageable(self.bot.guild_channels[interaction.guild_id])
-        embeds = []
-
-        for event in event_ids:
-            event_message = await p_msgable.fetch_message(event[0])
-            embeds.append(event_message.embeds[0].copy())
+        events = await adbfunc.fetch_distinct_player_signup_events(member.id, interaction.guild_id)
+        sent = await self.send_event_embeds(interaction.user, events)
 
-        if len(embeds) != 0:
-            await interaction.user.send(embeds=embeds)
+        if sent != 0:
             await interaction.followup.send(f'I sent you a DM with {member.display_name}\'s event signups!')
         else:
             await interaction.followup.send(f'{member.display_name} is not signed up to any events.')
 
+    # DM a user the embeds of the given events, in order. Event messages are
+    # fetched concurrently from the channels they were posted in and sent in
+    # chunks as soon as each chunk is ready. Returns the number of embeds sent.
+    async def send_event_embeds(self, user, event_rows):
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+
+        async def fetch_embed(event_info):
+            async with semaphore:
+                try:
+                    event_message = await self.get_event_message(self.event_channel_id(event_info), event_info[0])
+                except discord.NotFound:
+                    # The event message was deleted by hand
+                    return None
+
+                return event_message.embeds[0].copy()
+
+        tasks = [asyncio.create_task(fetch_embed(row)) for row in event_rows]
+        chunk = []
+        sent = 0
+        try:
+            for task in tasks:
+                embed = await task
+                if embed is None:
+                    continue
+
+                # Discord allows 10 embeds and 6000 embed characters per message
+                if len(chunk) == 10 or sum(map(len, chunk)) + len(embed) > 6000:
+                    await user.send(embeds=chunk)
+                    sent += len(chunk)
+                    chunk = []
+                chunk.append(embed)
+
+            if chunk:
+                await user.send(embeds=chunk)
+                sent += len(chunk)
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return sent
+
+    # Delete an event's rows, its message and its Discord scheduled event.
+    # Safe to call more than once: later calls find no rows and do nothing.
+    # Returns (event row, signed up player ids), or (None, []) if the event was already gone.
+    async def teardown_event(self, event_id, channel_id=None, cancel=False):
+        async with self.event_locks(int(event_id)):
+            event_info, player_ids = await adbfunc.delete_event(event_id)
+
+        if event_info is None:
+            return None, []
+
+        await self.cleanup_event(event_info, channel_id or self.event_channel_id(event_info), cancel)
+        return event_info, player_ids
+
+    # Tear down a batch of events whose messages were already deleted, with
+    # their rows deleted in one transaction. Returns the deleted event rows.
+    async def teardown_deleted_events(self, event_ids, cancel=True):
+        # Locks are taken in id order so two batches can't wait on each other
+        event_ids = sorted({int(event_id) for event_id in event_ids})
+        async with contextlib.AsyncExitStack() as stack:
+            for event_id in event_ids:
+                await stack.enter_async_context(self.event_locks(event_id))
+            removed = await adbfunc.delete_events(event_ids)
+
+        for event_info in removed:
+            await self.cleanup_event(event_info, self.event_channel_id(event_info), cancel, message_deleted=True)
+
+        return removed
+
+    # Everything a teardown does once the event's rows are gone
+    async def cleanup_event(self, event_info, channel_id, cancel=False, message_deleted=False):
+        event_id = event_info[0]
+        self.forget_event(event_id)
+        jobs = [self.end_scheduled_event(event_info[7], event_info[9], cancel)]
+        if not message_deleted:
+            jobs.append(self.delete_event_message(channel_id, event_id))
+        elif channel_id is not None:
+            self.message_cache.remove(channel_id, event_id)
+
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                BotLogging.log_error(f'Teardown of event {event_id} failed', event_id=event_id, exc=result)
+
+    async def delete_event_message(self, channel_id, event_id):
+        if channel_id is None:
+            return
+
+        self.message_cache.remove(channel_id, event_id)
+        try:
+            # Delete by ID. There is no need to fetch the message first.
+            await self.bot.get_partial_messageable(int(channel_id)).get_partial_message(int(event_id)).delete()
+        except discord.NotFound:
+            pass
+
+    async def end_scheduled_event(self, guild_id, scheduled_event_id, cancel=False):
+        if guild_id is None or scheduled_event_id is None:
+            return
+
+        try:
+            # Guilds on another process's shards aren't cached here
+            guild = self.bot.get_guild(guild_id) or await self.bot.fetch_guild(guild_id)
+            scheduled_event = guild.get_scheduled_event(scheduled_event_id) or await guild.fetch_scheduled_event(scheduled_event_id)
+            if cancel:
+                await scheduled_event.cancel()
+            else:
+                await scheduled_event.delete()
+        except discord.NotFound:
+            pass
+
     async def get_event_message(self, channel_id, message_id):
-        return await self.bot.get_partial_messageable(int(channel_id)).fetch_message(int(message_id))
+        message = self.message_cache.get(channel_id, message_id)
+        if message is None:
+            message = await self.bot.get_partial_messageable(int(channel_id)).fetch_message(int(message_id))
+            self.cache_message(message)
+
+        return message
+
+    # Fetch an event's message from the channel it was posted in
+    async def find_event_message(self, event_id):
+        event_info = await adbfunc.get_event_info(event_id)
+        return await self.get_event_message(self.event_channel_id(event_info), event_id)
+
+    # The channel an event was posted in. Events from before channels were
+    # recorded are looked for in their guild's events channel.
+    def event_channel_id(self, event_info):
+        return event_info[10] or self.bot.guild_channels.get(event_info[7])
+
+    # Only messages from this process's guilds are cached. Edits and deletes in
+    # other guilds reach the processes running their shards, so a copy kept here
+    # would go stale.
+    def cache_message(self, message):
+        if self.bot.get_channel(message.channel.id) is not None:
+            self.message_cache.put(message)
+
+        return message
 
     # Custom check to see if a channel has been designated as the channel for events
     def is_event_channel_set(self, interaction: discord.Interaction) -> bool:
@@ -801,106 +990,121 @@ class Events(commands.Cog):
             return True
 
     # Check to see if user is host of event
-    def is_host(self, user_id, event_id):
-        event_info = dbfunc.get_event_info(event_id)
+    async def is_host(self, user_id, event_id):
+        event_info = await adbfunc.get_event_info(event_id)
         return user_id == event_info[2]
 
-    def log_error(self):
-        f = open('./logs/exception_log.log', 'a')
-        f.write(datetime.datetime.now().strftime('%b/%d/%y - %I:%M:%S %p'))
-        f.write('\n')
-        f.write(traceback.format_exc())
-        f.write('\n\n')
-        f.close()
-
-    def log_message(self, message):
-        f = open('./logs/message_log.log', 'a')
-        f.write(datetime.datetime.now().strftime('%b/%d/%y - %I:%M:%S %p'))
-        f.write('\n')
-        f.write(str(message))
-        f.write('\n\n')
-        f.close()
-
+    # Re-render the event's signup fields. Bursts of updates for the same
+    # event are merged into one edit that shows the latest roster.
     async def update_event_signups(self, event_message: discord.Message):
-        async with self.lock:
-            embed = event_message.embeds[0]
-
-            signups = dbfunc.fetch_event_signup_info(event_message.id)
-            dps_ids = [row[2] for row in signups if row[3] == self.dps_role]
-            support_ids = [row[2] for row in signups if row[3] == self.support_role]
-
-            # Set DPS field
-            signup_limit = dbfunc.get_event_info(event_message.id)[5]
-            if signup_limit is not None:
-                field_name = " ".join([self.dps_role, self.dps_emoji, "-", f"({len(dps_ids)}/{signup_limit})"])
-            else:
-                field_name = " ".join([self.dps_role, self.dps_emoji, "-", f"({len(dps_ids)})"])
-            if len(dps_ids) == 0:
-                signups = '\u200b'
-            else:
-                signups = '\n'.join(map(lambda x: f'<@{x}>', dps_ids))
-            embed.set_field_at(
-                index=0,
-                name=field_name,
-                value=signups
+        await self.render_scheduler.mark_dirty(event_message)
+
+    # Rebuild the DPS and Support fields from the database and edit the message.
+    # Called by the render scheduler, use update_event_signups instead.
+    async def render_event_signups(self, event_message: discord.Message):
+        # Prefer the cached copy. It reflects our latest edits, while the
+        # message attached to a button click may predate a title or time edit.
+        event_message = self.message_cache.get(event_message.channel.id, event_message.id) or event_message
+        embed = event_message.embeds[0].copy()
+
+        event_info = await adbfunc.get_event_info(event_message.id)
+        roster = await self.get_roster(event_message.id)
+        hidden = self.set_roster_fields(embed, roster, event_info)
+
+        # Show the Full roster button only while part of the roster is hidden
+        if (hidden > 0) != has_full_roster_button(event_message):
+            edited = await event_message.edit(embed=embed, view=EventView(self, full_roster=hidden > 0))
+        else:
+            edited = await event_message.edit(embed=embed)
+        self.message_cache.put(edited)
+
+    async def get_roster(self, event_id):
+        roster = self.rosters.get(event_id, [self.dps_role, self.support_role])
+        roster.sync(await adbfunc.fetch_event_signup_info(event_id))
+        return roster
+
+    def role_field_name(self, role, roster, event_info):
+        emoji, limit = (self.dps_emoji, event_info[5]) if role == self.dps_role else (self.support_emoji, event_info[6])
+        count = f'({len(roster.roles[role])}/{limit})' if limit is not None else f'({len(roster.roles[role])})'
+        return ' '.join([role, emoji, '-', count])
+
+    # Replace the embed's fields with the roster. Roles that don't fit in one
+    # field continue in more fields while the embed stays under its size limit.
+    # Returns how many signups didn't fit.
+    def set_roster_fields(self, embed, roster, event_info):
+        embed.clear_fields()
+        roles = [self.dps_role, self.support_role]
+        names = {role : self.role_field_name(role, roster, event_info) for role in roles}
+        pages = {role : roster.roles[role].pages() or ['\u200b'] for role in roles}
+
+        # Every role gets its first field. Leave room for the note about hidden signups.
+        shown = {role : 1 for role in roles}
+        used = len(embed) + sum(len(names[role]) + len(pages[role][0]) for role in roles) + 200
+        for role in roles:
+            while shown[role] < min(len(pages[role]), MAX_ROLE_FIELDS):
+                page = pages[role][shown[role]]
+                if used + 1 + len(page) > EMBED_LIMIT:
+                    break
+                used += 1 + len(page)
+                shown[role] += 1
+
+        hidden = 0
+        for role in roles:
+            for index in range(shown[role]):
+                embed.add_field(name=names[role] if index == 0 else '\u200b', value=pages[role][index])
+            hidden += sum(len(chunk) for chunk in roster.roles[role].chunks[shown[role]:])
+
+        if hidden > 0:
+            embed.add_field(
+                name='Full roster',
+                value=f'{hidden} more signups are not shown. Press **Full roster** to see everyone.',
+                inline=False
             )
+        return hidden
 
-            # Set Support field
-            signup_limit = dbfunc.get_event_info(event_message.id)[6]
-            if signup_limit is not None:
-                field_name = " ".join([self.support_role, self.support_emoji, "-", f"({len(support_ids)}/{signup_limit})"])
-            else:
-                field_name = " ".join([self.support_role, self.support_emoji, "-", f"({len(support_ids)})"])
-            if len(support_ids) == 0:
-                signups = '\u200b'
-            else:
-                signups = '\n'.join(map(lambda x: f'<@{x}>', support_ids))
-            embed.set_field_at(
-                index=1,
-                name=field_name,
-                value=signups
-            )
+def has_full_roster_button(message: discord.Message):
+    return any(
+        getattr(child, 'custom_id', None) == 'Roster_Btn'
+        for row in message.components for child in getattr(row, 'children', [])
+    )
 
-            await event_message.edit(embed=embed)
+def record_command(interaction: discord.Interaction, status):
+    'Record how long an Events command took. Called on completion and from the error handler.'
+    started = interaction.extras.get('started')
+    if started is not None and interaction.command is not None:
+        metrics.observe('command_seconds', time.perf_counter() - started, command=interaction.command.name, status=status)
 
 class EventView(discord.ui.View):
-    def __init__(self, events: Events):
+    def __init__(self, events: Events, full_roster=False):
         self.events = events
-        self.lock = asyncio.Lock()
         super().__init__(timeout=None)
+        # Events whose roster doesn't fit in the embed also get a Full roster button
+        if not full_roster:
+            self.remove_item(self.roster_btn)
 
     @discord.ui.button(style=discord.ButtonStyle.primary, emoji="⚔️", label="DPS", custom_id="DPS_Btn")
+    @timed('button_seconds', button='dps')
     async def dps_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer()
-        if dbfunc.is_signed_up_role(interaction.message.id, interaction.user.id, self.events.dps_role):
-            await interaction.followup.send(
-                f"You are already signed up as a {self.events.dps_role}",
-                ephemeral=True
-            )
-
-        else:
-            await self.add_signup(interaction, self.events.dps_role)
+        await self.add_signup(interaction, self.events.dps_role)
 
     @discord.ui.button(style=discord.ButtonStyle.primary, emoji="🩹", label="Support", custom_id="Supp_Btn")
+    @timed('button_seconds', button='support')
     async def support_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer()
-        if dbfunc.is_signed_up_role(interaction.message.id, interaction.user.id, self.events.support_role):
-            await interaction.followup.send(
-                f"You are already signed up as a {self.events.support_role}",
-                ephemeral=True
-            )
-
-        else:
-            await self.add_signup(interaction, self.events.support_role)
+        await self.add_signup(interaction, self.events.support_role)
 
     @discord.ui.button(style=discord.ButtonStyle.secondary, label="Withdraw", custom_id="Withdraw_Btn")
+    @timed('button_seconds', button='withdraw')
     async def withdraw_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer()
-        dbfunc.delete_user_from_signups(interaction.message.id, interaction.user.id)
-        await self.events.update_event_signups(interaction.message)
+        async with self.events.event_locks(interaction.message.id):
+            await adbfunc.delete_user_from_signups(interaction.message.id, interaction.user.id)
+        self.events.render_scheduler.mark_dirty(interaction.message)
         print(f"User ID {interaction.user.id} no longer signed up for event ID {interaction.message.id}")
 
     @discord.ui.button(style=discord.ButtonStyle.danger, label="End Event", custom_id="End_Btn")
+    @timed('button_seconds', button='end')
     async def end_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         user_perms = interaction.channel.permissions_for(interaction.user)
         if user_perms.manage_events == True:
@@ -913,7 +1117,7 @@ class EventView(discord.ui.View):
                     f"Are you sure you want to end event: ``{interaction.message.embeds[0].title}``?\n"
                     "Confirmation will timeout in 1 minute to prevent unwanted event deletions"
                 ),
-                view=EndEventConfirmationView(interaction),
+                view=EndEventConfirmationView(self.events, interaction),
                 ephemeral=True
             )
         
@@ -923,51 +1127,96 @@ class EventView(discord.ui.View):
                 ephemeral=True
             )
 
+    @discord.ui.button(style=discord.ButtonStyle.secondary, emoji="📜", label="Full roster", custom_id="Roster_Btn")
+    @timed('button_seconds', button='roster')
+    async def roster_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        event_info = await adbfunc.get_event_info(interaction.message.id)
+        if event_info is None:
+            return await interaction.response.send_message("This event no longer exists.", ephemeral=True)
+
+        roster = await self.events.get_roster(interaction.message.id)
+        pages = []
+        for role in roster.roles:
+            name = self.events.role_field_name(role, roster, event_info)
+            pages.extend((name, page) for page in roster.roles[role].pages())
+        if not pages:
+            return await interaction.response.send_message("Nobody has signed up yet.", ephemeral=True)
+
+        view = RosterPagesView(event_info[4], pages)
+        await interaction.response.send_message(embed=view.page_embed(), view=view, ephemeral=True)
+
     async def add_signup(self, interaction: discord.Interaction, role):
         event_message = interaction.message
         event_id = event_message.id
         if role == self.events.dps_role:
-            signup_limit = dbfunc.get_event_info(event_id)[5]
-            role_emoji = self.events.dps_emoji
+            limit_index = 5
         elif role == self.events.support_role:
-            signup_limit = dbfunc.get_event_info(event_id)[6]
-            role_emoji = self.events.support_emoji
-
-        # TODO confirm if this is correct
-        async with self.lock:
-            signup_count = len(dbfunc.fetch_event_role_signup_info(event_id, role))
-            if signup_limit is not None:
-                if signup_limit - 1 < signup_count:
-                    return await interaction.user.send(f"Unable to add your signup because the host has limited signups for the event to {signup_limit} people.")
-
-                field_name = " ".join([role, role_emoji, "-", f'({signup_count + 1}/{signup_limit})'])
+            limit_index = 6
 
-            else:
-                field_name = " ".join([role, role_emoji, "-", f'({signup_count + 1})'])
-
-            embed = event_message.embeds[0]
-            dbfunc.insert_event_signup(
+        async with self.events.event_locks(event_id):
+            status, event_info, result = await adbfunc.try_signup(
                 event_id,
                 interaction.user.display_name,
                 interaction.user.id,
                 role,
                 int(datetime.datetime.now().timestamp())
             )
-            result = dbfunc.fetch_event_role_signup_info(event_id, role)
-            signups = "\n".join(map(lambda x: f"<@{x[2]}>", result))
 
-            embed.set_field_at(
-                index=self.events.role_dict[role_emoji][1],
-                name=field_name,
-                value=signups
-            )
+            if status == adbfunc.SIGNUP_DUPLICATE:
+                return await interaction.followup.send(
+                    f"You are already signed up as a {role}",
+                    ephemeral=True
+                )
+
+            if status == adbfunc.SIGNUP_NO_EVENT:
+                return await interaction.followup.send("This event no longer exists.", ephemeral=True)
+
+            if status == adbfunc.SIGNUP_FULL:
+                return await interaction.user.send(f"Unable to add your signup because the host has limited signups for the event to {event_info[limit_index]} people.")
 
-            await event_message.edit(embed=embed)
+        # Don't wait for the edit. Clicks that land while it is
+        # in flight are merged into the next edit.
+        self.events.render_scheduler.mark_dirty(event_message)
 
         print(f"User ID {interaction.user.id} signed up for event ID {event_id} as {role}")
 
+class RosterPagesView(discord.ui.View):
+    '''Pages through an event's full roster in an ephemeral message.'''
+    def __init__(self, title, pages):
+        super().__init__(timeout=300)
+        self.title = title
+        # (field name, mention lines) per page
+        self.pages = pages
+        self.index = 0
+        self.update_buttons()
+
+    def page_embed(self):
+        name, text = self.pages[self.index]
+        embed = discord.Embed(title=self.title, color=discord.Color.purple())
+        embed.add_field(name=name, value=text, inline=False)
+        embed.set_footer(text=f'Page {self.index + 1}/{len(self.pages)}')
+        return embed
+
+    def update_buttons(self):
+        self.previous_btn.disabled = self.index == 0
+        self.next_btn.disabled = self.index == len(self.pages) - 1
+
+    async def show_page(self, interaction: discord.Interaction, index):
+        self.index = index
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.page_embed(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, max(0, self.index - 1))
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, min(len(self.pages) - 1, self.index + 1))
+
 class EndEventConfirmationView(discord.ui.View):
-    def __init__(self, orig_msg):
+    def __init__(self, events: Events, orig_msg):
+        self.events = events
         self.orig_msg = orig_msg
         super().__init__(timeout=60)
 
@@ -988,22 +1237,11 @@ class EndEventConfirmationView(discord.ui.View):
         await self.disable_buttons()
 
         event_id = self.orig_msg.message.id
-        event_info = dbfunc.get_event_info(event_id)
+        event_info, _ = await self.events.teardown_event(event_id, channel_id=interaction.channel_id)
 
         if not event_info:
             return await interaction.followup.send('Event does not exist.')
 
-        player_ids = dbfunc.fetch_event_signup_distinct_player_ids(event_id)
-        for id in player_ids:
-            dbfunc.delete_user_from_signups(event_id, id[0])
-
-        dbfunc.delete_event_by_id(event_id)
-        event_message = await discord.utils.get(interaction.channel.history(), id=event_id)
-        await event_message.delete()
-        scheduled_event = interaction.guild.get_scheduled_event(event_info[9])
-        if scheduled_event:
-            await scheduled_event.delete()
-
         # explicitly stop listening to interaction events. on_timeout will not be called.
         self.stop()
     
@@ -1,100 +1,153 @@
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
-import asyncio
-import datetime
-import DatabaseFunctions as dbfunc
+from discord.ext import commands
+import AsyncDatabaseFunctions as adbfunc
+from LifecycleScheduler import ShardedLifecycleScheduler
+from Reconciler import Reconciler
+
+# Hosts are asked to end their event this many seconds after it starts
+EVENT_DONE_DELAY = 28800
+# The event is deleted if the host doesn't answer within this many seconds
+PROMPT_TIMEOUT = 57600
 
 class Tasks(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
-        self.events = self.bot.get_cog('Events')
-        self.event_done_checker.start()
+        # Each shard's events are checked by their own scheduler, and only for
+        # the shards this process runs
+        self.event_done_scheduler = ShardedLifecycleScheduler(
+            self.event_done_checker, self.fetch_event_done_deadlines, bot.shard_count, bot.owned_shard_ids
+        )
+        # Unanswered prompts, persisted in the done_prompts table
+        self.prompt_scheduler = ShardedLifecycleScheduler(
+            self.expire_done_prompt, adbfunc.fetch_done_prompts_before, bot.shard_count, bot.owned_shard_ids
+        )
+        # Removes events whose message was deleted, at startup and every 6 hours
+        self.reconciler = Reconciler(bot)
 
-    def cog_unload(self):
-        self.event_done_checker.cancel()
+    @property
+    def events(self):
+        return self.bot.get_cog('Events')
 
-    @tasks.loop(hours=1.0)
-    async def event_done_checker(self):
-        'Check to see if an event has been done for over 8 hours'
-        if self.events is not None:
-            result = dbfunc.fetch_events()
-            now = int(discord.utils.utcnow().timestamp())
-            for row in result:
-                # Ask the user if they want to end their event if it has been 8 hours
-                if row[8] != 'True' and row[8] != 'Pending' and row[3] + 28800 <= now:
-                    event_message = await self.events.get_event_message(self.bot.guild_channels[row[7]], row[0])
-                    user = self.bot.get_user(row[2])
-                    view = EventDoneView(row[0])
-                    view.events = self.events
-                    view.message = await user.send(
-                        f'The following event started <t:{row[3]}:R>. Would you like to end the event?\nIf you do not respond <t:{now + 57600}:R>, the event will be deleted.',
-                        embed=event_message.embeds[0],
-                        view=view
-                    )
-                    dbfunc.set_no_auto_delete(row[0], 'Pending')
-
-    @event_done_checker.before_loop
-    async def before_event_done_checker(self):
-        # Wait until the bot is ready
+    async def cog_load(self):
+        # Prompt buttons encode their event ID, so they keep working after a restart
+        self.bot.add_dynamic_items(EventDoneButton)
+        self.event_done_scheduler.start()
+        self.prompt_scheduler.start()
+        self.reconciler.start()
+
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(EventDoneButton)
+        await self.event_done_scheduler.close()
+        await self.prompt_scheduler.close()
+        await self.reconciler.close()
+
+    @commands.Cog.listener()
+    async def on_dudel_event_scheduled(self, event_id, unix_timestamp, guild_id):
+        self.event_done_scheduler.schedule(event_id, unix_timestamp + EVENT_DONE_DELAY, guild_id)
+
+    @commands.Cog.listener()
+    async def on_dudel_event_removed(self, event_id):
+        self.event_done_scheduler.cancel(event_id)
+        self.prompt_scheduler.cancel(event_id)
+
+    async def fetch_event_done_deadlines(self, until, shard_count, shard_id):
+        rows = await adbfunc.fetch_events_starting_before(until - EVENT_DONE_DELAY, shard_count, shard_id)
+        return [(event_id, unix_timestamp + EVENT_DONE_DELAY) for event_id, unix_timestamp in rows]
+
+    async def event_done_checker(self, event_id):
+        'Ask the host if they want to end an event that has been done for 8 hours'
         await self.bot.wait_until_ready()
+        # Read from the database, the host may have answered a done prompt in another process
+        row = await adbfunc.refresh_event(event_id)
+        now = int(discord.utils.utcnow().timestamp())
+        if row is None or row[8] == 'True' or row[8] == 'Pending' or self.events is None:
+            return
+
+        # The event time was moved later without the scheduler hearing about it
+        if row[3] + EVENT_DONE_DELAY > now:
+            return self.event_done_scheduler.schedule(event_id, row[3] + EVENT_DONE_DELAY, row[7])
+
+        event_message = await self.events.get_event_message(self.events.event_channel_id(row), row[0])
+        deadline = now + PROMPT_TIMEOUT
+        message = await self.events.notifications.notify(
+            row[2],
+            f'The following event started <t:{row[3]}:R>. Would you like to end the event?\nIf you do not respond <t:{deadline}:R>, the event will be deleted.',
+            embed=event_message.embeds[0],
+            view=EventDoneView(row[0])
+        )
+        if message is not None:
+            await adbfunc.insert_done_prompt(row[0], row[2], message.channel.id, message.id, deadline)
+            self.prompt_scheduler.schedule(row[0], deadline, row[7])
+
+        # Try again in an hour if the host couldn't be reached
+        else:
+            self.event_done_scheduler.schedule(event_id, now + 3600, row[7])
+
+    async def expire_done_prompt(self, event_id):
+        'The host did not answer the prompt in time. Delete the event.'
+        await self.bot.wait_until_ready()
+        prompt = await adbfunc.delete_done_prompt(event_id)
+        if prompt is None:
+            return
+
+        try:
+            prompt_message = self.bot.get_partial_messageable(prompt[2]).get_partial_message(prompt[3])
+            await prompt_message.edit(view=EventDoneView(event_id, disabled=True))
+        except discord.HTTPException:
+            pass
+
+        if self.events is not None:
+            await self.events.teardown_event(event_id)
+
+    async def answer_done_prompt(self, interaction: discord.Interaction, event_id, end_event):
+        await interaction.response.edit_message(view=EventDoneView(event_id, disabled=True))
+        prompt = await adbfunc.delete_done_prompt(event_id)
+        if prompt is None:
+            return await interaction.followup.send('This event has already ended.')
+
+        self.prompt_scheduler.cancel(event_id)
+        if end_event:
+            await self.events.teardown_event(event_id)
+            return await interaction.followup.send('Event ended.')
+
+        await adbfunc.set_no_auto_delete(event_id, 'True')
+        await interaction.followup.send('Okay. I won\'t delete this event')
+
+        event_info = await adbfunc.get_event_info(event_id)
+        event_message = await self.events.get_event_message(self.events.event_channel_id(event_info), event_id)
+        embed = event_message.embeds[0].copy()
+        embed.set_footer(text = f'Event ID: {event_id} - DO NOT DELETE')
+        self.events.cache_message(await event_message.edit(embed=embed, attachments=[]))
+
+class EventDoneButton(discord.ui.DynamicItem[discord.ui.Button], template=r'event_done:(?P<answer>yes|no):(?P<event_id>[0-9]+)'):
+    def __init__(self, answer, event_id, disabled=False):
+        self.answer = answer
+        self.event_id = int(event_id)
+        super().__init__(
+            discord.ui.Button(
+                style=discord.ButtonStyle.green if answer == 'yes' else discord.ButtonStyle.red,
+                label=answer.capitalize(),
+                custom_id=f'event_done:{answer}:{event_id}',
+                disabled=disabled
+            )
+        )
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match['answer'], match['event_id'])
 
-        # Wait until the next hour to start the task.
-        # Allows the task to run every hour, on the hour.
-        delta = datetime.timedelta(hours=1)
-        now = datetime.datetime.now()
-        next_hour = (now + delta).replace(microsecond=0, second=0, minute=0)
-        await asyncio.sleep((next_hour - now).seconds)
+    async def callback(self, interaction: discord.Interaction):
+        tasks = interaction.client.get_cog('Tasks')
+        await tasks.answer_done_prompt(interaction, self.event_id, self.answer == 'yes')
 
 class EventDoneView(discord.ui.View):
-    def __init__(self, event_id):
-        self.event_id = event_id
-        # Give the user 16 hours to respond
-        super().__init__(timeout=57600.0)
-
-    async def disable_buttons(self):
-        # Disable the buttons
-        for button in self.children:
-            button.disabled = True
-        
-        await self.message.edit(view=self)
-
-    async def end_event(self):
-        event_info = dbfunc.get_event_info(self.event_id)
-        player_ids = dbfunc.fetch_event_signup_distinct_player_ids(self.event_id)
-        for id in player_ids:
-            dbfunc.delete_user_from_signups(self.event_id, id[0])
-
-        dbfunc.delete_event_by_id(self.event_id)
-        channel_id = dbfunc.get_guild_channel_id(event_info[7])
-        event_message = await self.events.get_event_message(channel_id[0], self.event_id)
-        await event_message.delete()
-
-    async def on_timeout(self):
-        await self.disable_buttons()
-        await self.end_event()
-
-    @discord.ui.button(style= discord.ButtonStyle.green, label='Yes')
-    async def yes_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer(ephemeral=True)
-        await self.disable_buttons()
-        self.stop() # explicitly stop listening to interaction events. on_timeout will not be called.
-        await self.end_event()
-        await interaction.followup.send('Event ended.')
-
-    @discord.ui.button(style= discord.ButtonStyle.red, label='No')
-    async def no_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.disable_buttons()
-        self.stop() # explicitly stop listening to interaction events. on_timeout will not be called.
-        dbfunc.set_no_auto_delete(self.event_id, 'True')
-        await interaction.response.send_message('Okay. I won\'t delete this event')
-        
-        event_info = dbfunc.get_event_info(self.event_id)
-        channel_id = dbfunc.get_guild_channel_id(event_info[7])
-        event_message = await self.events.get_event_message(channel_id[0], self.event_id)
-        embed = event_message.embeds[0]
-        embed.set_footer(text = f'Event ID: {self.event_id} - DO NOT DELETE')
-        await event_message.edit(embed=embed, attachments=[])
+    def __init__(self, event_id, disabled=False):
+        # Never times out. The prompt's deadline is kept in the database and
+        # handled by Tasks.prompt_scheduler, so it survives restarts.
+        super().__init__(timeout=None)
+        self.add_item(EventDoneButton('yes', event_id, disabled))
+        self.add_item(EventDoneButton('no', event_id, disabled))
 
 async def setup(bot: commands.Bot) -> None:
     await bot.add_cog(Tasks(bot))
\ No newline at end of file
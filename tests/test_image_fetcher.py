@@ -0,0 +1,138 @@
+import asyncio
+import pytest
+from aiohttp import web
+import Exceptions
+from ImageCache import ImageCache
+from ImageFetcher import ImageFetcher
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+async def image(request):
+    if request.headers.get('If-None-Match') == ETAG or request.headers.get('If-Modified-Since') == LAST_MODIFIED:
+        return web.Response(status=304)
+    return web.Response(body=PNG, content_type='image/png', headers={'ETag' : ETAG, 'Last-Modified' : LAST_MODIFIED})
+
+async def chunked(request):
+    # Streamed without a Content-Length, so only the running total can catch it
+    response = web.StreamResponse(headers={'Content-Type' : 'image/png'})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    await response.write(PNG)
+    for _ in range(64):
+        await response.write(b'\x00' * 1024)
+    await response.write_eof()
+    return response
+
+async def html(request):
+    return web.Response(text='<html></html>', content_type='text/html')
+
+async def no_content_type(request):
+    return web.Response(body=PNG)
+
+async def drop_content_type(request, response):
+    # aiohttp fills in a default Content-Type, so remove it after the fact
+    if request.path == '/bare':
+        response.headers.popall('Content-Type', None)
+
+async def not_found(request):
+    return web.Response(status=404)
+
+class Server:
+    '''A local stand-in for an image host, counting requests per path.'''
+    def __init__(self):
+        self.hits = {}
+        self.runner = None
+        self.base_url = None
+
+    async def __aenter__(self):
+        @web.middleware
+        async def count(request, handler):
+            self.hits[request.path] = self.hits.get(request.path, 0) + 1
+            return await handler(request)
+
+        app = web.Application(middlewares=[count])
+        app.on_response_prepare.append(drop_content_type)
+        app.router.add_get('/image.png', image)
+        app.router.add_get('/chunked.png', chunked)
+        app.router.add_get('/page.html', html)
+        app.router.add_get('/bare', no_content_type)
+        app.router.add_get('/missing.png', not_found)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f'http://127.0.0.1:{port}'
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+def run(test, **fetcher_args):
+    async def main():
+        async with Server() as server:
+            fetcher = ImageFetcher(**fetcher_args)
+            try:
+                await test(server, fetcher)
+            finally:
+                await fetcher.close()
+    asyncio.run(main())
+
+def test_fetch_ok():
+    async def test(server, fetcher):
+        assert await fetcher.fetch(f'{server.base_url}/image.png') == PNG
+        assert fetcher.requests == 1
+    run(test)
+
+def test_fresh_cache_skips_request():
+    async def test(server, fetcher):
+        url = f'{server.base_url}/image.png'
+        await fetcher.fetch(url)
+        assert await fetcher.fetch(url) == PNG
+        assert server.hits['/image.png'] == 1
+    run(test, cache=ImageCache(max_age=3600))
+
+def test_stale_cache_revalidates_with_304():
+    async def test(server, fetcher):
+        url = f'{server.base_url}/image.png'
+        await fetcher.fetch(url)
+        assert await fetcher.fetch(url) == PNG
+        assert server.hits['/image.png'] == 2
+        assert fetcher.not_modified == 1
+    run(test, cache=ImageCache(max_age=-1))
+
+def test_revalidates_with_last_modified_only():
+    async def test(server, fetcher):
+        url = f'{server.base_url}/image.png'
+        await fetcher.cache.put_url(url, PNG, None, LAST_MODIFIED)
+        assert await fetcher.fetch(url) == PNG
+        assert fetcher.not_modified == 1
+    run(test, cache=ImageCache(max_age=-1))
+
+def test_oversized_chunked_body():
+    async def test(server, fetcher):
+        with pytest.raises(Exceptions.ImageTooLarge):
+            await fetcher.fetch(f'{server.base_url}/chunked.png')
+    run(test, max_bytes=16 * 1024, chunk_size=1024)
+
+def test_not_an_image():
+    async def test(server, fetcher):
+        with pytest.raises(Exceptions.NotAnImage):
+            await fetcher.fetch(f'{server.base_url}/page.html')
+    run(test)
+
+def test_missing_content_type_is_sniffed():
+    async def test(server, fetcher):
+        await fetcher.start()
+        async with fetcher.session.get(f'{server.base_url}/bare') as response:
+            assert 'Content-Type' not in response.headers
+        assert await fetcher.fetch(f'{server.base_url}/bare') == PNG
+    run(test)
+
+def test_http_error():
+    async def test(server, fetcher):
+        with pytest.raises(Exceptions.ImageFetchError):
+            await fetcher.fetch(f'{server.base_url}/missing.png')
+    run(test)
@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from KeyedLock import KeyedLock
+
+def test_entry_removed_after_release():
+    async def run():
+        locks = KeyedLock()
+        async with locks(1):
+            assert len(locks) == 1
+            assert locks.locked(1)
+        assert len(locks) == 0
+        assert not locks.locked(1)
+
+    asyncio.run(run())
+
+def test_entry_kept_while_waiters_remain():
+    async def run():
+        locks = KeyedLock()
+        order = []
+
+        async def hold(n):
+            async with locks('event'):
+                order.append(n)
+                await asyncio.sleep(0.01)
+
+        tasks = [asyncio.create_task(hold(n)) for n in range(3)]
+        await asyncio.sleep(0)
+        assert len(locks) == 1
+        await asyncio.gather(*tasks)
+        assert order == [0, 1, 2]
+        assert len(locks) == 0
+
+    asyncio.run(run())
+
+def test_entry_removed_after_exception_and_cancellation():
+    async def run():
+        locks = KeyedLock()
+        with pytest.raises(ValueError):
+            async with locks(1):
+                raise ValueError
+
+        async def wait_forever():
+            async with locks(2):
+                await asyncio.sleep(3600)
+
+        async with locks(2):
+            # A waiter cancelled before it gets the lock
+            waiter = asyncio.create_task(wait_forever())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        assert len(locks) == 0
+
+    asyncio.run(run())
+
+def test_different_keys_do_not_block():
+    async def run():
+        locks = KeyedLock()
+        waits = []
+        locks.on_wait = waits.append
+
+        async def hold_second():
+            async with locks(2):
+                return locks.locked(1)
+
+        async with locks(1):
+            # Would time out if key 2 waited on key 1
+            assert await asyncio.wait_for(hold_second(), 1)
+        assert len(waits) == 2
+        assert len(locks) == 0
+
+    asyncio.run(run())
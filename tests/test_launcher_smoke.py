@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from test_sharding import guild_on_shard
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_launcher_processes_against_mock_gateway(tmp_path):
+    '''Two launcher workers split four shards and answer commands from guilds on every shard.'''
+    for name in os.listdir(REPO):
+        if name.endswith('.py'):
+            shutil.copy(os.path.join(REPO, name), tmp_path)
+    for directory in ['cogs', 'images', 'benchmarks']:
+        shutil.copytree(os.path.join(REPO, directory), tmp_path / directory, ignore=shutil.ignore_patterns('__pycache__'))
+    (tmp_path / 'data' / 'db').mkdir(parents=True)
+
+    guild_ids = [guild_on_shard(shard_id, 4) for shard_id in range(4)]
+    with open(tmp_path / 'trace.jsonl', 'w') as file:
+        for i, guild_id in enumerate(guild_ids):
+            file.write(json.dumps({
+                't' : i * 0.1, 'id' : str(i + 1), 'type' : 2, 'guild_id' : str(guild_id),
+                'channel_id' : str(guild_id + 1), 'channel_type' : 0,
+                'user' : {'id' : '42', 'username' : 'host', 'global_name' : None},
+                # Includes Manage Events
+                'permissions' : str((1 << 40) - 1), 'locale' : 'en-US',
+                'data' : {'id' : '1', 'name' : 'set_events_channel', 'type' : 1}
+            }) + '\n')
+
+    port = free_port()
+    env = dict(
+        os.environ, DISCORD_TOKEN='x.y.z', DEV_ID='1', DEV_GUILD='111',
+        DISCORD_API_BASE=f'http://127.0.0.1:{port}/api/v10', DISCORD_GATEWAY_URL=f'ws://127.0.0.1:{port}/gateway'
+    )
+    mock = subprocess.Popen(
+        [sys.executable, 'benchmarks/ReplayTrace.py', 'trace.jsonl', '--port', str(port), '--warmup', '3', '--drain', '3', '--report', 'report.json'],
+        cwd=tmp_path, stdout=subprocess.DEVNULL
+    )
+    launcher = None
+    try:
+        # Wait for the mock to listen
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        launcher = subprocess.Popen(
+            [sys.executable, 'Launcher.py', '--processes', '2', '--shards', '4'],
+            cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        # The mock writes its report once every shard connected and the trace was replayed
+        assert mock.wait(timeout=90) == 0
+    finally:
+        if launcher is not None:
+            launcher.send_signal(signal.SIGINT)
+            try:
+                launcher.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                launcher.kill()
+        mock.kill()
+
+    with open(tmp_path / 'report.json') as file:
+        report = json.load(file)
+    assert report['shards'] == 4
+    assert report['interactions'] == 4
+    assert report['undelivered'] == 0
+    assert report['unacknowledged'] == 0
+
+    # Each worker handled its own shards' guilds, all in the shared database
+    con = sqlite3.connect(tmp_path / 'data' / 'db' / 'DudelBotData.db')
+    rows = dict(con.execute('SELECT guild_id, channel_id FROM guild_channel_id').fetchall())
+    con.close()
+    assert rows == {guild_id : guild_id + 1 for guild_id in guild_ids}
+    for worker in range(2):
+        with open(tmp_path / 'logs' / f'worker-{worker}' / 'message_log.log') as file:
+            assert 'Running shards' in file.read()
@@ -0,0 +1,52 @@
+import asyncio
+import time
+from LifecycleScheduler import LifecycleScheduler
+
+def test_fires_due_deadlines():
+    async def main():
+        fired = []
+        async def callback(event_id):
+            fired.append(event_id)
+        async def seed(until):
+            return [(1, time.time() - 1), (2, time.time() + 0.1), (3, until + 10)]
+
+        scheduler = LifecycleScheduler(callback, seed)
+        scheduler.start()
+        await asyncio.sleep(0.3)
+        await scheduler.close()
+        assert fired == [1, 2]
+    asyncio.run(main())
+
+def test_failed_seed_is_retried():
+    async def main():
+        fired = []
+        calls = []
+        async def callback(event_id):
+            fired.append(event_id)
+        async def seed(until):
+            calls.append(until)
+            if len(calls) < 3:
+                raise RuntimeError('database is locked')
+            return [(1, time.time())]
+
+        scheduler = LifecycleScheduler(callback, seed, retry_delay=0.05)
+        scheduler.start()
+        await asyncio.sleep(0.5)
+        await scheduler.close()
+        # Retried after 0.05s, then 0.1s
+        assert len(calls) == 3
+        assert fired == [1]
+    asyncio.run(main())
+
+def test_failed_seed_keeps_old_horizon():
+    async def main():
+        async def callback(event_id):
+            pass
+        async def seed(until):
+            raise RuntimeError('database is locked')
+
+        scheduler = LifecycleScheduler(callback, seed, retry_delay=60)
+        scheduler._horizon_end = 123
+        assert not await scheduler.refill()
+        assert scheduler._horizon_end == 123
+    asyncio.run(main())
@@ -0,0 +1,32 @@
+import threading
+from Metrics import Registry
+
+def test_concurrent_updates_are_not_lost():
+    registry = Registry()
+    def work():
+        for _ in range(20000):
+            registry.observe('query_seconds', 0.002, query='q')
+            registry.inc('queries_total')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    counters, histograms = registry.snapshot()
+    assert dict(counters)[('queries_total', ())] == 80000
+    histogram = dict(histograms)[('query_seconds', (('query', 'q'),))]
+    assert histogram.count == 80000
+    assert sum(histogram.counts) == 80000
+
+def test_render_prometheus():
+    registry = Registry()
+    registry.observe('button_seconds', 0.003, button='dps')
+    registry.observe('button_seconds', 20, button='dps')
+    registry.inc('errors_total', status='429')
+    text = registry.render_prometheus()
+    assert 'dudelbot_errors_total{status="429"} 1' in text
+    assert 'dudelbot_button_seconds_bucket{button="dps",le="0.005"} 1' in text
+    assert 'dudelbot_button_seconds_bucket{button="dps",le="+Inf"} 2' in text
+    assert 'dudelbot_button_seconds_count{button="dps"} 2' in text
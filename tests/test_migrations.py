@@ -0,0 +1,66 @@
+import sqlite3
+import pytest
+import DatabaseFunctions as dbfunc
+import Migrations
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'test.db')
+    monkeypatch.setattr(dbfunc, 'DB_PATH', path)
+    yield path
+    dbfunc.close_connection()
+
+def test_fresh_database_applies_every_migration(db_path):
+    assert Migrations.run_migrations() == list(range(1, len(Migrations.MIGRATIONS) + 1))
+    assert Migrations.get_schema_version() == len(Migrations.MIGRATIONS)
+
+def test_rerun_applies_nothing_and_keeps_data(db_path):
+    Migrations.run_migrations()
+    dbfunc.insert_event(1000, 'Host', 1, 100, 'Event', 5, None, 77)
+    dbfunc.insert_event_signup(1000, 'Player', 2, 'DPS', 100)
+    dbfunc.close_connection()
+
+    assert Migrations.run_migrations() == []
+    assert Migrations.get_schema_version() == len(Migrations.MIGRATIONS)
+    assert dbfunc.get_event_info(1000)[10] == 77
+    assert len(dbfunc.fetch_event_role_signup_info(1000, 'DPS')) == 1
+
+def test_partly_migrated_database_applies_the_rest(db_path):
+    with dbfunc.transaction() as cur:
+        for migration in Migrations.MIGRATIONS[:3]:
+            migration(cur)
+        cur.execute("PRAGMA user_version=3")
+
+    assert Migrations.run_migrations() == list(range(4, len(Migrations.MIGRATIONS) + 1))
+    assert Migrations.run_migrations() == []
+
+def test_existing_database_upgrades_in_place(db_path):
+    # The schema before migrations, with the duplicates it allowed
+    con = sqlite3.connect(db_path)
+    Migrations.create_base_tables(con.cursor())
+    con.executemany("INSERT INTO guild_channel_id VALUES (?, ?)", [(5, 70), (5, 77)])
+    con.executemany(
+        "INSERT INTO events VALUES (?, 'Host', 1, 100, 'Event', NULL, NULL, 5, NULL, NULL)",
+        [(1000,), (1000,), (1001,)]
+    )
+    con.executemany(
+        "INSERT INTO signups VALUES (1000, 'Player', ?, 'DPS', ?)",
+        [(2, 100), (2, 101), (3, 100)]
+    )
+    con.commit()
+    con.close()
+
+    # user_version is 0, and create_base_tables leaves the old tables alone
+    assert Migrations.run_migrations() == list(range(1, len(Migrations.MIGRATIONS) + 1))
+    assert dbfunc.get_guild_channel_id(5) == (77,)
+    assert [row[0] for row in dbfunc.fetch_events()] == [1000, 1001]
+    # The earliest duplicate signup is kept, and signups are numbered in order
+    signups = dbfunc.fetch_event_role_signup_info(1000, 'DPS')
+    assert [(row[2], row[4]) for row in signups] == [(2, 100), (3, 100)]
+    with pytest.raises(sqlite3.IntegrityError):
+        dbfunc.get_connection().execute("INSERT INTO signups VALUES (1000, 'Player', 2, 'DPS', 102, 3)")
+
+    plan = dbfunc.get_connection().execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM signups WHERE event_id=? AND role=? ORDER BY signup_seq", (1000, 'DPS')
+    ).fetchall()
+    assert 'signups_event_role_seq' in ' '.join(row[-1] for row in plan)
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from RenderScheduler import RenderScheduler
+
+class Message:
+    def __init__(self, message_id, version=0):
+        self.id = message_id
+        self.version = version
+
+class Recorder:
+    def __init__(self, delay=0):
+        self.rendered = []
+        self.delay = delay
+
+    async def __call__(self, message):
+        await asyncio.sleep(self.delay)
+        self.rendered.append((message.id, message.version))
+
+def test_first_request_renders_right_away():
+    async def run():
+        recorder = Recorder()
+        scheduler = RenderScheduler(recorder, window=10)
+        await asyncio.wait_for(scheduler.mark_dirty(Message(1)), 1)
+        assert recorder.rendered == [(1, 0)]
+
+    asyncio.run(run())
+
+def test_burst_is_coalesced_into_one_render_of_the_newest_message():
+    async def run():
+        recorder = Recorder()
+        scheduler = RenderScheduler(recorder, window=0.05)
+        await scheduler.mark_dirty(Message(1))
+        futures = [scheduler.mark_dirty(Message(1, version)) for version in range(1, 6)]
+        # Every request in the burst shares the render
+        assert all(future is futures[0] for future in futures)
+        await asyncio.wait_for(asyncio.gather(*futures), 1)
+
+        assert recorder.rendered == [(1, 0), (1, 5)]
+        assert scheduler.stats() == {'requests' : 6, 'renders' : 2, 'edits_saved' : 4, 'pending' : 0}
+
+    asyncio.run(run())
+
+def test_events_render_independently():
+    async def run():
+        recorder = Recorder(delay=0.05)
+        scheduler = RenderScheduler(recorder, window=10)
+        await asyncio.wait_for(asyncio.gather(*[scheduler.mark_dirty(Message(i)) for i in range(5)]), 0.2)
+        assert sorted(recorder.rendered) == [(i, 0) for i in range(5)]
+
+    asyncio.run(run())
+
+def test_forget_releases_waiters_without_rendering():
+    async def run():
+        recorder = Recorder()
+        scheduler = RenderScheduler(recorder, window=10)
+        await scheduler.mark_dirty(Message(1))
+        future = scheduler.mark_dirty(Message(1, 1))
+        scheduler.forget(1)
+
+        assert await asyncio.wait_for(future, 1) is None
+        await asyncio.sleep(0.05)
+        assert recorder.rendered == [(1, 0)]
+        assert scheduler.stats()['pending'] == 0
+
+    asyncio.run(run())
+
+def test_failed_render_is_raised_to_waiters():
+    async def run():
+        async def fail(message):
+            raise RuntimeError('edit failed')
+
+        scheduler = RenderScheduler(fail, window=0)
+        with pytest.raises(RuntimeError):
+            await scheduler.mark_dirty(Message(1))
+
+    asyncio.run(run())
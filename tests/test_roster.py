@@ -0,0 +1,85 @@
+import discord
+import pytest
+from Roster import FIELD_LIMIT, RoleRoster, Roster, RosterCache
+from cogs.Events import EMBED_LIMIT, Events
+
+# Snowflake sized player ids, 22 characters as a mention
+PLAYERS = [10**18 + i for i in range(300)]
+
+class FakeBot:
+    def __init__(self):
+        self.guild_channels = {}
+
+    def dispatch(self, *args):
+        pass
+
+def check_pages(role_roster):
+    pages = role_roster.pages()
+    assert all(len(page) <= FIELD_LIMIT for page in pages)
+    assert '\n'.join(pages) == '\n'.join(f'<@{player_id}>' for player_id in role_roster.player_ids())
+
+def test_pages_split_at_the_field_limit():
+    role_roster = RoleRoster()
+    for player_id in PLAYERS:
+        assert role_roster.add(player_id)
+    assert not role_roster.add(PLAYERS[0])
+
+    assert len(role_roster) == 300
+    assert len(role_roster.pages()) == 7
+    check_pages(role_roster)
+
+def test_remove_repacks_later_pages():
+    role_roster = RoleRoster()
+    for player_id in PLAYERS:
+        role_roster.add(player_id)
+    first_page = role_roster.page(0)
+
+    for player_id in PLAYERS[100::3]:
+        assert role_roster.remove(player_id)
+    assert not role_roster.remove(PLAYERS[100])
+
+    assert role_roster.player_ids() == [player_id for player_id in PLAYERS if player_id not in PLAYERS[100::3]]
+    # Pages before the first removal are untouched
+    assert role_roster.page(0) is first_page
+    check_pages(role_roster)
+
+def test_sync_follows_signup_order():
+    roster = Roster(['DPS', 'Support'])
+    rows = [(1, 'Player', player_id, 'DPS' if player_id % 2 else 'Support') for player_id in PLAYERS[:50]]
+    roster.sync(rows)
+    assert roster.roles['DPS'].player_ids() == [row[2] for row in rows if row[3] == 'DPS']
+
+    # One player leaves, another leaves and signs up again at the end
+    rows = rows[2:] + rows[:1]
+    roster.sync(rows)
+    assert roster.roles['Support'].player_ids() == [row[2] for row in rows if row[3] == 'Support']
+
+def test_roster_cache_evicts_least_recently_used():
+    cache = RosterCache(max_size=2)
+    first = cache.get(1, ['DPS'])
+    second = cache.get(2, ['DPS'])
+    assert cache.get(1, ['DPS']) is first
+    cache.get(3, ['DPS'])
+    assert len(cache) == 2
+    assert cache.get(1, ['DPS']) is first
+    assert cache.get(2, ['DPS']) is not second
+    cache.forget(2)
+    assert len(cache) == 1
+
+@pytest.mark.parametrize('description_length', [10, 3000])
+def test_roster_fields_fit_in_an_embed(description_length):
+    events = Events(FakeBot())
+    roster = Roster([events.dps_role, events.support_role])
+    roster.sync([(1, 'Player', player_id, events.dps_role if i % 4 else events.support_role) for i, player_id in enumerate(PLAYERS)])
+    embed = discord.Embed(title='Event', description='x' * description_length)
+    embed.set_footer(text='Event ID: 1')
+    event_info = (1, 'Host', 1, 100, 'Event', None, None, 5, None, None, None)
+
+    hidden = events.set_roster_fields(embed, roster, event_info)
+
+    assert len(embed) <= EMBED_LIMIT
+    assert all(len(field.value) <= FIELD_LIMIT for field in embed.fields)
+    shown = sum(field.value.count('<@') for field in embed.fields)
+    assert shown + hidden == len(PLAYERS)
+    assert hidden > 0
+    assert embed.fields[-1].name == 'Full roster'
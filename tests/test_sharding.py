@@ -0,0 +1,124 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+import DatabaseFunctions as dbfunc
+import Migrations
+from LeaderElection import FileLock, LeaderElection
+from Sharding import parse_shard_config, shard_id_for
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def guild_on_shard(shard_id, shard_count, n=0):
+    '''A snowflake guild ID that lands on shard_id.'''
+    return ((1_000_000 * shard_count + n * shard_count + shard_id) << 22) + 12345
+
+def test_parse_shard_config():
+    assert parse_shard_config(None, None) == (1, None)
+    assert parse_shard_config('auto', None) == (None, None)
+    assert parse_shard_config('4', None) == (4, None)
+    assert parse_shard_config('4', '0-1') == (4, [0, 1])
+    assert parse_shard_config('8', '6, 1,2-3,2') == (8, [1, 2, 3, 6])
+
+@pytest.mark.parametrize('shard_count, shard_ids', [('0', None), ('4', '4'), ('4', '-1'), ('auto', '0')])
+def test_parse_shard_config_rejects(shard_count, shard_ids):
+    with pytest.raises(ValueError):
+        parse_shard_config(shard_count, shard_ids)
+
+def test_shard_id_for():
+    for shard_id in range(4):
+        assert shard_id_for(guild_on_shard(shard_id, 4), 4) == shard_id
+    # DMs and events without a guild go to shard 0
+    assert shard_id_for(None, 4) == 0
+    assert shard_id_for(guild_on_shard(3, 4), 1) == 0
+
+def test_sql_shard_filter_matches_shard_id_for(tmp_path, monkeypatch):
+    monkeypatch.setattr(dbfunc, 'DB_PATH', str(tmp_path / 'test.db'))
+    try:
+        Migrations.run_migrations()
+        guild_ids = [guild_on_shard(shard_id, 4, n) for shard_id in range(4) for n in range(3)] + [None]
+        for i, guild_id in enumerate(guild_ids):
+            dbfunc.insert_event(1000 + i, 'Host', 1, 100, 'Event', guild_id, None)
+
+        def expected(shard_id):
+            return {1000 + i for i, guild_id in enumerate(guild_ids) if shard_id_for(guild_id, 4) == shard_id}
+
+        seen = []
+        for shard_id in range(4):
+            events = dbfunc.fetch_events_starting_before(150, 4, shard_id)
+            assert {row[0] for row in events} == expected(shard_id)
+            seen.extend(row[0] for row in events)
+
+        # Sending a prompt marks its event Pending, so prompts are checked separately
+        for i in range(len(guild_ids)):
+            dbfunc.insert_done_prompt(1000 + i, 1, 2, 3, 200)
+        for shard_id in range(4):
+            prompts = dbfunc.fetch_done_prompts_before(300, 4, shard_id)
+            assert {row[0] for row in prompts} == expected(shard_id)
+
+        # Every event belongs to exactly one shard
+        assert sorted(seen) == [1000 + i for i in range(len(guild_ids))]
+    finally:
+        dbfunc.close_connection()
+
+def hold_lock(path, leader=False):
+    '''Start a process that holds the lock file until it is killed.'''
+    if leader:
+        code = (
+            'import asyncio, sys\n'
+            'from LeaderElection import LeaderElection\n'
+            'async def main():\n'
+            f'    election = LeaderElection({path!r})\n'
+            '    assert election.start()\n'
+            '    print("held", flush=True)\n'
+            '    await asyncio.sleep(60)\n'
+            'asyncio.run(main())\n'
+        )
+    else:
+        code = (
+            'import time\n'
+            'from LeaderElection import FileLock\n'
+            f'lock = FileLock({path!r})\n'
+            'lock.acquire()\n'
+            'print("held", flush=True)\n'
+            'time.sleep(60)\n'
+        )
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=REPO, stdout=subprocess.PIPE, text=True)
+    assert process.stdout.readline().strip() == 'held'
+    return process
+
+def test_file_lock_released_when_holder_dies(tmp_path):
+    path = str(tmp_path / 'test.lock')
+    process = hold_lock(path)
+    lock = FileLock(path)
+    try:
+        assert not lock.try_acquire()
+        process.kill()
+        process.wait()
+        assert lock.try_acquire()
+        assert lock.held
+    finally:
+        process.kill()
+        process.wait()
+        lock.release()
+
+def test_follower_takes_over_when_leader_exits(tmp_path):
+    path = str(tmp_path / 'leader.lock')
+    process = hold_lock(path, leader=True)
+    async def main():
+        election = LeaderElection(path, interval=0.05)
+        try:
+            assert not election.start()
+            await asyncio.sleep(0.2)
+            assert not election.elected.is_set()
+            process.kill()
+            await asyncio.wait_for(election.elected.wait(), 5)
+            assert election.is_leader
+        finally:
+            await election.close()
+    try:
+        asyncio.run(main())
+    finally:
+        process.kill()
+        process.wait()